@@ -0,0 +1,270 @@
+# predict_service.py
+"""
+HTTP-сервис анализа рационов без десктоп-клиента.
+
+    python -m centralization.predict_service --host 127.0.0.1 --port 8080 --workers 4
+
+POST /predict        — JSON: пачка рационов с нутриентами
+POST /predict/files  — multipart: PDF/XLS отчёты, как кнопки PDF и Excel в окне
+                       (optimize=true — ещё и варианты рациона под коридоры кислот)
+GET  /charts/...     — PNG графиков, если в запросе charts=true
+GET  /health
+
+Внутри — тот же конвейер, что у приложения: без графиков пачка считается
+одним пакетным predict_from_files, с графиками — predict_from_file по отчёту
+с пулом процессов, где модели загружены один раз при старте (init_worker).
+Графики ответов закрепляются в хранилище (graphics_store pin), поэтому
+gc удаляет их только через DEFAULT_PIN_DAYS дней.
+Запускать из корня проекта: пути к моделям относительные.
+"""
+import argparse
+import logging
+import os
+import tempfile
+import uuid
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Dict, List, Literal, Optional
+
+from fastapi import FastAPI, File, HTTPException, Request, UploadFile
+from fastapi.staticfiles import StaticFiles
+from pydantic import BaseModel, Field
+
+from desktop.data_utils.charts import ChartRenderQueue
+from desktop.data_utils.document import ReportDocument
+from desktop.data_utils.executor import create_executor
+from desktop.data_utils.explainers import DEFAULT_FIDELITY
+from desktop.data_utils.extract_data import (nutrient_key, parse_excel_ration, parse_pdf_for_tables,
+                                             tables_to_report)
+from desktop.data_utils.graphics_store import DISPLAY, THUMB, graphics_store, is_chart_id
+from desktop.data_utils.infer_model import predict_from_file, predict_from_files, warm_up
+from desktop.data_utils.optimizer import optimize_report
+from desktop.data_utils.result_cache import result_cache
+from training import uniq_step
+
+
+MAX_BATCH = 200
+
+logger = logging.getLogger(__name__)
+
+
+class RationItem(BaseModel):
+    name: str = ""
+    # {ингредиент: % СВ}
+    ration: Dict[str, float] = Field(min_length=1)
+    # {подпись нутриента из uniq_step, например "СП (%)": значение}; пропуски — медианы
+    nutrients: Dict[str, Optional[float]] = {}
+
+
+class PredictRequest(BaseModel):
+    items: List[RationItem] = Field(min_length=1, max_length=MAX_BATCH)
+    charts: bool = False
+    # точность SHAP, см. explainers.FIDELITY; "fast" и "standard" — только по запросу
+    fidelity: Literal["fast", "standard", "exact"] = DEFAULT_FIDELITY
+    # варианты рациона, если кислоты вне коридоров (см. optimizer.optimize_report)
+    optimize: bool = False
+
+
+class PredictResult(BaseModel):
+    id: str
+    name: str
+    acids: Dict[str, float] = {}
+    importance_acid: Dict[str, Dict[str, float]] = {}
+    importance_nutrient: Dict[str, Dict[str, float]] = {}
+    charts: Dict[str, str] = {}
+    thumbnails: Dict[str, str] = {}
+    # RationCandidate.to_dict(); пусто, если все кислоты в коридорах или optimize=false
+    optimized_rations: List[Dict] = []
+    error: Optional[str] = None
+
+
+class PredictResponse(BaseModel):
+    results: List[PredictResult]
+
+
+def item_to_report(item):
+    unknown = [label for label in item.nutrients if label not in uniq_step]
+    if unknown:
+        raise HTTPException(422, f"неизвестные нутриенты: {unknown}; допустимы: {list(uniq_step)}")
+    step_table = {nutrient_key(label): value for label, value in item.nutrients.items() if value is not None}
+    return tables_to_report(list(item.ration.items()), step_table, item.name)
+
+
+def new_report(data):
+    # отчёт не сохраняется: путь задаёт только его имя (ID ответа и ключ очереди графиков)
+    return ReportDocument(Path(tempfile.gettempdir()) / f"{uuid.uuid4().hex}.json", data)
+
+
+def report_result(report, acids, urls=None, thumbnails=None):
+    return PredictResult(
+        id=report.name,
+        name=report["meta"].get("name", ""),
+        acids=acids,
+        importance_acid=report.get("importance_acid") or {},
+        importance_nutrient=report.get("importance_nutrient") or {},
+        charts=urls or {},
+        thumbnails=thumbnails or {},
+        optimized_rations=report.get("optimized_rations") or [],
+    )
+
+
+def error_result(report, error):
+    return PredictResult(id=report.name, name=report["meta"].get("name", ""),
+                         error=f"{type(error).__name__}: {error}")
+
+
+def chart_urls(report, store, base_url):
+    """URL графиков отчёта в store: ({ключ: PNG}, {ключ: миниатюра})."""
+    urls, thumbnails = {}, {}
+    root = store.store_dir.resolve()
+    for key, chart in (report.get("graphics") or {}).items():
+        if not is_chart_id(chart):
+            continue
+        for target, tier in ((urls, DISPLAY), (thumbnails, THUMB)):
+            path = store.path(chart, tier).resolve()
+            if path.exists():
+                target[key] = f"{base_url}charts/{path.relative_to(root).as_posix()}"
+    return urls, thumbnails
+
+
+def analyze(report, executor, fidelity=DEFAULT_FIDELITY, renderer=None, base_url="", optimize=False):
+    """
+    Один отчёт через predict_from_file; ошибка анализа не роняет всю пачку.
+    renderer — очередь графиков сервиса: графики рисуются в её хранилище
+    и закрепляются под ID ответа, иначе gc удалил бы их (отчёт не сохраняется).
+    """
+    try:
+        acids = predict_from_file(report, executor=executor, charts=None, cache=result_cache, fidelity=fidelity)
+        if optimize:
+            optimize_report(report, executor=executor)
+        if renderer is not None:
+            renderer.render_now(report)
+    except Exception as e:
+        return error_result(report, e)
+
+    acids = {acid: float(value[0]) for acid, value in acids.items()}
+    if renderer is None:
+        return report_result(report, acids)
+
+    renderer.store.pin(report.name, (report.get("graphics") or {}).values())
+    return report_result(report, acids, *chart_urls(report, renderer.store, base_url))
+
+
+def analyze_batch(reports, executor, fidelity=DEFAULT_FIDELITY, renderer=None, base_url="", optimize=False):
+    """
+    Пачка отчётов. Без графиков (renderer=None) — один predict_from_files на
+    всю пачку: одна матрица и один вызов explainer'а на модель. Если пакетный
+    расчёт упал, отчёты считаются по одному, чтобы ошибка осталась у своего рациона.
+    """
+    documents = [new_report(data) for data in reports]
+    if renderer is None and documents:
+        try:
+            acids = predict_from_files(documents, fidelity=fidelity, charts=None)
+        except Exception:
+            # систематическая ошибка пакетного пути иначе незаметно превратится в N медленных анализов
+            logger.exception("пакетный анализ %d отчётов не удался, считаем по одному", len(documents))
+        else:
+            return [batch_result(document, acids[str(document.path)], executor, optimize) for document in documents]
+    return [analyze(document, executor, fidelity, renderer, base_url, optimize) for document in documents]
+
+
+def batch_result(report, acids, executor, optimize=False):
+    if optimize:
+        try:
+            optimize_report(report, executor=executor)
+        except Exception as e:
+            return error_result(report, e)
+    return report_result(report, acids)
+
+
+def parse_upload(upload):
+    """Разбор загруженного PDF/XLS тем же парсером, что и в окне приложения."""
+    suffix = Path(upload.filename or "").suffix.lower()
+    if suffix not in (".pdf", ".xls", ".xlsx"):
+        raise HTTPException(415, f"{upload.filename}: нужен PDF или XLS")
+
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(upload.file.read())
+        parser = parse_pdf_for_tables if suffix == ".pdf" else parse_excel_ration
+        ration, step_table = parser(path)
+    finally:
+        os.remove(path)
+    return tables_to_report(ration, step_table, Path(upload.filename).stem)
+
+
+def create_app(workers=None, warm=True, store=None):
+    @asynccontextmanager
+    async def lifespan(app):
+        # пул создаётся один раз: модели загружаются в воркеры при старте,
+        # пробный анализ компилирует numba/shap до первого запроса
+        app.state.executor = create_executor(workers) if workers != 0 else None
+        if warm:
+            warm_up(app.state.executor)
+        try:
+            yield
+        finally:
+            if app.state.executor is not None:
+                app.state.executor.shutdown(cancel_futures=True)
+
+    app = FastAPI(title="AgroTech predict", lifespan=lifespan)
+    # своя очередь графиков: pyplot рисует в одном потоке, а хранилище можно подменить
+    app.state.renderer = ChartRenderQueue(store=store if store is not None else graphics_store)
+    # только хранилище: рядом в desktop/graphics лежат папки графиков старых отчётов
+    root = app.state.renderer.store.store_dir
+    root.mkdir(parents=True, exist_ok=True)
+    app.mount("/charts", StaticFiles(directory=root), name="charts")
+
+    @app.get("/health")
+    def health():
+        return {"status": "ok"}
+
+    # обычные def: FastAPI выполняет их в пуле потоков, а тяжёлая работа уходит в пул процессов
+    @app.post("/predict", response_model=PredictResponse)
+    def predict(body: PredictRequest, request: Request):
+        reports = [item_to_report(item) for item in body.items]
+        state = request.app.state
+        renderer = state.renderer if body.charts else None
+        return PredictResponse(results=analyze_batch(reports, state.executor, body.fidelity, renderer,
+                                                     str(request.base_url), body.optimize))
+
+    @app.post("/predict/files", response_model=PredictResponse)
+    def predict_files(request: Request, files: List[UploadFile] = File(...), charts: bool = False,
+                      fidelity: Literal["fast", "standard", "exact"] = DEFAULT_FIDELITY, optimize: bool = False):
+        if len(files) > MAX_BATCH:
+            raise HTTPException(413, f"не больше {MAX_BATCH} файлов за запрос")
+        results, reports = [], []
+        for upload in files:
+            try:
+                reports.append(parse_upload(upload))
+                results.append(None)
+            except HTTPException:
+                raise
+            except Exception as e:
+                results.append(PredictResult(id="", name=upload.filename or "",
+                                             error=f"не удалось разобрать файл: {e}"))
+
+        state = request.app.state
+        renderer = state.renderer if charts else None
+        analyzed = iter(analyze_batch(reports, state.executor, fidelity, renderer, str(request.base_url), optimize))
+        return PredictResponse(results=[result or next(analyzed) for result in results])
+
+    return app
+
+
+def main(argv=None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="HTTP-сервис анализа рационов")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="процессов в пуле моделей (0 — считать в процессе сервиса)")
+    args = parser.parse_args(argv)
+
+    uvicorn.run(create_app(args.workers), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
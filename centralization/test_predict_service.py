@@ -0,0 +1,110 @@
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+
+from fastapi.testclient import TestClient
+
+from centralization import predict_service
+from centralization.predict_service import create_app
+from desktop.data_utils.config import acids
+from desktop.data_utils.graphics_store import GraphicsStore
+from desktop.data_utils.optimizer import outside_borders
+
+
+ITEM = {
+    "name": "Ферма 1",
+    "ration": {"кукуруза": 40.0, "соя": 20.0, "люцерна": 40.0},
+    "nutrients": {"СП (%)": 16.0, "Крахмал (%)": None},
+}
+
+
+@pytest.fixture(scope="module")
+def store(tmp_path_factory):
+    return GraphicsStore(tmp_path_factory.mktemp("graphics"))
+
+
+@pytest.fixture(scope="module")
+def client(store):
+    # workers=0 — без пула, модели в процессе теста
+    with TestClient(create_app(workers=0, warm=False, store=store)) as client:
+        yield client
+
+
+def test_predict_batch(client, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("без графиков пачка считается одним predict_from_files")
+
+    monkeypatch.setattr(predict_service, "predict_from_file", fail)
+    response = client.post("/predict", json={"items": [ITEM, dict(ITEM, name="Ферма 2")]})
+    assert response.status_code == 200
+
+    results = response.json()["results"]
+    assert [r["name"] for r in results] == ["Ферма 1", "Ферма 2"]
+    assert set(results[0]["acids"]) == set(acids)
+    assert results[0]["acids"] == results[1]["acids"]
+    assert results[0]["importance_acid"]
+    assert results[0]["charts"] == {}
+
+
+def test_predict_with_charts(client, store):
+    result = client.post("/predict", json={"items": [ITEM], "charts": True}).json()["results"][0]
+
+    assert result["charts"]
+    assert result["thumbnails"].keys() == result["charts"].keys()
+    for url in result["charts"].values():
+        assert client.get(url).headers["content-type"] == "image/png"
+
+    # отчёт ответа не сохраняется: графики держит закрепка, gc их не трогает
+    charts = {url.rsplit("/", 1)[1].split(".")[0] for url in result["charts"].values()}
+    assert charts <= store.pinned()
+    assert store.gc(store.pinned()) == (0, 0)
+
+
+def test_charts_serve_only_the_store(client, store):
+    legacy = store.root / "Ферма 1" / "chart.png"
+    legacy.parent.mkdir(parents=True, exist_ok=True)
+    legacy.write_bytes(b"png")
+    assert client.get("/charts/Ферма 1/chart.png").status_code == 404
+    assert client.get("/charts/../Ферма 1/chart.png").status_code == 404
+
+
+def test_failed_batch_is_logged(client, monkeypatch, caplog):
+    def fail(*args, **kwargs):
+        raise RuntimeError("пакетный путь сломан")
+
+    monkeypatch.setattr(predict_service, "predict_from_files", fail)
+    with caplog.at_level("ERROR", logger=predict_service.logger.name):
+        results = client.post("/predict", json={"items": [ITEM]}).json()["results"]
+
+    # отчёт всё равно посчитан по одному, а причина — в логе
+    assert results[0]["error"] is None
+    assert any("пакетный путь сломан" in record.exc_text for record in caplog.records if record.exc_text)
+
+
+def test_predict_with_optimize(client):
+    plain = client.post("/predict", json={"items": [ITEM]}).json()["results"][0]
+    assert plain["optimized_rations"] == []
+
+    result = client.post("/predict", json={"items": [ITEM], "optimize": True}).json()["results"][0]
+    assert result["error"] is None
+    if outside_borders(result["acids"]):
+        assert result["optimized_rations"]
+        assert all("outside" in c for c in result["optimized_rations"])
+    else:
+        assert result["optimized_rations"] == []
+
+
+def test_unknown_nutrient_is_rejected(client):
+    item = dict(ITEM, nutrients={"Белок": 1.0})
+    assert client.post("/predict", json={"items": [item]}).status_code == 422
+
+
+def test_predict_files(client):
+    path = "desktop/data_utils/test_data/Д1 ЖК Пеневичи 20.06.2025.pdf"
+    with open(path, "rb") as f:
+        response = client.post("/predict/files", files=[("files", ("ration.pdf", f, "application/pdf"))])
+
+    result = response.json()["results"][0]
+    assert result["error"] is None
+    assert set(result["acids"]) == set(acids)
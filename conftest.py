@@ -0,0 +1,24 @@
+import os
+
+import pytest
+
+
+@pytest.fixture(autouse=True, scope="session")
+def normalization_cache_in_tmp(tmp_path_factory):
+    """
+    Тесты не пишут в кэш нормализации пользователя: глобальный кэш — во
+    временном каталоге, в том числе у процессов пула и сервера анализа.
+    """
+    from desktop.data_utils.normalization_cache import PATH_ENV, normalization_cache
+
+    path = tmp_path_factory.mktemp("normalization") / "normalization.sqlite3"
+    previous = os.environ.get(PATH_ENV)
+    os.environ[PATH_ENV] = str(path)
+    normalization_cache.close()
+    normalization_cache.path = path
+    yield normalization_cache
+    normalization_cache.close()
+    if previous is None:
+        os.environ.pop(PATH_ENV, None)
+    else:
+        os.environ[PATH_ENV] = previous
@@ -1,3 +1,48 @@
-from .extract_data import *
+"""
+Данные и модели анализа.
+
+Лёгкие модули импортируются сразу. Тяжёлые (shap, sklearn, matplotlib,
+pandas, PyPDF2 тянутся через infer_model, charts, extract_data и т.д.)
+загружаются при первом обращении к имени из _LAZY, чтобы окно приложения
+показывалось раньше, чем загрузятся модели.
+"""
+import importlib
+
 from .config import *
-from .infer_model import predict_from_file
+from .registry import ModelRegistry, model_registry
+from .document import ReportDocument
+from .executor import create_executor, shared_executor, shutdown_shared_executor
+from .normalization_cache import NormalizationCache, normalization_cache
+from .result_cache import ResultCache, result_cache
+from .metrics import span, start_metrics_server
+
+
+# имя -> модуль, из которого оно загружается при первом обращении
+_LAZY = {
+    "parse_excel_ration": ".extract_data",
+    "parse_pdf_for_tables": ".extract_data",
+    "parse_step_table_excel": ".extract_data",
+    "parse_step_table_pdf": ".extract_data",
+    "extract_text_with_pypdf2": ".extract_data",
+    "predict_from_file": ".infer_model",
+    "predict_from_files": ".infer_model",
+    "chart_queue": ".charts",
+    "IngredientNormalizer": ".normalizer",
+    "ingredient_normalizer": ".normalizer",
+    "ScenarioEngine": ".scenarios",
+    "optimize": ".optimizer",
+    "optimize_report": ".optimizer",
+}
+
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
@@ -0,0 +1,347 @@
+"""
+Замеры времени по стадиям конвейера анализа.
+
+    python -m desktop.data_utils.benchmark --repeat 5 --synthetic 10 --out bench.json
+    python -m desktop.data_utils.benchmark --compare old.json new.json
+
+Входы — файлы из desktop/data_utils/test_data (PDF и XLS) и случайные рационы.
+Для каждой стадии печатаются p50/p95 в миллисекундах, в JSON сохраняются
+все замеры, пик RSS и коммит, чтобы сравнивать результаты между коммитами.
+
+Отдельная таблица — цена и точность режимов fidelity относительно "exact"
+(полный фон обучения, как в прежних explainer'ах): p50 SHAP на цель,
+корреляция векторов, совпадение топ-3 признаков и относительная L1-ошибка.
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from training import uniq_changed_ration, uniq_step
+
+from .config import acids, main_acids, medians_of_data, nutri
+from .document import ReportDocument
+from .explainers import DEFAULT_FIDELITY, FIDELITY
+from .extract_data import nutrient_key, parse_excel_ration, parse_pdf_for_tables, tables_to_report
+from .registry import MODELS_ROOT, ModelRegistry
+
+
+TEST_DATA = "desktop/data_utils/test_data"
+
+
+def peak_rss_mb():
+    """Пиковый RSS процесса в МБ (None, если платформа не даёт его узнать)."""
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / 2 ** 20
+        except (ImportError, AttributeError):
+            return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт КБ, macOS — байты
+    return rss / 2 ** 20 if sys.platform == "darwin" else rss / 1024
+
+
+class StageTimer:
+    """Копит длительности по именам стадий и пик RSS после каждой."""
+
+    def __init__(self):
+        self.samples = {}
+        self.rss = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.setdefault(name, []).append((time.perf_counter() - start) * 1000)
+            self.rss[name] = peak_rss_mb()
+
+    def summary(self):
+        result = {}
+        for name, values in self.samples.items():
+            values = np.asarray(values)
+            result[name] = {
+                "n": int(len(values)),
+                "p50_ms": float(np.percentile(values, 50)),
+                "p95_ms": float(np.percentile(values, 95)),
+                "mean_ms": float(values.mean()),
+                "max_ms": float(values.max()),
+                "peak_rss_mb": self.rss.get(name),
+            }
+        return result
+
+
+def synthetic_rations(count, seed=0):
+    """Случайные рационы: 6–10 ингредиентов, доли по Дирихле, нутриенты около медиан."""
+    rng = np.random.default_rng(seed)
+    for i in range(count):
+        names = rng.choice(uniq_changed_ration, rng.integers(6, 11), replace=False)
+        shares = rng.dirichlet(np.ones(len(names))) * 100
+        step_table = {}
+        for label in uniq_step:
+            median = medians_of_data.get(label)
+            if median is not None and rng.random() > 0.1:
+                step_table[nutrient_key(label)] = float(median * rng.uniform(0.8, 1.2))
+        yield f"synthetic_{i}", list(zip(names, shares)), step_table
+
+
+def parse_file(path):
+    if path.lower().endswith(".pdf"):
+        return parse_pdf_for_tables(path)
+    return parse_excel_ration(path)
+
+
+def load_inputs(timer, files, synthetic, seed=0):
+    inputs = []
+    for path in files:
+        try:
+            with timer.stage("parse"):
+                ration, step_table = parse_file(path)
+        except Exception as e:
+            print(f"пропущен {Path(path).name}: {e}")
+            continue
+        inputs.append((Path(path).stem, ration, step_table))
+    inputs.extend(synthetic_rations(synthetic, seed))
+    return inputs
+
+
+def time_model_load(timer, model_root=MODELS_ROOT):
+    """Холодная загрузка всех pkl моделей и explainer'ов в чистый реестр."""
+    from . import explainers
+
+    registry = ModelRegistry(model_root)
+    shared = explainers.model_registry
+    explainers.model_registry = registry
+    try:
+        with timer.stage("model_load"):
+            registry.preload(model_root)
+            explainers.warm_up_explainers(model_root)
+    finally:
+        explainers.model_registry = shared
+
+
+def run_pipeline(timer, name, data, workdir, fidelity=DEFAULT_FIDELITY):
+    """Одна итерация всех стадий для одного отчёта."""
+    from .charts import chart_path, draw_composite, draw_waterfall, explanation_from_spec
+    from .infer_model import (clear_data, explain_acid, explain_nutri, load_data_from_json,
+                              predict_from_file)
+    from .config import nutri_for_predict
+    from .numpy_models import resolve_model_path
+    from .registry import model_registry
+    from desktop.report import _convert_md_to_html, build_report
+
+    report = ReportDocument(Path(workdir) / "reports" / f"{name}.json", json.loads(json.dumps(data)))
+
+    with timer.stage("extract_to_row"):
+        row = load_data_from_json(report)
+    with timer.stage("clear_data"):
+        cleared = clear_data(row)
+
+    X = cleared.to_numpy()
+    with timer.stage("predict"):
+        for acid in acids:
+            model_registry.load(resolve_model_path(f"models/classic_pipe/acids/{acid}_ensemble.pkl")).predict(X)
+
+    row_values = X[0]
+    ration_row = cleared.drop(nutri_for_predict, axis=1).to_numpy()[0]
+    for acid in acids:
+        with timer.stage(f"shap:{acid}"):
+            explain_acid(row_values, acid, fidelity=fidelity)
+    for key, item in nutri.items():
+        with timer.stage(f"shap:{item}"):
+            explain_nutri(ration_row, key, fidelity=fidelity)
+
+    # результаты в отчёт — тем же путём, что и в приложении, без фоновых графиков
+    graphics_path = str(Path(workdir) / "graphics")
+    predict_from_file(report, charts=None, jobs=None, fidelity=fidelity, memo=None)
+    specs = report["shap_values"]
+
+    with timer.stage("waterfall"):
+        acid = main_acids[0]
+        draw_waterfall(explanation_from_spec(specs[acid]), acid, chart_path(name, acid, graphics_path))
+    with timer.stage("composite"):
+        draw_composite([specs[m] for m in report["composites"]["uni"]], chart_path(name, "uni", graphics_path))
+
+    md_path = Path(workdir) / "final_reports" / f"{name}.md"
+    with timer.stage("build_report"):
+        md_text = build_report(report.data, md_path)
+    with timer.stage("md_to_html"):
+        _convert_md_to_html(md_text)
+
+
+def shap_agreement(reference, values):
+    """Близость SHAP-вектора к эталонному: корреляция, доля общего топ-3, относительная L1."""
+    reference, values = np.ravel(reference), np.ravel(values)
+    if reference.std() > 0 and values.std() > 0:
+        corr = float(np.corrcoef(reference, values)[0, 1])
+    else:
+        corr = float(np.allclose(reference, values))
+    top = len(set(np.argsort(-np.abs(reference))[:3]) & set(np.argsort(-np.abs(values))[:3])) / 3
+    l1 = float(np.abs(reference - values).sum() / max(np.abs(reference).sum(), 1e-12))
+    return corr, top, l1
+
+
+def fidelity_tradeoff(inputs, fidelities=tuple(FIDELITY), warmup=1):
+    """
+    Задержка и точность SHAP в каждом режиме fidelity на тех же входах.
+    Эталон — "exact"; для моделей кислот и нутриентов считается отдельно.
+    """
+    from .config import nutri_for_predict
+    from .infer_model import clear_data, explain_acid, explain_nutri, load_data_from_json
+
+    rows = []
+    for name, ration, step_table in inputs:
+        data = tables_to_report(ration, step_table, name)
+        cleared = clear_data(load_data_from_json(ReportDocument(Path(tempfile.gettempdir()) / f"{name}.json", data)))
+        rows.append((cleared.to_numpy()[0], cleared.drop(nutri_for_predict, axis=1).to_numpy()[0]))
+
+    targets = [("acid", acid, explain_acid, 0) for acid in acids]
+    targets += [("nutrient", key, explain_nutri, 1) for key in nutri]
+
+    values, timers = {}, {}
+    for fidelity in ("exact",) + tuple(f for f in fidelities if f != "exact"):
+        timer = timers[fidelity] = StageTimer()
+        for row in rows[:warmup]:
+            for kind, target, explain, column in targets:
+                explain(row[column], target, fidelity=fidelity)
+        for i, row in enumerate(rows):
+            for kind, target, explain, column in targets:
+                with timer.stage(kind):
+                    explanation = explain(row[column], target, fidelity=fidelity)
+                if kind == "acid":
+                    explanation = explanation[1]
+                values[fidelity, i, target] = explanation.values
+
+    result = {}
+    for fidelity in fidelities:
+        summary = timers[fidelity].summary()
+        for kind in ("acid", "nutrient"):
+            scores = np.array([
+                shap_agreement(values["exact", i, target], values[fidelity, i, target])
+                for i in range(len(rows))
+                for k, target, _, _ in targets if k == kind
+            ])
+            result.setdefault(fidelity, {})[kind] = {
+                "p50_ms": summary[kind]["p50_ms"],
+                "p95_ms": summary[kind]["p95_ms"],
+                "corr": float(scores[:, 0].mean()),
+                "top3": float(scores[:, 1].mean()),
+                "rel_l1": float(scores[:, 2].mean()),
+            }
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(repeat=3, synthetic=5, files=None, warmup=1, seed=0, fidelity=DEFAULT_FIDELITY, tradeoff=True):
+    files = sorted(glob.glob(f"{TEST_DATA}/*")) if files is None else files
+    timer = StageTimer()
+
+    for _ in range(repeat):
+        time_model_load(timer)
+    inputs = load_inputs(timer, files, synthetic, seed)
+    for _ in range(repeat - 1):
+        load_inputs(timer, files, 0)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # первый прогон прогревает numba/shap и кэши моделей — в замеры не идёт
+        for name, ration, step_table in inputs[:warmup]:
+            run_pipeline(StageTimer(), name, tables_to_report(ration, step_table, name), workdir, fidelity)
+        for _ in range(repeat):
+            for name, ration, step_table in inputs:
+                run_pipeline(timer, name, tables_to_report(ration, step_table, name), workdir, fidelity)
+
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "repeat": repeat,
+        "fidelity": fidelity,
+        "inputs": [name for name, _, _ in inputs],
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": timer.summary(),
+        "fidelity_tradeoff": fidelity_tradeoff(inputs, warmup=warmup) if tradeoff else None,
+    }
+
+
+def print_summary(result):
+    print(f"коммит {result.get('commit')}, входов {len(result['inputs'])}, повторов {result['repeat']}, "
+          f"fidelity {result.get('fidelity', 'exact')}")
+    print(f"{'стадия':<36}{'n':>5}{'p50, мс':>12}{'p95, мс':>12}")
+    for name, s in result["stages"].items():
+        print(f"{name:<36}{s['n']:>5}{s['p50_ms']:>12.1f}{s['p95_ms']:>12.1f}")
+    if result.get("peak_rss_mb") is not None:
+        print(f"пик RSS: {result['peak_rss_mb']:.0f} МБ")
+    if result.get("fidelity_tradeoff"):
+        print_tradeoff(result["fidelity_tradeoff"])
+
+
+def print_tradeoff(tradeoff):
+    print(f"\n{'fidelity':<10}{'модели':<10}{'p50, мс':>9}{'p95, мс':>9}{'corr':>8}{'топ-3':>8}{'L1':>8}")
+    for fidelity, kinds in tradeoff.items():
+        for kind, s in kinds.items():
+            print(f"{fidelity:<10}{kind:<10}{s['p50_ms']:>9.1f}{s['p95_ms']:>9.1f}"
+                  f"{s['corr']:>8.3f}{s['top3']:>8.2f}{s['rel_l1']:>8.3f}")
+
+
+def compare(old, new):
+    """Печатает изменение p50/p95 по стадиям между двумя JSON-результатами."""
+    print(f"{'стадия':<36}{'p50 было':>10}{'стало':>10}{'×':>7}{'p95 было':>10}{'стало':>10}{'×':>7}")
+    for name in new["stages"]:
+        if name not in old["stages"]:
+            continue
+        a, b = old["stages"][name], new["stages"][name]
+        print(f"{name:<36}{a['p50_ms']:>10.1f}{b['p50_ms']:>10.1f}{b['p50_ms'] / max(a['p50_ms'], 1e-9):>7.2f}"
+              f"{a['p95_ms']:>10.1f}{b['p95_ms']:>10.1f}{b['p95_ms'] / max(a['p95_ms'], 1e-9):>7.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры времени стадий анализа отчёта")
+    parser.add_argument("--repeat", type=int, default=3, help="повторов на каждый вход")
+    parser.add_argument("--synthetic", type=int, default=5, help="число случайных рационов")
+    parser.add_argument("--files", nargs="*", help=f"файлы PDF/XLS (по умолчанию {TEST_DATA}/*)")
+    parser.add_argument("--out", help="куда сохранить JSON с результатами")
+    parser.add_argument("--fidelity", choices=list(FIDELITY), default=DEFAULT_FIDELITY,
+                        help="точность SHAP для замеров стадий")
+    parser.add_argument("--no-tradeoff", action="store_true",
+                        help="не сравнивать режимы fidelity с exact")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="сравнить два JSON")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        old, new = (json.loads(Path(p).read_text(encoding="utf-8")) for p in args.compare)
+        compare(old, new)
+        return
+
+    result = run(args.repeat, args.synthetic, args.files, fidelity=args.fidelity,
+                 tradeoff=not args.no_tradeoff)
+    print_summary(result)
+    if args.out:
+        Path(args.out).write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"сохранено в {args.out}")
+
+
+if __name__ == "__main__":
+    main()
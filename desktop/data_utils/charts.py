@@ -0,0 +1,320 @@
+import copy
+import itertools
+import queue
+import threading
+import traceback
+from pathlib import Path
+
+import numpy as np
+import shap
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+from .document import ReportDocument
+from .graphics_store import chart_id, graphics_store, is_chart_id
+from .metrics import span
+
+
+# имена файлов сводных графиков (ключи graphics в отчёте)
+COMPOSITE_FILES = {"uni": "uni_acids", "uni_nutri": "uni_nutri"}
+
+URGENT = 0
+BACKGROUND = 10
+
+# разрешение сводных графиков и отдельных панелей — как у прежнего экспорта
+DEFAULT_DPI = 300
+
+POSITIVE_COLOR = "#ff0051"
+NEGATIVE_COLOR = "#008bfb"
+
+
+def chart_path(report_name, key, graphics_path="desktop/graphics"):
+    """Путь PNG в папке отчёта — для графиков вне graphics_store (бенчмарк, старые отчёты)."""
+    return f"{graphics_path}/{report_name}/{COMPOSITE_FILES.get(key, key)}.png"
+
+
+def reset_charts(report):
+    """
+    Сбрасывает графики отчёта перед новым анализом: старые отчёты хранят
+    в graphics абсолютные пути по целям, которые иначе перерисовывались бы
+    по этим путям. После анализа в graphics только ID из graphics_store.
+    """
+    report["graphics"] = {}
+    report["shap_values"] = {}
+    report["composites"] = {}
+
+
+def add_waterfall(report, key, explanation, title, export=False):
+    """
+    Сохраняет SHAP-вектор одной цели в report["shap_values"]. Отдельный PNG
+    с waterfall-графиком рисуется только при export=True (см. export_panels):
+    в отчёт идут сводные графики, собранные из этих векторов.
+    """
+    key = str(key)
+    spec = report.setdefault("shap_values", {})[key] = {
+        "title": title,
+        "feature_names": list(explanation.feature_names),
+        "values": np.asarray(explanation.values, dtype=float).tolist(),
+        "base_value": float(np.ravel(explanation.base_values)[0]),
+        "data": np.asarray(explanation.data, dtype=float).tolist(),
+    }
+    if export:
+        report.set_graphic(key, chart_id("waterfall", spec))
+
+
+def add_composite(report, key, members):
+    """Регистрирует сводный график из уже добавленных SHAP-векторов members."""
+    # ключи как в JSON: номера нутриентов становятся строками
+    members = [str(m) for m in members]
+    if not members:
+        return
+    report.setdefault("composites", {})[key] = members
+    shap_values = report["shap_values"]
+    report.set_graphic(key, chart_id("composite", [shap_values[m] for m in members]))
+
+
+def export_panels(report, keys=None):
+    """Запрашивает отдельные PNG для keys (по умолчанию — для всех сохранённых векторов)."""
+    shap_values = report.get("shap_values") or {}
+    for key in (shap_values if keys is None else [str(k) for k in keys]):
+        if key in shap_values:
+            report.set_graphic(key, chart_id("waterfall", shap_values[key]))
+
+
+def explanation_from_spec(spec):
+    return shap.Explanation(values=np.asarray(spec["values"]),
+                            base_values=spec["base_value"],
+                            data=np.asarray(spec["data"]),
+                            feature_names=spec["feature_names"])
+
+
+def draw_waterfall(explanation, title, path, dpi=DEFAULT_DPI):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+    shap.plots.waterfall(explanation, show=False)
+    plt.title(title, fontsize=12, pad=20)
+    plt.savefig(path, dpi=dpi, bbox_inches="tight")
+    plt.close()
+
+
+def draw_panel(ax, spec, max_display=8):
+    """
+    Waterfall одной цели на заданных осях: от E[f(X)] снизу к f(x) сверху,
+    самые сильные вклады наверху, остальные признаки — одной полосой.
+    """
+    values = np.asarray(spec["values"], dtype=float)
+    data = np.asarray(spec["data"], dtype=float)
+    names = spec["feature_names"]
+    base = spec["base_value"]
+
+    order = np.argsort(-np.abs(values))
+    shown, rest = order[:max_display], order[max_display:]
+
+    labels = [f"{data[i]:.4g} = {names[i]}" for i in shown]
+    contribs = list(values[shown])
+    if len(rest):
+        labels.append(f"ещё {len(rest)} признаков")
+        contribs.append(values[rest].sum())
+
+    # рисуем снизу вверх, начиная с базового значения
+    labels, contribs = labels[::-1], np.array(contribs[::-1])
+    lefts = base + np.concatenate([[0.0], np.cumsum(contribs)[:-1]])
+    colors = [POSITIVE_COLOR if c >= 0 else NEGATIVE_COLOR for c in contribs]
+    y = np.arange(len(contribs))
+
+    ax.barh(y, contribs, left=lefts, color=colors, height=0.6)
+    for yi, left, c in zip(y, lefts, contribs):
+        ax.text(left + c, yi, f" {c:+.2f} ", va="center",
+                ha="left" if c >= 0 else "right", fontsize=8, color=colors[yi])
+
+    prediction = base + contribs.sum()
+    ax.axvline(base, color="#888888", linestyle="--", linewidth=0.8)
+    ax.axvline(prediction, color="#333333", linestyle=":", linewidth=0.8)
+    ax.set_yticks(y, labels, fontsize=9)
+    # barh закрепляет края полос (sticky edges), поэтому поля по x задаём сами
+    ends = np.concatenate([lefts, lefts + contribs, [base]])
+    pad = 0.25 * max(ends.max() - ends.min(), 1e-6)
+    ax.set_xlim(ends.min() - pad, ends.max() + pad)
+    ax.spines[["top", "right", "left"]].set_visible(False)
+    ax.set_title(f"{spec['title']}\nE[f(X)] = {base:.2f}   f(x) = {prediction:.2f}", fontsize=11)
+
+
+def draw_composite(specs, path, dpi=DEFAULT_DPI, cols=2, max_display=8):
+    """Сводный график: одна фигура с панелью на каждую цель, сохраняется одним PNG."""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+    cols = min(cols, len(specs))
+    rows = -(-len(specs) // cols)
+    fig, axes = plt.subplots(rows, cols, squeeze=False,
+                             figsize=(7 * cols, (0.45 * (max_display + 1) + 1.2) * rows))
+
+    for ax, spec in zip(axes.flat, specs):
+        draw_panel(ax, spec, max_display)
+    for ax in axes.flat[len(specs):]:
+        ax.set_visible(False)
+
+    fig.tight_layout()
+    fig.savefig(path, dpi=dpi, bbox_inches="tight")
+    plt.close(fig)
+
+
+def _render(value, draw, force, store):
+    """
+    Один график: ID из graphics_store рисуется, только если его ещё нет
+    (одинаковое содержимое — один файл, force не нужен), старый путь
+    в папке отчёта — как раньше, с учётом force.
+    """
+    if is_chart_id(value):
+        with span("render"):
+            drawn = store.put(value, draw)
+        return str(store.path(value)) if drawn else None
+
+    if force or not Path(value).exists():
+        with span("render"):
+            draw(value)
+        return value
+    return None
+
+
+def render_charts(data, force=False, dpi=DEFAULT_DPI, store=None):
+    """
+    Рисует PNG отчёта по сохранённым SHAP-векторам: сводные графики и те
+    отдельные панели, для которых в graphics запрошен график. Уже
+    существующие графики не перерисовываются (для старых отчётов с путями
+    вместо ID — без force). Возвращает пути нарисованных файлов.
+    """
+    store = store if store is not None else graphics_store
+    graphics = data.get("graphics", {}) or {}
+    shap_values = data.get("shap_values") or {}
+    rendered = []
+
+    for key, members in (data.get("composites") or {}).items():
+        if graphics.get(key):
+            specs = [shap_values[m] for m in members]
+            rendered.append(_render(graphics[key], lambda path: draw_composite(specs, path, dpi), force, store))
+
+    for key, spec in shap_values.items():
+        if graphics.get(key):
+            draw = lambda path: draw_waterfall(explanation_from_spec(spec), spec["title"], path, dpi)
+            rendered.append(_render(graphics[key], draw, force, store))
+
+    return [path for path in rendered if path is not None]
+
+
+class _Job:
+    def __init__(self, data, force):
+        self.data = data
+        self.force = force
+        self.started = False
+        self.done = threading.Event()
+        self.error = None
+        self.rendered = []
+
+
+class ChartRenderQueue:
+    """
+    Фоновая отрисовка графиков отчётов.
+
+    Анализ только кладёт SHAP-векторы в отчёт и ставит его в очередь, поэтому
+    результат появляется сразу после расчёта моделей. Один поток-отрисовщик
+    (pyplot не потокобезопасен) рисует отчёты по приоритету; render_now
+    поднимает отчёт в начало очереди и ждёт его графики — например, перед
+    показом вкладки с отчётом. Поток не демон: при выходе из программы
+    начатая очередь дорисовывается.
+    """
+
+    def __init__(self, dpi=DEFAULT_DPI, store=None):
+        self.dpi = dpi
+        self.store = store
+        self._queue = queue.PriorityQueue()
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+        self._thread = None
+
+    @staticmethod
+    def _snapshot(report):
+        data = report.data if isinstance(report, ReportDocument) else report
+        return {key: copy.deepcopy(data.get(key)) for key in ("graphics", "shap_values", "composites")}
+
+    def submit(self, report, priority=BACKGROUND, force=True):
+        """
+        Ставит графики отчёта в очередь. Берётся снимок данных, так что документ
+        можно сохранять и менять дальше. force=True — перерисовать даже
+        существующие PNG (повторный анализ того же отчёта).
+        """
+        data = self._snapshot(report)
+        with self._lock:
+            job = self._jobs.get(report.name)
+            if job is not None and not job.started:
+                # отчёт ещё ждёт в очереди — просто обновляем его данные
+                job.data = data
+                job.force = job.force or force
+            else:
+                job = self._jobs[report.name] = _Job(data, force)
+            self._queue.put((priority, next(self._counter), report.name))
+            self._ensure_worker()
+        return job
+
+    def render_now(self, report, timeout=None):
+        """
+        Дожидается графиков отчёта (ReportDocument или путь к JSON).
+        Отчёт из очереди поднимается в начало; старый отчёт с диска дорисовывается
+        только недостающими файлами. Возвращает пути нарисованных файлов.
+        """
+        if not isinstance(report, ReportDocument):
+            report = ReportDocument.load(report)
+
+        with self._lock:
+            job = self._jobs.get(report.name)
+            if job is not None:
+                self._queue.put((URGENT, next(self._counter), report.name))
+                self._ensure_worker()
+
+        if job is None:
+            job = self.submit(report, URGENT, force=False)
+
+        if not job.done.wait(timeout):
+            raise TimeoutError(f"графики {report.name} не готовы за {timeout} с")
+        if job.error is not None:
+            raise job.error
+        return job.rendered
+
+    def pending(self):
+        with self._lock:
+            return len(self._jobs)
+
+    def _ensure_worker(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="chart-render")
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if self._queue.empty():
+                    self._thread = None
+                    return
+                _, _, name = self._queue.get()
+                job = self._jobs.get(name)
+
+                # повторная запись о том же отчёте (после render_now) — уже нарисован
+                if job is None or job.started:
+                    continue
+                job.started = True
+
+            try:
+                job.rendered = render_charts(job.data, force=job.force, dpi=self.dpi, store=self.store)
+            except Exception as e:
+                traceback.print_exc()
+                job.error = e
+            finally:
+                with self._lock:
+                    if self._jobs.get(name) is job:
+                        del self._jobs[name]
+                job.done.set()
+
+
+# Глобальный экземпляр
+chart_queue = ChartRenderQueue()
@@ -0,0 +1,119 @@
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+
+def _read_umask():
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+# umask читается один раз: os.umask меняет его для всего процесса
+_UMASK = _read_umask()
+
+
+def replace_file(tmp_path, path):
+    """
+    Подменяет path временным файлом tmp_path. mkstemp создаёт файл с правами
+    0600, поэтому до подмены ему выставляются права прежнего файла, а для
+    нового — 0666 с учётом umask, как у обычного open().
+    """
+    try:
+        mode = os.stat(path).st_mode & 0o7777
+    except FileNotFoundError:
+        mode = 0o666 & ~_UMASK
+    os.chmod(tmp_path, mode)
+    os.replace(tmp_path, path)
+
+
+def atomic_write_json(path, data):
+    """
+    Пишет JSON во временный файл рядом и подменяет им path через os.replace:
+    читатель видит либо старый, либо новый файл целиком, но не обрывок.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        replace_file(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class ReportDocument:
+    """
+    JSON-отчёт анализа в памяти.
+
+    Проходит через весь конвейер (extract_to_row -> predict_from_file ->
+    write_report_files), каждая стадия дописывает свои поля в data,
+    а на диск документ сохраняется один раз в конце.
+    """
+
+    def __init__(self, path, data=None):
+        self.path = Path(path)
+        self.data = data if data is not None else {}
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(path, json.load(f))
+
+    @property
+    def name(self):
+        """Имя отчёта без расширения."""
+        return self.path.stem
+
+    def set_graphic(self, key, chart_id):
+        """
+        Ссылка на график: ID в graphics_store, а не путь к файлу (старые
+        отчёты хранят абсолютные пути, их разрешает graphics_store.resolve).
+        """
+        self.data.setdefault("graphics", {})[str(key)] = chart_id
+
+    def save(self, path=None):
+        if path is not None:
+            self.path = Path(path)
+        atomic_write_json(self.path, self.data)
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def setdefault(self, key, default=None):
+        return self.data.setdefault(key, default)
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __repr__(self):
+        return f"ReportDocument({str(self.path)!r})"
+
+
+@contextmanager
+def open_report(report):
+    """
+    Документ для изменения. Готовый ReportDocument отдаётся как есть — сохранит
+    его владелец; путь открывается здесь и сохраняется при выходе без ошибок.
+    """
+    if isinstance(report, ReportDocument):
+        yield report
+        return
+
+    document = ReportDocument.load(report)
+    yield document
+    document.save()
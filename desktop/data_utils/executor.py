@@ -0,0 +1,75 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from .registry import MODELS_ROOT, model_registry
+
+
+def init_worker(model_root=MODELS_ROOT):
+    """
+    Инициализатор процесса пула: модели и explainer'ы загружаются один раз
+    при старте воркера, а не в каждой задаче.
+    """
+    from .explainers import warm_up_explainers
+
+    model_registry.preload(model_root)
+    warm_up_explainers(model_root)
+
+
+def create_executor(workers=None, model_root=MODELS_ROOT):
+    """
+    Пул процессов для задач predict+SHAP по отдельным кислотам и нутриентам.
+
+    Используется spawn, а не fork: пул создаётся из процесса с Qt и потоками.
+    """
+    workers = workers or os.cpu_count() or 1
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_worker,
+        initargs=(model_root,),
+    )
+
+
+_shared_executor = None
+_shared_lock = threading.Lock()
+
+
+def shared_executor(workers=None):
+    """
+    Общий на приложение пул: воркеры живут между анализами и держат модели
+    в памяти. На одноядерной машине возвращает None — считаем в текущем процессе.
+    """
+    global _shared_executor
+
+    workers = workers or min(os.cpu_count() or 1, 8)
+    if workers < 2:
+        return None
+
+    with _shared_lock:
+        if _shared_executor is None:
+            _shared_executor = create_executor(workers)
+        return _shared_executor
+
+
+def shutdown_shared_executor():
+    global _shared_executor
+
+    with _shared_lock:
+        if _shared_executor is not None:
+            _shared_executor.shutdown(cancel_futures=True)
+            _shared_executor = None
+
+
+def submit(executor, fn, *args, **kwargs):
+    """executor.submit(...) или синхронный вызов, если пула нет; всегда возвращает Future."""
+    if executor is not None:
+        return executor.submit(fn, *args, **kwargs)
+
+    future = Future()
+    try:
+        future.set_result(fn(*args, **kwargs))
+    except BaseException as e:
+        future.set_exception(e)
+    return future
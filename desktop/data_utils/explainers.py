@@ -0,0 +1,328 @@
+import copy
+
+import numpy as np
+import pandas as pd
+import shap
+from sklearn.cluster import KMeans
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from .config import acids, nutri
+from .predictor import bind_explainer
+from .numpy_models import resolve_model_path
+from .registry import model_registry
+
+
+# Точность объяснений: размер фона (None — все ~90 строк обучения из pkl),
+# бюджет вызовов модели перестановочного SHAP нутриентов и SVR в ансамбле кислот.
+# "exact" — прежние explainer'ы без изменений, по умолчанию: "standard" и "fast"
+# заметно меняют важности в отчётах и включаются только явно.
+FIDELITY = {
+    "fast": {"background": 8, "max_evals": 120, "svr_nsamples": 80},
+    "standard": {"background": 32, "max_evals": 200, "svr_nsamples": 150},
+    "exact": {"background": None, "max_evals": 500, "svr_nsamples": 300},
+}
+DEFAULT_FIDELITY = "exact"
+
+
+def fidelity_params(fidelity):
+    try:
+        return FIDELITY[fidelity]
+    except KeyError:
+        raise ValueError(f"неизвестная точность {fidelity!r}: допустимы {list(FIDELITY)}") from None
+
+
+def summarize_background(X, size, seed=0):
+    """
+    Сжатый фон: k-means по строкам обучения, от каждого кластера — ближайшая
+    к центру реальная строка (доли рациона остаются согласованными, в отличие
+    от центроидов), вес — доля строк кластера. Возвращает (строки, веса).
+    """
+    X = np.asarray(X, dtype=float)
+    if size is None or len(X) <= size:
+        return X, np.full(len(X), 1.0 / len(X))
+
+    km = KMeans(n_clusters=size, n_init=4, random_state=seed).fit(X)
+    rows, weights = [], []
+    for cluster, center in enumerate(km.cluster_centers_):
+        members = np.flatnonzero(km.labels_ == cluster)
+        nearest = members[np.argmin(((X[members] - center) ** 2).sum(axis=1))]
+        rows.append(X[nearest])
+        weights.append(len(members))
+    return np.asarray(rows), np.asarray(weights, dtype=float) / len(X)
+
+
+def _split_pipeline(pipe):
+    """Pipeline([... , ('model', m)]) -> (преобразование признаков или None, модель)."""
+    if isinstance(pipe, Pipeline):
+        transform = pipe[:-1] if len(pipe.steps) > 1 else None
+        return transform, pipe.steps[-1][1]
+    return None, pipe
+
+
+def _is_tree_model(model):
+    # CatBoost, RandomForest / GradientBoosting из sklearn, одиночные деревья
+    return (hasattr(model, "get_feature_importance")
+            or hasattr(model, "tree_")
+            or hasattr(model, "estimators_"))
+
+
+class _TreePart:
+    """Точный interventional TreeSHAP для деревьев после скейлера."""
+
+    def __init__(self, pipe, background):
+        self.transform, model = _split_pipeline(pipe)
+        self.explainer = shap.TreeExplainer(model, data=self._prepare(background),
+                                            feature_perturbation="interventional")
+        # TreeExplainer для CatBoost отдаёт некорректный expected_value,
+        # поэтому базу считаем сами — среднее предсказание по фону
+        self.base_value = float(np.mean(pipe.predict(background)))
+
+    def _prepare(self, X):
+        return X if self.transform is None else self.transform.transform(X)
+
+    def shap_values(self, X):
+        return np.asarray(self.explainer.shap_values(self._prepare(X), check_additivity=False))
+
+
+class _LinearPart:
+    """Линейный SHAP в закрытой форме: phi_i = w_i / scale_i * (x_i - E[x_i])."""
+
+    def __init__(self, pipe, background, weights=None):
+        transform, model = _split_pipeline(pipe)
+        coef = np.ravel(model.coef_)
+        if transform is not None:
+            scaler = transform.steps[-1][1]
+            coef = coef / scaler.scale_
+        self.coef = coef
+        self.background_mean = np.average(background, axis=0, weights=weights)
+        self.base_value = float(np.average(pipe.predict(background), weights=weights))
+
+    def shap_values(self, X):
+        return (X - self.background_mean) * self.coef
+
+
+class _SampledPart:
+    """Перестановочный SHAP по сжатому фону — для моделей без точного алгоритма (SVR)."""
+
+    def __init__(self, pipe, background, n_background=20, nsamples=300):
+        if n_background and len(background) > n_background:
+            background, _ = summarize_background(background, n_background)
+        self.predict = pipe.predict
+        self.background = np.asarray(background, dtype=float)
+        # Independent masker перебирает строки фона поровну — база тоже невзвешенная
+        self.base_value = float(np.mean(pipe.predict(self.background)))
+        # перестановочному SHAP нужно не меньше 2 * число признаков + 1 вызовов
+        self.max_evals = max(nsamples, 2 * self.background.shape[1] + 1)
+
+    def shap_values(self, X):
+        # masker держит буферы маскирования, поэтому explainer свой на каждый вызов:
+        # EnsembleExplainer из кэша model_registry общий для потоков
+        masker = shap.maskers.Independent(self.background, max_samples=len(self.background))
+        explainer = shap.PermutationExplainer(self.predict, masker)
+        return np.asarray(explainer(X, max_evals=self.max_evals, silent=True).values)
+
+
+def _make_part(pipe, background, svr_background, svr_nsamples, weights=None):
+    transform, model = _split_pipeline(pipe)
+    if _is_tree_model(model):
+        # interventional TreeSHAP весов фона не принимает: строки берутся поровну,
+        # base_value — тоже невзвешенное среднее, так что сумма SHAP сходится
+        return _TreePart(pipe, background)
+
+    linear_transform = transform is None or (
+        len(transform.steps) == 1 and isinstance(transform.steps[-1][1], StandardScaler))
+    if linear_transform and hasattr(model, "coef_"):
+        return _LinearPart(pipe, background, weights)
+
+    # веса кластеров Independent masker не принимает, как и TreeSHAP
+    return _SampledPart(pipe, background, svr_background, svr_nsamples)
+
+
+class EnsembleExplainer:
+    """
+    SHAP для VotingRegressor(catboost, random_forest, ridge, svr) из train.py.
+
+    CatBoost и RandomForest объясняются точным TreeSHAP, Ridge — в закрытой
+    форме после обращения StandardScaler, и только SVR — перестановочной оценкой.
+    Вклады участников складываются с весами ансамбля, так что сумма SHAP
+    плюс base_value равна ensemble.predict(x).
+
+    Вызов совместим с shap.Explainer: explainer(X) -> shap.Explanation.
+    weights — веса строк фона после summarize_background (см. summarized).
+    """
+
+    def __init__(self, ensemble, background, feature_names=None,
+                 svr_background=20, svr_nsamples=300, weights=None):
+        self.ensemble = ensemble
+        self.background = np.asarray(background, dtype=float)
+        self.feature_names = list(feature_names) if feature_names is not None else None
+        self.svr_background = svr_background
+        self.svr_nsamples = svr_nsamples
+        self.weights = None if weights is None else np.asarray(weights, dtype=float)
+        self._parts = None
+
+    def summarized(self, size, svr_nsamples=None):
+        """Копия со сжатым до size строк фоном (size=None — исходный фон)."""
+        background, weights = summarize_background(self.background, size)
+        if size is None:
+            weights = self.weights
+        return EnsembleExplainer(self.ensemble, background, self.feature_names,
+                                 min(self.svr_background, len(background)),
+                                 svr_nsamples or self.svr_nsamples, weights)
+
+    def __getstate__(self):
+        # внутренние explainer'ы shap не сохраняем — они быстро строятся заново
+        state = self.__dict__.copy()
+        state["_parts"] = None
+        return state
+
+    @property
+    def parts(self):
+        if self._parts is None:
+            estimators = self.ensemble.estimators_
+            weights = self.ensemble.weights or [1.0] * len(estimators)
+            total = float(sum(weights))
+            self._parts = [
+                (w / total, _make_part(pipe, self.background, self.svr_background, self.svr_nsamples,
+                                       getattr(self, "weights", None)))
+                for w, pipe in zip(weights, estimators)
+            ]
+        return self._parts
+
+    @property
+    def expected_value(self):
+        return sum(w * part.base_value for w, part in self.parts)
+
+    def shap_values(self, X):
+        X = np.asarray(X, dtype=float)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        return sum(w * part.shap_values(X) for w, part in self.parts)
+
+    def __call__(self, X):
+        if isinstance(X, pd.DataFrame):
+            feature_names = list(X.columns)
+        else:
+            feature_names = self.feature_names
+        X = np.asarray(X, dtype=float)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+
+        values = self.shap_values(X)
+        base_values = np.full(len(X), self.expected_value)
+        return shap.Explanation(values=values, base_values=base_values,
+                                data=X, feature_names=feature_names)
+
+
+def as_ensemble_explainer(explainer, ensemble, feature_names=None):
+    """
+    Переводит старый pickled shap.Explainer (перестановочный, поверх ensemble_predict)
+    в EnsembleExplainer с тем же фоном. Новые объекты возвращаются как есть.
+    """
+    if isinstance(explainer, EnsembleExplainer):
+        return explainer
+
+    background = explainer.masker.data
+    if feature_names is None:
+        feature_names = explainer.feature_names
+    return EnsembleExplainer(ensemble, background, feature_names)
+
+
+def summarize_nutri_explainer(explainer, size):
+    """Копия перестановочного explainer'а нутриента с masker'ом по сжатому фону."""
+    if size is None:
+        return explainer
+    background, _ = summarize_background(explainer.masker.data, size)
+    summarized = copy.copy(explainer)
+    # Independent masker перебирает все строки фона на каждую перестановку,
+    # поэтому стоимость падает пропорционально size / ~90
+    summarized.masker = shap.maskers.Independent(background, max_samples=len(background))
+    return summarized
+
+
+def load_acid_explainer(acid, model_path="models/classic_pipe/acids",
+                        explainer_path="models/classic_pipe/acid_explainers",
+                        fidelity=DEFAULT_FIDELITY):
+    """
+    EnsembleExplainer кислоты из общего кэша; старые pkl переводятся на лету.
+    Фон в pkl полный, сжатый под fidelity строится при первом обращении.
+    """
+    params = fidelity_params(fidelity)
+
+    def factory(explainer, ensemble, feature_names):
+        explainer = as_ensemble_explainer(explainer, ensemble, feature_names)
+        if params["background"] is None:
+            return explainer
+        return explainer.summarized(params["background"], params["svr_nsamples"])
+
+    return model_registry.derive(
+        f"acid_explainer:{fidelity}",
+        [f"{explainer_path}/{acid}_explainer.pkl",
+         f"{model_path}/{acid}_ensemble.pkl",
+         f"{explainer_path}/feature_names.pkl"],
+        factory,
+    )
+
+
+def load_nutri_explainer(key, nutri_path="models/classic_pipe/nutri",
+                         importance_path="models/classic_pipe/nutri_explainers",
+                         fidelity=DEFAULT_FIDELITY):
+    """
+    Explainer нутриента, привязанный к своей модели (без глобального ensemble).
+    Перестановочный SHAP вызывает модель сотни раз, поэтому берётся
+    скомпилированная NumPy-версия, если она есть (см. numpy_models).
+    Бюджет вызовов под fidelity — nutri_max_evals.
+    """
+    size = fidelity_params(fidelity)["background"]
+    explainer = model_registry.derive(
+        f"nutri_explainer:{fidelity}",
+        [f"{importance_path}/{key}_explainers.pkl",
+         resolve_model_path(f"{nutri_path}/{key}_catboost.pkl")],
+        lambda explainer, model: summarize_nutri_explainer(bind_explainer(explainer, model), size),
+    )
+    # explainer в кэше общий, а masker держит буферы маскирования:
+    # каждому вызывающему — своя копия masker'а
+    own = copy.copy(explainer)
+    own.masker = copy.deepcopy(explainer.masker)
+    return own
+
+
+def nutri_max_evals(fidelity=DEFAULT_FIDELITY):
+    return fidelity_params(fidelity)["max_evals"]
+
+
+def warm_up_explainers(model_root="models/classic_pipe", fidelity=DEFAULT_FIDELITY):
+    """Строит все explainer'ы заранее, чтобы первый анализ не платил за их сборку."""
+    for acid in acids:
+        load_acid_explainer(acid, f"{model_root}/acids", f"{model_root}/acid_explainers", fidelity).parts
+    for key in nutri:
+        load_nutri_explainer(key, f"{model_root}/nutri", f"{model_root}/nutri_explainers", fidelity)
+
+
+def rebuild_acid_explainers(model_path="models/classic_pipe/acids",
+                            explainer_path="models/classic_pipe/acid_explainers"):
+    """Пересохраняет *_explainer.pkl кислот в формате EnsembleExplainer."""
+    feature_names = model_registry.load(f"{explainer_path}/feature_names.pkl")
+    for acid in acids:
+        ensemble = model_registry.load(f"{model_path}/{acid}_ensemble.pkl")
+        legacy = model_registry.load(f"{explainer_path}/{acid}_explainer.pkl")
+        model_registry.dump(as_ensemble_explainer(legacy, ensemble, feature_names),
+                            f"{explainer_path}/{acid}_explainer.pkl")
+        print(f"{acid}: пересобран")
+
+
+def rebind_nutri_explainers(nutri_path="models/classic_pipe/nutri",
+                            importance_path="models/classic_pipe/nutri_explainers"):
+    """Пересохраняет *_explainers.pkl нутриентов с моделью внутри вместо ensemble_predict."""
+    for key, item in nutri.items():
+        model = model_registry.load(f"{nutri_path}/{key}_catboost.pkl")
+        legacy = model_registry.load(f"{importance_path}/{key}_explainers.pkl")
+        model_registry.dump(bind_explainer(legacy, model),
+                            f"{importance_path}/{key}_explainers.pkl")
+        print(f"{item}: привязан к модели")
+
+
+if __name__ == "__main__":
+    rebuild_acid_explainers()
+    rebind_nutri_explainers()
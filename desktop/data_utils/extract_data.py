@@ -3,8 +3,11 @@ import pandas as pd
 import numpy as np
 import re
 import xlrd
+from contextlib import closing
 from typing import List, Tuple, Optional, Dict, Any
 
+from .metrics import timed
+
 
 COLUMNS = ['Ингредиенты', 'СВ %', 'ГП кг', 'СВ кг', '% ГП', '% СВ']
 
@@ -15,6 +18,7 @@ from typing import List, Tuple, Any, Optional, Dict
 
 COLUMNS = ['Ингредиенты', 'СВ %', 'ГП кг', 'СВ кг', '% ГП', '% СВ']
 
+@timed("parse")
 def parse_excel_ration(path: str, sheet: Optional[int] = 0, max_search_rows: int = 100
                                ) -> Tuple[List[Tuple[str, float]], Dict[str, float]]:
     """
@@ -119,40 +123,123 @@ def parse_step_table_excel(sheet, start_row: int, max_search_rows: int = 1000) -
     return step_table
 
 
-def parse_pdf_for_tables(pdf_path: str):
-    """Парсит таблицу с рационом из текста"""
+RATION_START = re.compile(r'Рецепт:.*?Ингредиенты', re.DOTALL)
+RATION_END = 'Общие значения'
+STEP_START = re.compile(r"Сводный анализ:\s*Лактирующая корова", re.IGNORECASE)
+STEP_END = re.compile(r"\b(Сводка|Экономический|Рецепт|Ингредиенты)\b", re.IGNORECASE)
 
-    text = extract_text_with_pypdf2(pdf_path)
-    if not text:
-        return None
+# запас на случай, если маркер разорван границей страниц
+_MARKER_TAIL = 64
 
-    start_pattern = r'Рецепт:.*?Ингредиенты'
-    match = re.search(start_pattern, text, re.DOTALL)
-    if not match:
-        return None
+# строка таблицы рациона: Название число число число число число число
+_NUMBER = r'([\d,]+(?:\s*\d{3})*(?:,\d+)?)'
+RATION_LINE = re.compile(r'(.+?)' + r'\s+' + r'\s+'.join([_NUMBER] * 6))
 
-    # Ищем блок таблицы (от "Ингредиенты" до "Общие значения")
-    table_block_pattern = r'Ингредиенты(.*?)Общие значения'
-    match = re.search(table_block_pattern, text, re.DOTALL)
 
-    if not match:
-        return None
+class PdfTablesScanner:
+    """
+    Конечный автомат над потоком страниц PDF: ищет «Рецепт:…Ингредиенты»,
+    копит строки рациона до «Общие значения» и раздел «Сводный анализ:
+    Лактирующая корова» до следующего раздела. Каждая новая страница
+    просматривается один раз; done — обе таблицы собраны, дальше читать не нужно.
 
-    table_text = match.group(1)
-    lines = table_text.strip().split('\n')
+    Текст до начала ещё не найденных разделов отбрасывается, так что в памяти
+    держатся только сами таблицы и хвост последней страницы.
+    """
 
+    SEEK, COLLECT, DONE = "seek", "collect", "done"
+
+    def __init__(self):
+        self.text = ""
+        self.ration_state = self.SEEK
+        self.step_state = self.SEEK
+        self.ration_block = None
+        self.step_block = None
+        # позиции в self.text: откуда искать и где начинается собираемый блок
+        self._ration_pos = self._step_pos = 0
+        self._ration_start = self._step_start = None
+
+    @property
+    def done(self):
+        return self.ration_state == self.DONE and self.step_state == self.DONE
+
+    def feed(self, page_text):
+        self.text += page_text + "\n"
+        self._advance_ration()
+        self._advance_step()
+        self._trim()
+        return self.done
+
+    def _advance_ration(self):
+        if self.ration_state == self.SEEK:
+            match = RATION_START.search(self.text, self._ration_pos)
+            if match is None:
+                # «Рецепт:» уже мог встретиться, а «Ингредиенты» — на следующей странице
+                recipe = self.text.find("Рецепт:", self._ration_pos)
+                self._ration_pos = recipe if recipe >= 0 else max(len(self.text) - _MARKER_TAIL, 0)
+                return
+            self._ration_start = self._ration_pos = match.end()
+            self.ration_state = self.COLLECT
+
+        if self.ration_state == self.COLLECT:
+            end = self.text.find(RATION_END, self._ration_pos)
+            if end < 0:
+                self._ration_pos = max(len(self.text) - len(RATION_END), self._ration_start)
+                return
+            self.ration_block = self.text[self._ration_start:end]
+            self.ration_state = self.DONE
+
+    def _advance_step(self):
+        if self.step_state == self.SEEK:
+            match = STEP_START.search(self.text, self._step_pos)
+            if match is None:
+                self._step_pos = max(len(self.text) - _MARKER_TAIL, 0)
+                return
+            self._step_start = self._step_pos = match.end()
+            self.step_state = self.COLLECT
+
+        if self.step_state == self.COLLECT:
+            end = STEP_END.search(self.text, self._step_pos)
+            if end is None:
+                self._step_pos = max(len(self.text) - _MARKER_TAIL, self._step_start)
+                return
+            self.step_block = self.text[self._step_start:end.start()]
+            self.step_state = self.DONE
+
+    def _trim(self):
+        """Отрезает начало текста, которое уже не понадобится ни одному из автоматов."""
+        keep = [len(self.text)]
+        if self.ration_state != self.DONE:
+            keep.append(self._ration_start if self.ration_state == self.COLLECT else self._ration_pos)
+        if self.step_state != self.DONE:
+            keep.append(self._step_start if self.step_state == self.COLLECT else self._step_pos)
+        cut = min(keep)
+        if cut:
+            self.text = self.text[cut:]
+            self._ration_pos = max(self._ration_pos - cut, 0)
+            self._step_pos = max(self._step_pos - cut, 0)
+            if self._ration_start is not None:
+                self._ration_start -= cut
+            if self._step_start is not None:
+                self._step_start -= cut
+
+    def finish(self):
+        """Конец документа: незакрытый раздел нутриентов идёт до конца текста."""
+        if self.step_state == self.COLLECT:
+            self.step_block = self.text[self._step_start:]
+            self.step_state = self.DONE
+
+
+def parse_ration_block(table_text: str):
+    """Строки таблицы рациона (между «Ингредиенты» и «Общие значения») -> [[ингредиент, %СВ]]"""
     ration_data = []
 
-    for line in lines:
+    for line in table_text.strip().split('\n'):
         line = line.strip()
         if not line or '₽' in line:  # Пропускаем пустые строки и строку с заголовком цены
             continue
 
-        # Улучшенный паттерн для парсинга строк таблицы
-        # Формат: Название число число число число число число
-        pattern = r'(.+?)\s+([\d,]+(?:\s*\d{3})*(?:,\d+)?)\s+([\d,]+(?:\s*\d{3})*(?:,\d+)?)\s+([\d,]+(?:\s*\d{3})*(?:,\d+)?)\s+([\d,]+(?:\s*\d{3})*(?:,\d+)?)\s+([\d,]+(?:\s*\d{3})*(?:,\d+)?)\s+([\d,]+(?:\s*\d{3})*(?:,\d+)?)'
-        match = re.match(pattern, line)
-
+        match = RATION_LINE.match(line)
         if match:
             row = []
             for i, value in enumerate(match.groups()):
@@ -172,17 +259,52 @@ def parse_pdf_for_tables(pdf_path: str):
                         row.append(cleaned)
             ration_data.append([row[0], row[5]])
 
-    step_table = parse_step_table_pdf(text)
+    return ration_data
+
+
+@timed("parse")
+def parse_pdf_for_tables(pdf_path: str):
+    """
+    Парсит таблицы рациона и нутриентов из PDF. Страницы читаются по одной
+    через PdfTablesScanner, и чтение останавливается, как только обе таблицы
+    собраны: экономические и прочие разделы длинных выгрузок не извлекаются.
+    """
+    scanner = PdfTablesScanner()
+    try:
+        with closing(iter_pdf_pages(pdf_path)) as pages:
+            for page_text in pages:
+                if scanner.feed(page_text):
+                    break
+    except Exception:
+        return None
+    scanner.finish()
+
+    if scanner.ration_block is None:
+        return None
+
+    ration_data = parse_ration_block(scanner.ration_block)
+    step_table = parse_step_block(scanner.step_block) if scanner.step_block is not None else None
     return ration_data, step_table
 
 
 def parse_step_table_pdf(text: str):
     """
     Парсит из текста PDF раздел 'Сводный анализ: Лактирующая корова'
-    и возвращает только два поля: name (нутриент) и dm (значение по СВ).
-
-    Формат результата: [{"name": str, "dm": float|None}, ...]
+    и возвращает словарь {нутриент: значение по СВ}.
     """
+    if not text:
+        return None
+
+    scanner = PdfTablesScanner()
+    scanner.feed(text)
+    scanner.finish()
+    if scanner.step_block is None:
+        return None
+    return parse_step_block(scanner.step_block)
+
+
+def parse_step_block(block: str):
+    """Строки раздела 'Сводный анализ' (без заголовка) -> {нутриент: значение по СВ}."""
 
     def to_float(s: str) -> Optional[float]:
         if not s:
@@ -193,24 +315,6 @@ def parse_step_table_pdf(text: str):
         except ValueError:
             return None
 
-    if not text:
-        return None
-
-    # --- Ищем начало раздела ---
-    start_pat = r"Сводный анализ:\s*Лактирующая корова"
-    sm = re.search(start_pat, text, flags=re.IGNORECASE)
-    if not sm:
-        return None
-
-    # Берём всё после заголовка
-    block = text[sm.end():]
-
-    # --- Обрезаем, если нашли следующий крупный раздел ---
-    # Ищем что-то вроде "Сводка", "Экономический отчёт", "Рецепт" и т.п.
-    next_section = re.search(r"\b(Сводка|Экономический|Рецепт|Ингредиенты)\b", block, flags=re.IGNORECASE)
-    if next_section:
-        block = block[:next_section.start()]
-
     # --- Обработка строк ---
     lines = [ln.strip() for ln in block.splitlines()]
     lines = [
@@ -245,22 +349,46 @@ def parse_step_table_pdf(text: str):
     return out
 
 
-def extract_text_with_pypdf2(pdf_path):
-    """Извлекает текст с помощью PyPDF2"""
-    text = ""
-    try:
-        with open(pdf_path, 'rb') as file:
-            reader = PdfReader(file)
+def nutrient_key(label):
+    """Подпись нутриента без единиц измерения — ключ таблицы парсера ('СП (%)' -> 'СП')."""
+    return " ".join(label.split(" ")[:-1])
+
+
+def tables_to_report(ration, step_table, name=""):
+    """
+    Таблицы парсера (рацион [[ингредиент, %СВ]] и нутриенты {ключ: значение})
+    -> данные отчёта в том виде, в каком их собирает NewReport из таблиц окна.
+    """
+    from training import uniq_step
 
-            for i, page in enumerate(reader.pages):
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
+    def fmt(value):
+        return f"{value:.3f}".replace(".", ",") if isinstance(value, float) else str(value)
 
-    except Exception as e:
-        text = ""
+    nutrients = []
+    for label in uniq_step:
+        value = step_table.get(nutrient_key(label))
+        nutrients.append({"Нутриент": label, "СВ": "" if value is None else fmt(value)})
+    return {
+        "meta": {"name": name, "complex": "", "period": ""},
+        "ration_rows": [{"Ингредиенты": str(n), "%СВ": fmt(float(v))} for n, v in ration],
+        "nutrients_rows": nutrients,
+    }
 
-    return text
+
+def iter_pdf_pages(pdf_path):
+    """Текст страниц PDF по одной: PyPDF2 разбирает страницу только при обращении к ней."""
+    with open(pdf_path, 'rb') as file:
+        reader = PdfReader(file)
+        for page in reader.pages:
+            yield page.extract_text() or ""
+
+
+def extract_text_with_pypdf2(pdf_path):
+    """Извлекает текст всего документа с помощью PyPDF2"""
+    try:
+        return "".join(page_text + "\n" for page_text in iter_pdf_pages(pdf_path) if page_text)
+    except Exception:
+        return ""
 
 
 if __name__ == "__main__":
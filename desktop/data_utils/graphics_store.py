@@ -0,0 +1,231 @@
+"""
+Хранилище графиков по содержимому.
+
+    python -m desktop.data_utils.graphics_store gc [--dry-run] [--pin-days 7]
+    python -m desktop.data_utils.graphics_store du
+
+В отчёте (graphics[key]) лежит ID графика — хэш SHAP-векторов, по которым
+он рисуется, а не путь к файлу. Одинаковые графики разных отчётов (повторный
+анализ, тот же рацион) — один набор файлов. На каждый ID два уровня:
+display — PNG с палитрой для отчёта и экспорта, thumb — уменьшенная копия
+(WebP, если Pillow его поддерживает). gc удаляет файлы, на которые не
+ссылается ни один отчёт и ни одна свежая закрепка (pins/ — графики ответов
+HTTP-сервиса, у которых нет сохранённого отчёта).
+"""
+import argparse
+import glob
+import hashlib
+import io
+import json
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+
+from .document import atomic_write_json, replace_file
+
+
+GRAPHICS_ROOT = "desktop/graphics"
+REPORTS_ROOT = "desktop/reports"
+
+# меняется вместе с оформлением графиков или параметрами уровней
+STORE_FORMAT = 2
+
+DISPLAY = "display"
+THUMB = "thumb"
+
+THUMB_WIDTH = 360
+
+# сколько дней gc не трогает закреплённые графики
+DEFAULT_PIN_DAYS = 7
+PALETTE_COLORS = 256
+
+_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+def chart_id(kind, specs):
+    """ID графика: sha256 по виду графика и его SHAP-векторам (первые 32 символа)."""
+    h = hashlib.sha256()
+    h.update(f"{STORE_FORMAT}:{kind}:".encode("ascii"))
+    h.update(json.dumps(specs, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()[:32]
+
+
+def is_chart_id(value):
+    return bool(value) and _ID_RE.match(str(value)) is not None
+
+
+def _thumb_format():
+    from PIL import features
+
+    return ("WEBP", "webp") if features.check("webp") else ("PNG", "png")
+
+
+class GraphicsStore:
+    """Файлы графиков в root/store/<2 символа ID>/<ID>.png и <ID>.thumb.webp."""
+
+    def __init__(self, root=GRAPHICS_ROOT):
+        self.root = Path(root)
+
+    @property
+    def store_dir(self):
+        return self.root / "store"
+
+    @property
+    def pins_dir(self):
+        return self.root / "pins"
+
+    def path(self, chart_id, tier=DISPLAY):
+        name = f"{chart_id}.png" if tier == DISPLAY else f"{chart_id}.thumb.{_thumb_format()[1]}"
+        return self.store_dir / chart_id[:2] / name
+
+    def resolve(self, value, tier=DISPLAY):
+        """Путь к файлу по значению graphics[key]: ID или абсолютный путь старых отчётов."""
+        if is_chart_id(value):
+            return self.path(value, tier)
+        return Path(value)
+
+    def exists(self, chart_id):
+        return all(self.path(chart_id, tier).exists() for tier in (DISPLAY, THUMB))
+
+    def put(self, chart_id, draw, force=False):
+        """
+        Рисует график, если его ещё нет: draw(path) сохраняет PNG matplotlib,
+        из него пишутся оба уровня. Возвращает True, если файлы записаны.
+        """
+        if not force and self.exists(chart_id):
+            return False
+
+        from PIL import Image
+
+        target = self.path(chart_id)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, raw_path = tempfile.mkstemp(prefix=f".{chart_id}.", suffix=".png", dir=target.parent)
+        os.close(fd)
+        try:
+            draw(raw_path)
+            with Image.open(raw_path) as image:
+                image = image.convert("RGB")
+            # у графиков немного плоских цветов: палитра уменьшает PNG в разы
+            display = image.quantize(PALETTE_COLORS, method=Image.Quantize.FASTOCTREE)
+            self._write(display, target, "PNG", optimize=True)
+
+            image.thumbnail((THUMB_WIDTH, THUMB_WIDTH * 4), Image.Resampling.LANCZOS)
+            fmt, _ = _thumb_format()
+            options = {"quality": 80, "method": 6} if fmt == "WEBP" else {"optimize": True}
+            self._write(image, self.path(chart_id, THUMB), fmt, **options)
+        finally:
+            if os.path.exists(raw_path):
+                os.remove(raw_path)
+        return True
+
+    @staticmethod
+    def _write(image, path, fmt, **options):
+        buffer = io.BytesIO()
+        image.save(buffer, fmt, **options)
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(buffer.getvalue())
+            replace_file(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def pin(self, name, chart_ids):
+        """
+        Закрепляет графики без сохранённого отчёта: gc оставляет их, пока
+        закрепка name моложе срока, переданного в pinned.
+        """
+        ids = sorted(chart for chart in chart_ids if is_chart_id(chart))
+        if ids:
+            atomic_write_json(self.pins_dir / f"{name}.json", ids)
+
+    def pinned(self, max_age=None, dry_run=False):
+        """ID из закрепок моложе max_age секунд; более старые закрепки удаляются."""
+        ids = set()
+        now = time.time()
+        for path in self.pins_dir.glob("*.json"):
+            try:
+                if max_age is not None and now - path.stat().st_mtime > max_age:
+                    if not dry_run:
+                        path.unlink(missing_ok=True)
+                    continue
+                with open(path, "r", encoding="utf-8") as f:
+                    ids.update(chart for chart in json.load(f) if is_chart_id(chart))
+            except (OSError, ValueError, TypeError):
+                continue
+        return ids
+
+    def files(self):
+        """{ID: [файлы]} всего хранилища."""
+        result = {}
+        for path in self.store_dir.glob("*/*"):
+            if path.name.startswith("."):
+                continue
+            result.setdefault(path.name.split(".", 1)[0], []).append(path)
+        return result
+
+    def usage(self):
+        """(число графиков, байт на диске)."""
+        files = self.files()
+        return len(files), sum(p.stat().st_size for paths in files.values() for p in paths)
+
+    def gc(self, referenced, dry_run=False):
+        """
+        Удаляет графики, ID которых нет в referenced. Возвращает
+        (число удалённых графиков, освобождено байт).
+        """
+        removed, freed = 0, 0
+        for chart, paths in self.files().items():
+            if chart in referenced:
+                continue
+            removed += 1
+            for path in paths:
+                freed += path.stat().st_size
+                if not dry_run:
+                    path.unlink(missing_ok=True)
+        return removed, freed
+
+
+def referenced_ids(reports_root=REPORTS_ROOT):
+    """ID графиков, на которые ссылаются JSON-отчёты в reports_root."""
+    ids = set()
+    for path in glob.glob(f"{reports_root}/**/*.json", recursive=True):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                graphics = json.load(f).get("graphics") or {}
+        except (OSError, ValueError, AttributeError):
+            continue
+        ids.update(value for value in graphics.values() if is_chart_id(value))
+    return ids
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Хранилище графиков отчётов")
+    parser.add_argument("command", choices=["gc", "du"])
+    parser.add_argument("--root", default=GRAPHICS_ROOT, help="каталог графиков")
+    parser.add_argument("--reports", default=REPORTS_ROOT, help="каталог JSON-отчётов")
+    parser.add_argument("--dry-run", action="store_true", help="только показать, что будет удалено")
+    parser.add_argument("--pin-days", type=float, default=DEFAULT_PIN_DAYS,
+                        help="сколько дней хранить закреплённые графики HTTP-сервиса")
+    args = parser.parse_args(argv)
+
+    store = GraphicsStore(args.root)
+    if args.command == "gc":
+        referenced = referenced_ids(args.reports) | store.pinned(args.pin_days * 86400, args.dry_run)
+        removed, freed = store.gc(referenced, args.dry_run)
+        verb = "будет удалено" if args.dry_run else "удалено"
+        print(f"{verb} графиков: {removed}, {freed / 2 ** 20:.1f} МБ")
+    count, size = store.usage()
+    print(f"в хранилище графиков: {count}, {size / 2 ** 20:.1f} МБ")
+
+
+# Глобальный экземпляр
+graphics_store = GraphicsStore()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,82 +1,48 @@
 import json
+from contextlib import ExitStack
 import pandas as pd
 import numpy as np
-import joblib as jl
 from pathlib import Path
-import shap
 import os
 import re
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-from PIL import Image, ImageDraw, ImageFont
-
-from .predictor import set_ensemble, ensemble_predict
+import tempfile
+
+from .registry import model_registry
+from .numpy_models import resolve_model_path
+from .result_cache import RESULT_FIELDS, bundle_version, row_key
+from .jobs import Job, JobGraph, job_cache
+from .nutri_memo import entry_explanations, memo_entry, nutri_memo, ration_key
+from .executor import create_executor
+from .metrics import report_timings, span
+from .document import ReportDocument, open_report
+from .charts import URGENT, add_waterfall, add_composite, chart_queue, export_panels, reset_charts
+from .explainers import DEFAULT_FIDELITY, load_acid_explainer, load_nutri_explainer, nutri_max_evals
 from .config import acids, for_dropping, medians_of_data, main_acids, nutri, nutri_for_predict, nutri_reverse
-from training import change_mapping, cultures, uniq_step, uniq_changed_ration, name_mapping, feed_types
+from .normalizer import ingredient_normalizer
+from training import uniq_step, uniq_changed_ration
 
 
 def fix_name(value):
-    code_pattern = re.compile(r"\d{4}\.\d{2}\.(\d{2})\.?(\d{2})?")
-    match = code_pattern.search(value)
-
-    name_pattern = r'\b(' + '|'.join(re.escape(w) for w in uniq_changed_ration) + r')\b'
-    name_match = re.search(name_pattern, value, flags=re.IGNORECASE)
-
-    if name_match:
-        return name_match.group(1)
+    return ingredient_normalizer.fix_name(value)
 
-    if not match and not name_match:
-        return None
 
-    groups = match.groups()
-    culture_code = groups[0]
-    culture_name = cultures.get(culture_code)
-
-    if culture_name:
-        return f"{culture_name}"
-    elif culture_name:
-        return culture_name
-    else:
-        return None
-
-
-def extract_to_row(ration, nutrients, json_path):
+def extract_to_row(ration, nutrients, report=None):
     row = [0] * (len(uniq_changed_ration) + len(uniq_step))
     columns = uniq_changed_ration + uniq_step
 
     uniq_dict = {elem: ind for ind, elem in enumerate(uniq_changed_ration)}
     uniq_step_dict = {elem: ind + len(uniq_changed_ration) for ind, elem in enumerate(uniq_step)}
 
-    name_mapping = change_mapping()
-    new_ration = []
-
-    for i, (elem, val) in enumerate(ration):
-        if elem in uniq_changed_ration:
-            clear_elem = elem
-        elif elem in name_mapping:
-            clear_elem = name_mapping[elem]
-        else:
-            clear_elem = fix_name(elem)
-            if clear_elem is None:
-                clear_elem = uniq_changed_ration[0]
-
-        new_ration.append((clear_elem, val))
-
-    print(new_ration)
+    names = ingredient_normalizer.normalize_many([elem for elem, _ in ration])
+    new_ration = [(clear_elem, val) for clear_elem, (_, val) in zip(names, ration)]
 
     new_ration_dct = {orig: norm
                       for (orig, _), (norm, _) in zip(ration, new_ration)}
 
-    with open(json_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    for json_row in data.get("ration_rows", []):
-        key = json_row.get("Ингредиенты", "")
-        json_row["Normalized"] = new_ration_dct.get(key, None)  # безопасно
-
-    with open(json_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    if report is not None:
+        for json_row in report.get("ration_rows", []):
+            key = json_row.get("Ингредиенты", "")
+            json_row["Normalized"] = new_ration_dct.get(key, None)  # безопасно
 
     for elem, val in new_ration:
         row[uniq_dict[elem]] += float(val.replace(",", "."))
@@ -94,40 +60,31 @@ def extract_to_row(ration, nutrients, json_path):
     return df_row
 
 
-def load_data_from_json(path_name: str):
-    with open(path_name, "r", encoding="utf-8") as f:
-        json_file = json.load(f)
+def load_data_from_json(report):
+    """report — ReportDocument или путь к JSON; нормализованные имена дописываются в документ."""
+    if not isinstance(report, ReportDocument):
+        report = ReportDocument.load(report)
 
-    rational_rows = [(elem["Ингредиенты"], elem["%СВ"]) for elem in json_file['ration_rows']]
-    nutrients_rows = [(elem["Нутриент"], elem["СВ"]) for elem in json_file['nutrients_rows']]
+    rational_rows = [(elem["Ингредиенты"], elem["%СВ"]) for elem in report['ration_rows']]
+    nutrients_rows = [(elem["Нутриент"], elem["СВ"]) for elem in report['nutrients_rows']]
 
-    final_row = extract_to_row(rational_rows, nutrients_rows, path_name)
+    final_row = extract_to_row(rational_rows, nutrients_rows, report)
     return final_row
 
 
 def clear_data(data):
-    for item in for_dropping:
-        data = data.drop(item, axis=1)
-
-    for key, value in medians_of_data.items():
-        if data[key].isna()[0]:
-            data.loc[0, key] = value
+    data = data.drop(for_dropping, axis=1)
+    # пропуски заполняем медианами обучающей выборки (работает для любого числа строк)
+    data = data.fillna(value=medians_of_data)
 
     return data
 
 
-def predict_importance_acids(data, acid, name,
-                             explainer_path="models/classic_pipe/acid_explainers",
-                             graphics_path="desktop/graphics"):
-    feature_names = jl.load(f"{explainer_path}/feature_names.pkl")
-    explainer = jl.load(f"{explainer_path}/{acid}_explainer.pkl")
-
-    X_single = pd.DataFrame([data], columns=feature_names)
-    shap_values = explainer(X_single)
-
+def select_top_features(feature_names, shap_row, limit=3):
+    """Оставляет по limit самых сильных положительных и отрицательных вкладов."""
     shap_df = pd.DataFrame({
         "feature": feature_names,
-        "shap_value": shap_values.values[0]
+        "shap_value": shap_row
     })
     df = shap_df.sort_values(by="shap_value", key=abs, ascending=False)
     feature_val_dict = {f: round(v, 2) for f, v in zip(df["feature"], df["shap_value"])}
@@ -138,105 +95,92 @@ def predict_importance_acids(data, acid, name,
 
     for key1, item1 in time_copy.items():
         if item1 >= 0:
-            if amount_of_pos >= 3:
+            if amount_of_pos >= limit:
                 del feature_val_dict[key1]
             else:
                 amount_of_pos += 1
         else:
-            if amount_of_neg >= 3:
+            if amount_of_neg >= limit:
                 del feature_val_dict[key1]
             else:
                 amount_of_neg += 1
 
-    if acid in main_acids:
-        fname = os.path.basename(name)
-        output_dir, ext = os.path.splitext(fname)
-        print(graphics_path, output_dir)
-        if not os.path.exists(f"{graphics_path}/{output_dir}"):
-            os.makedirs(f"{graphics_path}/{output_dir}")
+    return feature_val_dict
+
+
+def explain_acid(row, acid, model_path="models/classic_pipe/acids",
+                 explainer_path="models/classic_pipe/acid_explainers", fidelity=DEFAULT_FIDELITY):
+    """Предсказание и SHAP одной кислоты для одной строки; задача для пула процессов."""
+    feature_names = model_registry.load(f"{explainer_path}/feature_names.pkl")
+    model = model_registry.load(resolve_model_path(f"{model_path}/{acid}_ensemble.pkl"))
+    explainer = load_acid_explainer(acid, model_path, explainer_path, fidelity)
 
-        shap.plots.waterfall(shap_values[0])
-        plt.title(f"{acid}", fontsize=12, pad=20)
-        plt.savefig(f"{graphics_path}/{output_dir}/{acid}.png", dpi=300, bbox_inches="tight")
-        plt.close()
+    X_single = pd.DataFrame([row], columns=feature_names)
+    with span("predict"):
+        prediction = float(model.predict(X_single.to_numpy())[0])
+    with span("explain"):
+        explanation = explainer(X_single)[0]
+    return prediction, explanation
 
-        with open(name, "r", encoding="utf-8") as f:
-            json_data = json.load(f)
-            if "graphics" not in json_data:
-                json_data["graphics"] = {}
 
-            json_data["graphics"][acid] = str(Path(f"{graphics_path}/{output_dir}/{acid}.png").resolve())
+def explain_nutri(ration_row, key, nutri_path="models/classic_pipe/nutri",
+                  importance_path="models/classic_pipe/nutri_explainers", fidelity=DEFAULT_FIDELITY):
+    """SHAP модели нутриента key по строке рациона; задача для пула процессов."""
+    feature_names = model_registry.load(f"{importance_path}/feature_names.pkl")
+    explainer = load_nutri_explainer(key, nutri_path, importance_path, fidelity)
 
-        with open(name, "w", encoding="utf-8") as f:
-            json.dump(json_data, f, ensure_ascii=False, indent=2)
+    X_single = pd.DataFrame([ration_row], columns=feature_names)
+    with span("explain"):
+        return explainer(X_single, max_evals=nutri_max_evals(fidelity))[0]
+
+
+def predict_importance_acids(data, acid, report,
+                             explainer_path="models/classic_pipe/acid_explainers",
+                             model_path="models/classic_pipe/acids",
+                             explanation=None, export_panel=False):
+    if not isinstance(report, ReportDocument):
+        with open_report(report) as report:
+            return predict_importance_acids(data, acid, report, explainer_path,
+                                            model_path, explanation, export_panel)
+
+    if explanation is None:
+        _, explanation = explain_acid(data, acid, model_path, explainer_path)
+
+    feature_val_dict = select_top_features(explanation.feature_names, explanation.values)
+
+    if acid in main_acids:
+        add_waterfall(report, acid, explanation, f"{acid}", export_panel)
 
     return feature_val_dict
 
 
-def predict_importance_nutri(data, list_of_main_nutri, name,
+def predict_importance_nutri(data, list_of_main_nutri, report,
                              nutri_path="models/classic_pipe/nutri",
                              importance_path="models/classic_pipe/nutri_explainers",
-                             graphics_path="desktop/graphics"):
-    nutri_dict = dict()
-    feature_names = jl.load(f"{importance_path}/feature_names.pkl")
+                             explanations=None, export_panels=False, top_features=None):
+    if not isinstance(report, ReportDocument):
+        with open_report(report) as report:
+            return predict_importance_nutri(data, list_of_main_nutri, report, nutri_path,
+                                            importance_path, explanations,
+                                            export_panels, top_features)
 
-    data = data.drop(nutri_for_predict, axis=1).to_numpy()
+    nutri_dict = dict()
+    ration_row = data.drop(nutri_for_predict, axis=1).to_numpy()[0]
 
     for key, item in nutri.items():
-        model = jl.load(f"{nutri_path}/{key}_catboost.pkl")
-        set_ensemble(model)
-        logit = model.predict(data)
-
-        explainer = jl.load(f"{importance_path}/{key}_explainers.pkl")
-        X_single = pd.DataFrame(data, columns=feature_names)
-
-        shap_values = explainer(X_single)
-
-        shap_df = pd.DataFrame({
-            "feature": feature_names,
-            "shap_value": shap_values.values[0]
-        })
-        df = shap_df.sort_values(by="shap_value", key=abs, ascending=False)
-        feature_val_dict = {f: round(v, 2) for f, v in zip(df["feature"], df["shap_value"])}
-
-        amount_of_pos = 0
-        amount_of_neg = 0
-        time_copy = feature_val_dict.copy()
-
-        for key1, item1 in time_copy.items():
-            if item1 >= 0:
-                if amount_of_pos >= 3:
-                    del feature_val_dict[key1]
-                else:
-                    amount_of_pos += 1
-            else:
-                if amount_of_neg >= 3:
-                    del feature_val_dict[key1]
-                else:
-                    amount_of_neg += 1
+        if explanations is not None:
+            explanation = explanations[key]
+        else:
+            explanation = explain_nutri(ration_row, key, nutri_path, importance_path)
 
-        nutri_dict[item] = feature_val_dict
+        if top_features is not None:
+            nutri_dict[item] = top_features[key]
+        else:
+            nutri_dict[item] = select_top_features(explanation.feature_names, explanation.values)
 
         if item in list_of_main_nutri:
-            fname = os.path.basename(name)
-            output_dir, ext = os.path.splitext(fname)
-            if not os.path.exists(f"{graphics_path}/{output_dir}"):
-                os.makedirs(f"{graphics_path}/{output_dir}")
-
-            print(f"{graphics_path}/{output_dir}/{key}.png")
-            shap.plots.waterfall(shap_values[0])
-            plt.title(f"Вклад признаков в предсказание {item}", fontsize=12, pad=20)
-            plt.savefig(f"{graphics_path}/{output_dir}/{key}.png", dpi=300, bbox_inches="tight")
-            plt.close()
-
-            with open(name, "r", encoding="utf-8") as f:
-                json_data = json.load(f)
-                if "graphics" not in json_data:
-                    json_data["graphics"] = {}
-                json_data["graphics"][key] = str(Path(f"{graphics_path}/{output_dir}/{key}.png").resolve())
-
-            with open(name, "w", encoding="utf-8") as f:
-                json.dump(json_data, f, ensure_ascii=False, indent=2)
+            add_waterfall(report, key, explanation, f"Вклад признаков в предсказание {item}",
+                          export_panels)
 
     return nutri_dict
 
@@ -251,78 +195,18 @@ def cross_importance(importance_dict):
         print()
 
 
-def make_uni_acids(name, graphics_path="desktop/graphics", grid_size=(2, 2)):
-    fname = os.path.basename(name)
-    output_dir, ext = os.path.splitext(fname)
-
-    images = [Image.open(f"{graphics_path}/{output_dir}/{name}.png") for name in main_acids]
-
-    w, h = images[0].size
-    cols, rows = grid_size
-
-    grid_w = cols * w + (cols + 1)
-    grid_h = rows * h + (rows + 1)
-    grid = Image.new("RGB", (grid_w, grid_h), color="white")
-
-    for idx, img in enumerate(images):
-        r, c = divmod(idx, cols)
-        if r >= rows:
-            break
-
-        grid.paste(img, (w * c, h * r))
-
-    grid.save(f"{graphics_path}/{output_dir}/uni_acids.png")
-
-
-def make_uni_nutri(name, list_of_main_nutri, graphics_path="desktop/graphics", grid_size=(2, 2)):
-    fname = os.path.basename(name)
-    output_dir, ext = os.path.splitext(fname)
-
-    images = [Image.open(f"{graphics_path}/{output_dir}/{nutri_reverse[name]}.png") for name in list_of_main_nutri]
-
-    w, h = images[0].size
-    cols, rows = grid_size
-
-    grid_w = cols * w + (cols + 1)
-    grid_h = rows * h + (rows + 1)
-    grid = Image.new("RGB", (grid_w, grid_h), color="white")
-
-    for idx, img in enumerate(images):
-        r, c = divmod(idx, cols)
-        if r >= rows:
-            break
-
-        grid.paste(img, (w * c, h * r))
-
-    grid.save(f"{graphics_path}/{output_dir}/uni_nutri.png")
-    with open(name, "r", encoding="utf-8") as f:
-        json_data = json.load(f)
-        if "graphics" not in json_data:
-            json_data["graphics"] = {}
-        json_data["graphics"]["uni_nutri"] = str(Path(f"{graphics_path}/{output_dir}/uni_nutri.png").resolve())
-
-    with open(name, "w", encoding="utf-8") as f:
-        json.dump(json_data, f, ensure_ascii=False, indent=2)
-
-
-def predict_from_file(json_report, model_path="models/classic_pipe/acids"):
-    json_report = str(json_report)
-    acids_dict = dict()
+def apply_importance(report, row, data, acid_explanations, nutri_explanations, nutri_top=None, panels=False):
+    """
+    Важности и графики отчёта по SHAP-объяснениям одной строки: топ признаков
+    всех целей (importance_acid, importance_nutrient), SHAP-векторы главных
+    кислот и нутриентов и сводные графики из них. Общая часть predict_from_file
+    и пакетного predict_from_files.
+    """
     importance_acid_dict = dict()
-    importance_nutri_dict = dict()
     list_of_main_nutri = list()
-
-    data = load_data_from_json(json_report)
-    data = clear_data(data)
-
-    for acid in acids:
-        model = jl.load(f"{model_path}/{acid}_ensemble.pkl")
-        logit = model.predict(data.to_numpy())
-        acids_dict[acid] = logit
-
-        set_ensemble(model)
-        importance = predict_importance_acids(data.to_numpy()[0], acid, json_report)
-        importance_acid_dict[acid] = importance
+    for acid, explanation in acid_explanations.items():
+        importance_acid_dict[acid] = predict_importance_acids(row, acid, report, explanation=explanation,
+                                                              export_panel=panels)
 
     for acid in main_acids:
         for key, item in importance_acid_dict[acid].items():
@@ -331,57 +215,260 @@ def predict_from_file(json_report, model_path="models/classic_pipe/acids"):
             list_of_main_nutri.append(key)
             break
 
-    importance_nutri_dict = predict_importance_nutri(data, list_of_main_nutri, json_report)
+    importance_nutri_dict = predict_importance_nutri(data, list_of_main_nutri, report,
+                                                     explanations=nutri_explanations,
+                                                     export_panels=panels, top_features=nutri_top)
+
+    add_composite(report, "uni", main_acids)
+    add_composite(report, "uni_nutri", [nutri_reverse[item] for item in list_of_main_nutri])
+
+    report["importance_acid"] = importance_acid_dict
+    report["importance_nutrient"] = importance_nutri_dict
+
+
+def _submit_charts(report, charts, force=True):
+    if charts == "queue":
+        chart_queue.submit(report, force=force)
+    elif charts == "now":
+        chart_queue.submit(report, URGENT, force=force)
+        chart_queue.render_now(report)
+
+
+def _apply_cached(report, results, charts, panels):
+    """
+    Заполняет отчёт результатами из кэша. ID графиков зависят только от
+    SHAP-векторов, поэтому совпадают с исходным отчётом, и очередь не
+    перерисовывает уже лежащие в graphics_store файлы.
+    """
+    for field in RESULT_FIELDS:
+        if results.get(field) is not None:
+            report[field] = results[field]
+    for key, members in (report.get("composites") or {}).items():
+        add_composite(report, key, members)
+    if panels:
+        export_panels(report)
+
+    _submit_charts(report, charts)
+    return {acid: np.array([value]) for acid, value in report["result_acids"].items()}
+
+
+def analysis_graph(data, model_path="models/classic_pipe/acids", fidelity=DEFAULT_FIDELITY,
+                   with_nutri=True):
+    """
+    Граф задач одного отчёта: модели нутриентов зависят только от рациона
+    (колонки без nutri_for_predict), модели кислот — от рациона и нутриентов.
+    fidelity входит в аргументы задач, а значит и в их ключи JobCache.
+    with_nutri=False — без 13 задач нутриентов (их результат уже есть в NutriMemo).
+    """
+    nutrients = [c for c in data.columns if c in nutri_for_predict]
+    ration = [c for c in data.columns if c not in nutri_for_predict]
+
+    jobs = [Job(f"acid:{acid}", ("ration", "nutrients"), explain_acid, acid, model_path,
+                "models/classic_pipe/acid_explainers", fidelity) for acid in acids]
+    if with_nutri:
+        jobs += [Job(f"nutri:{key}", ("ration",), explain_nutri, key, "models/classic_pipe/nutri",
+                     "models/classic_pipe/nutri_explainers", fidelity) for key in nutri]
+    return JobGraph({"ration": ration, "nutrients": nutrients}, jobs, version=bundle_version())
+
+
+def predict_from_file(json_report, model_path="models/classic_pipe/acids",
+                      executor=None, workers=None, charts="queue", panels=False, cache=None,
+                      jobs=job_cache, fidelity=DEFAULT_FIDELITY, memo=nutri_memo):
+    """
+    Полный анализ одного отчёта: 5 кислот и 13 нутриентов (predict + SHAP),
+    графики и запись результатов в отчёт.
+
+    json_report — путь к JSON или ReportDocument. Файл по пути читается
+    и сохраняется по одному разу; документ сохраняет вызывающий код
+    (обычно write_report_files в конце конвейера).
+
+    executor — готовый пул (см. executor.shared_executor): 18 задач по целям
+    уходят в него параллельно. workers=N создаёт пул только на этот вызов.
+    Без обоих параметров всё считается в текущем процессе.
+
+    Графики не рисуются во время анализа: SHAP-векторы сохраняются в отчёт,
+    а PNG рисует chart_queue. charts="queue" — в фоне, "now" — дождаться
+    графиков до возврата, None — только сохранить векторы. В отчёт идут два
+    сводных графика (кислоты и нутриенты); panels=True дополнительно
+    выгружает waterfall каждой цели отдельным PNG.
+
+    cache — ResultCache (см. result_cache): при совпадении строки признаков
+    и версии моделей результаты берутся из него без пересчёта.
+
+    jobs — JobCache для задач по целям (см. analysis_graph): если поменялась
+    только таблица нутриентов, пересчитываются 5 кислот, а 13 задач
+    нутриентов берутся из кэша. None — считать всё заново.
+
+    memo — NutriMemo блока моделей нутриентов по квантованному рациону
+    (см. nutri_memo): если такой рацион уже встречался, 13 задач нутриентов
+    не запускаются вовсе, а SHAP-векторы и топ признаков берутся из записи.
+
+    fidelity — точность SHAP (см. explainers.FIDELITY): "fast" и "standard"
+    объясняют по сжатому k-means фону с меньшим бюджетом вызовов модели,
+    "exact" (по умолчанию) — по полному фону обучения, как прежде.
+    На предсказания не влияет.
+
+    Длительности стадий (мс) пишутся в meta.timings отчёта: prepare, cache,
+    analysis (весь граф задач), predict и explain (сумма по задачам),
+    importance (см. metrics).
+    """
+    if not isinstance(json_report, ReportDocument):
+        with open_report(json_report) as report:
+            return predict_from_file(report, model_path, executor, workers, charts, panels, cache, jobs,
+                                     fidelity, memo)
+
+    report = json_report
+    reset_charts(report)
+    timings = {}
+
+    with span("prepare", timings):
+        data = load_data_from_json(report)
+        data = clear_data(data)
+        row = data.to_numpy()[0]
+
+    if cache is not None:
+        with span("cache", timings):
+            cache_key = row_key(data, f"{bundle_version()}:{fidelity}")
+            cached = cache.get(cache_key)
+        if cached is not None:
+            report_timings(report).update(timings)
+            return _apply_cached(report, cached, charts, panels)
+
+    memo_key, memo_hit = None, None
+    if memo is not None:
+        ration = data.drop(nutri_for_predict, axis=1)
+        memo_key = ration_key(ration, f"{bundle_version()}:{fidelity}")
+        memo_hit = memo.get(memo_key)
+
+    own_executor = None
+    if executor is None and workers:
+        executor = own_executor = create_executor(workers)
+
+    graph = analysis_graph(data, model_path, fidelity, with_nutri=memo_hit is None)
+    try:
+        with span("analysis", timings):
+            results = graph.run(data, executor, jobs)
+    finally:
+        if own_executor is not None:
+            own_executor.shutdown()
+    timings.update(graph.timings)
+
+    acid_results = {acid: results[f"acid:{acid}"] for acid in acids}
+    if memo_hit is not None:
+        nutri_explanations = entry_explanations(memo_hit, ration.to_numpy()[0])
+        nutri_top = {int(key): dict(target["top"]) for key, target in memo_hit["targets"].items()}
+    else:
+        nutri_explanations = {key: results[f"nutri:{key}"] for key in nutri}
+        nutri_top = {key: select_top_features(e.feature_names, e.values) for key, e in nutri_explanations.items()}
+        if memo is not None:
+            memo.put(memo_key, memo_entry(nutri_explanations, nutri_top))
 
-    make_uni_acids(json_report)
-    make_uni_nutri(json_report, list_of_main_nutri)
+    acids_dict = {acid: np.array([prediction]) for acid, (prediction, _) in acid_results.items()}
+    with span("importance", timings):
+        apply_importance(report, row, data, {acid: explanation for acid, (_, explanation) in acid_results.items()},
+                         nutri_explanations, nutri_top, panels)
 
-    with open(json_report, "r", encoding="utf-8") as f:
-        json_data = json.load(f)
-        json_data["importance_acid"] = importance_acid_dict
-        json_data["importance_nutrient"] = importance_nutri_dict
-        json_data["result_acids"] = {
-            k: float(v[0])
-            for k, v in acids_dict.items()
-        }
+    report["result_acids"] = {
+        k: float(v[0])
+        for k, v in acids_dict.items()
+    }
 
+    if cache is not None:
+        cache.put(cache_key, {field: report.get(field) for field in RESULT_FIELDS})
+    report_timings(report).update(timings)
 
-    with open(json_report, "w", encoding="utf-8") as f:
-        json.dump(json_data, f, ensure_ascii=False, indent=2)
+    _submit_charts(report, charts)
 
     return acids_dict
 
 
-def make_uni_acids(name, graphics_path="desktop/graphics", grid_size=(2, 2)):
-    fname = os.path.basename(name)
-    output_dir, ext = os.path.splitext(fname)
-
-    images = [Image.open(f"{graphics_path}/{output_dir}/{name}.png") for name in main_acids]
-
-    w, h = images[0].size
-    cols, rows = grid_size
-
-    grid_w = cols * w + (cols + 1)
-    grid_h = rows * h + (rows + 1)
-    grid = Image.new("RGB", (grid_w, grid_h), color="white")
-
-
-    for idx, img in enumerate(images):
-        r, c = divmod(idx, cols)
-        if r >= rows:
-            break
-
-        grid.paste(img, (w * c, h * r))
+def predict_from_files(json_reports, model_path="models/classic_pipe/acids",
+                       explainer_path="models/classic_pipe/acid_explainers",
+                       nutri_path="models/classic_pipe/nutri",
+                       importance_path="models/classic_pipe/nutri_explainers",
+                       explain=True, fidelity=DEFAULT_FIDELITY, charts="queue"):
+    """
+    Пакетный пересчёт отчётов: одна матрица N×F на все файлы, один predict на кислоту
+    и один вызов explainer'а на модель. Результаты (result_acids, importance_*,
+    shap_values) записываются обратно в каждый отчёт, графики сбрасываются
+    и ставятся в очередь заново, как в predict_from_file (charts — там же).
+    explain=False пересчитывает только result_acids: важности и графики
+    остаются от прошлого анализа. fidelity — как в predict_from_file.
+    """
+    if not json_reports:
+        return {}
+
+    with ExitStack() as stack:
+        reports = [stack.enter_context(open_report(r)) for r in json_reports]
+        return _predict_reports(reports, model_path, explainer_path, nutri_path,
+                                importance_path, explain, fidelity, charts)
+
+
+def _predict_reports(reports, model_path, explainer_path, nutri_path, importance_path, explain,
+                     fidelity=DEFAULT_FIDELITY, charts="queue"):
+    data = pd.concat([load_data_from_json(report) for report in reports], ignore_index=True)
+    data = clear_data(data)
+    X = data.to_numpy()
 
-    grid.save(f"{graphics_path}/{output_dir}/uni_acids.png")
-    with open(name, "r", encoding="utf-8") as f:
-        json_data = json.load(f)
-        if "graphics" not in json_data:
-            json_data["graphics"] = {}
-        json_data["graphics"]["uni"] = str(Path(f"{graphics_path}/{output_dir}/uni_acids.png").resolve())
+    acids_dict = dict()
+    acid_explanations = [dict() for _ in reports]
+    nutri_explanations = [dict() for _ in reports]
 
-    with open(name, "w", encoding="utf-8") as f:
-        json.dump(json_data, f, ensure_ascii=False, indent=2)
+    for acid in acids:
+        model = model_registry.load(resolve_model_path(f"{model_path}/{acid}_ensemble.pkl"))
+        acids_dict[acid] = model.predict(X)
+
+        if explain:
+            feature_names = model_registry.load(f"{explainer_path}/feature_names.pkl")
+            explainer = load_acid_explainer(acid, model_path, explainer_path, fidelity)
+            shap_values = explainer(pd.DataFrame(X, columns=feature_names))
+            for i in range(len(reports)):
+                acid_explanations[i][acid] = shap_values[i]
+
+    if explain:
+        feature_names = model_registry.load(f"{importance_path}/feature_names.pkl")
+        X_ration = pd.DataFrame(data.drop(nutri_for_predict, axis=1).to_numpy(), columns=feature_names)
+
+        for key in nutri:
+            explainer = load_nutri_explainer(key, nutri_path, importance_path, fidelity)
+            shap_values = explainer(X_ration, max_evals=nutri_max_evals(fidelity))
+            for i in range(len(reports)):
+                nutri_explanations[i][key] = shap_values[i]
+
+    results = dict()
+    for i, report in enumerate(reports):
+        result_acids = {acid: float(pred[i]) for acid, pred in acids_dict.items()}
+        results[str(report.path)] = result_acids
+
+        report["result_acids"] = result_acids
+        if explain:
+            # графики прошлого анализа нарисованы по старым SHAP-векторам
+            reset_charts(report)
+            apply_importance(report, X[i], data.iloc[[i]], acid_explanations[i], nutri_explanations[i])
+            _submit_charts(report, charts)
+
+    return results
+
+
+def warm_up(executor=None, model_root="models/classic_pipe"):
+    """
+    Прогрев перед первым анализом: модели и explainer'ы в model_registry
+    (в пуле — в каждом воркере, через init_worker) и один пробный
+    predict_from_file по рациону из медиан, чтобы numba/shap скомпилировали
+    свои функции. Пробный отчёт не сохраняется и не попадает в кэши.
+    """
+    from .explainers import warm_up_explainers
+
+    model_registry.preload(model_root)
+    warm_up_explainers(model_root)
+
+    share = f"{100 / len(uniq_changed_ration):.3f}".replace(".", ",")
+    report = ReportDocument(Path(tempfile.gettempdir()) / "agrotech_warm_up.json", {
+        "meta": {"name": "warm_up"},
+        "ration_rows": [{"Ингредиенты": name, "%СВ": share} for name in uniq_changed_ration],
+        "nutrients_rows": [{"Нутриент": name, "СВ": ""} for name in uniq_step],
+    })
+    predict_from_file(report, f"{model_root}/acids", executor=executor, charts=None, jobs=None, memo=None)
 
 
 if __name__ == '__main__':
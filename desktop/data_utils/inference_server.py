@@ -0,0 +1,582 @@
+"""
+Локальный процесс анализа: держит модели в памяти и принимает задачи от
+окон приложения по multiprocessing.connection (Unix-сокет или именованный
+канал Windows). Один процесс на пользователя обслуживает все окна и все
+запущенные копии приложения; SHAP, matplotlib и пул воркеров живут в нём,
+а не в процессе с Qt.
+
+    python -m desktop.data_utils.inference_server        # запуск вручную
+    python -m desktop.data_utils.inference_server --stop
+
+Обычно процесс запускает InferenceClient при первом обращении, а сам он
+завершается после idle_timeout секунд без задач или когда клиент пришёл
+с другой версией кода и моделей (build_version) — после обновления
+приложения или переобучения его место занимает новый процесс.
+"""
+import argparse
+import getpass
+import hashlib
+import os
+import secrets
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from pathlib import Path
+
+from platformdirs import user_data_dir, user_log_dir, user_runtime_dir
+
+
+APP_NAME = "AgroTech"
+
+# AGROTECH_INFERENCE=local — считать в процессе приложения, как раньше
+MODE_ENV = "AGROTECH_INFERENCE"
+
+DEFAULT_IDLE_TIMEOUT = 60 * 60
+DEFAULT_START_TIMEOUT = 30.0
+
+# код и модели процесса анализа: (каталог, шаблон) для build_version
+VERSION_SOURCES = (
+    ("desktop", "*.py"),
+    ("desktop/data_utils", "**/*.py"),
+    ("training", "**/*.py"),
+    ("models", "**/*"),
+)
+
+# сколько раз клиент переподключается, пока процесс старой версии освобождает адрес
+RESTART_ATTEMPTS = 50
+
+
+class InferenceError(RuntimeError):
+    """Анализ в процессе анализа завершился ошибкой (текст — traceback оттуда)."""
+
+
+class InferenceUnavailable(InferenceError):
+    """Процесс анализа не удалось запустить или к нему не удалось подключиться."""
+
+
+def use_inference_server():
+    return os.environ.get(MODE_ENV, "server").lower() != "local"
+
+
+def build_version(root=None):
+    """
+    Версия кода и моделей по путям, mtime и размерам файлов VERSION_SOURCES.
+    Дёшево (только stat), поэтому клиент считает её на каждый запрос, а сервер —
+    один раз при старте: это то, что он загрузил.
+    """
+    root = Path(root or os.getcwd())
+    h = hashlib.sha256()
+    for folder, pattern in VERSION_SOURCES:
+        for path in sorted((root / folder).glob(pattern)):
+            if not path.is_file() or "__pycache__" in path.parts:
+                continue
+            stat = path.stat()
+            h.update(f"{path.relative_to(root).as_posix()}:{stat.st_mtime_ns}:{stat.st_size}\n".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def default_address():
+    if sys.platform == "win32":
+        return rf"\\.\pipe\{APP_NAME}-inference-{getpass.getuser()}"
+    root = Path(user_runtime_dir(APP_NAME, appauthor=False))
+    root.mkdir(parents=True, exist_ok=True)
+    return str(root / "inference.sock")
+
+
+def default_authkey():
+    """Случайный ключ пользователя: без него к сокету не подключиться."""
+    path = Path(user_data_dir(APP_NAME, appauthor=False)) / "inference.key"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        pass
+    else:
+        with os.fdopen(fd, "w") as f:
+            f.write(secrets.token_hex(32))
+    for _ in range(50):
+        key = path.read_text().strip()
+        if key:
+            return key.encode("ascii")
+        # другой процесс только что создал файл и ещё пишет ключ
+        time.sleep(0.01)
+    raise InferenceUnavailable(f"пустой ключ в {path}")
+
+
+class InferenceServer:
+    """
+    Сервер задач анализа. Запросы — словари с полем op и version клиента
+    (build_version). Если version не совпадает с версией сервера, ответ —
+    {"event": "outdated"}: сервер освобождает адрес, дожидается текущих
+    задач и завершается, а клиент запускает процесс новой версии.
+
+      ping     -> {"event": "pong", "pid", "ready", "version"}
+      warm_up  -> ждёт окончания прогрева моделей, затем {"event": "ready"}
+      analyze  -> события {"event": "progress", "stage"} и в конце
+                  {"event": "done", "result", "timings"} или {"event": "error"}
+      render   -> дорисовывает графики отчёта path, {"event": "done", "result":
+                  [нарисованные файлы]}; окну не нужны matplotlib и shap
+      optimize -> варианты рациона отчёта path после анализа (optimize_rations),
+                  {"event": "done", "result": изменился ли отчёт}
+      shutdown -> {"event": "bye"}, сервер останавливается
+
+    Анализы выполняются по одному (модели и пул общие), ожидающие получают
+    событие queued. Соединение обслуживается в отдельном потоке.
+    """
+
+    def __init__(self, address=None, authkey=None, idle_timeout=DEFAULT_IDLE_TIMEOUT, workers=None, warm=True,
+                 version=None):
+        self.address = address or default_address()
+        self.authkey = authkey or default_authkey()
+        self.version = version or build_version()
+        self.idle_timeout = idle_timeout
+        self.workers = workers
+        self.warm = warm
+
+        self._ready = threading.Event()
+        self._analysis_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._active = 0
+        self._last_activity = time.monotonic()
+        self._stopping = False
+
+    # === жизненный цикл ===
+
+    def serve_forever(self):
+        self._remove_stale_socket()
+        try:
+            listener = Listener(self.address, authkey=self.authkey)
+        except OSError as e:
+            # адрес занят живым сервером: он и будет обслуживать окна
+            print(f"сервер анализа уже запущен ({e})", file=sys.stderr)
+            return False
+
+        # анализ, кэши и графики живут здесь, поэтому и эндпоинт Prometheus тоже
+        from .metrics import start_metrics_from_env
+        try:
+            start_metrics_from_env()
+        except OSError as e:
+            print(f"эндпоинт метрик не запущен ({e})", file=sys.stderr)
+
+        if self.warm:
+            threading.Thread(target=self._warm_up, daemon=True).start()
+        else:
+            self._ready.set()
+        threading.Thread(target=self._watch_idle, daemon=True).start()
+
+        with listener:
+            while not self._stopping:
+                try:
+                    conn = listener.accept()
+                except AuthenticationError:
+                    continue
+                except OSError:
+                    break
+                if self._stopping:
+                    conn.close()
+                    break
+                threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+        # адрес уже свободен; задачи, принятые до остановки, доделываются
+        while True:
+            with self._state_lock:
+                if self._active == 0:
+                    break
+            time.sleep(0.05)
+
+        from .executor import shutdown_shared_executor
+        shutdown_shared_executor()
+        return True
+
+    def stop(self):
+        self._stopping = True
+        # accept() не прерывается закрытием сокета из другого потока — будим его подключением
+        try:
+            Client(self.address, authkey=self.authkey).close()
+        except OSError:
+            pass
+
+    def _remove_stale_socket(self):
+        if sys.platform == "win32" or not os.path.exists(self.address):
+            return
+        try:
+            Client(self.address, authkey=self.authkey).close()
+        except (OSError, AuthenticationError):
+            os.unlink(self.address)
+
+    def _warm_up(self):
+        from .executor import shared_executor
+        from .infer_model import warm_up
+
+        try:
+            warm_up(shared_executor(self.workers))
+        except Exception:
+            traceback.print_exc()
+        finally:
+            self._ready.set()
+
+    def _watch_idle(self):
+        while not self._stopping:
+            time.sleep(min(self.idle_timeout, 30))
+            with self._state_lock:
+                idle = self._active == 0 and time.monotonic() - self._last_activity > self.idle_timeout
+            if idle:
+                self.stop()
+
+    # === обработка запросов ===
+
+    @staticmethod
+    def _send(conn, event):
+        """Отправляет событие; False, если окно уже закрыло соединение."""
+        try:
+            conn.send(event)
+            return True
+        except (EOFError, OSError):
+            return False
+
+    def _serve(self, conn):
+        with self._state_lock:
+            self._active += 1
+        try:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    break
+                op = request.get("op")
+                if op != "shutdown" and request.get("version", self.version) != self.version:
+                    # приложение обновили или переобучили модели: уступаем место новому процессу
+                    self._send(conn, {"event": "outdated", "version": self.version})
+                    self.stop()
+                    break
+                if op == "ping":
+                    sent = self._send(conn, {"event": "pong", "pid": os.getpid(), "ready": self._ready.is_set(),
+                                             "version": self.version})
+                elif op == "warm_up":
+                    self._ready.wait()
+                    sent = self._send(conn, {"event": "ready"})
+                elif op == "analyze":
+                    sent = self._analyze(conn, request)
+                elif op == "render":
+                    sent = self._render(conn, request)
+                elif op == "optimize":
+                    sent = self._optimize(conn, request)
+                elif op == "shutdown":
+                    self._send(conn, {"event": "bye"})
+                    self.stop()
+                    break
+                else:
+                    sent = self._send(conn, {"event": "error", "message": f"неизвестная операция {op!r}"})
+                if not sent:
+                    # окно отключилось посреди задачи: результат уже в отчёте, отвечать некому
+                    break
+        finally:
+            conn.close()
+            with self._state_lock:
+                self._active -= 1
+                self._last_activity = time.monotonic()
+
+    def _analyze(self, conn, request):
+        def progress(stage):
+            # анализ доводится до конца, даже если окно закрыли
+            self._send(conn, {"event": "progress", "stage": stage})
+
+        try:
+            if not self._analysis_lock.acquire(blocking=False):
+                progress("queued")
+                self._analysis_lock.acquire()
+            try:
+                if not self._ready.is_set():
+                    progress("loading")
+                    self._ready.wait()
+                result, timings = analyze_report(request["path"], request["data"], request.get("md_path"),
+                                                 cache=request.get("cache", False), workers=self.workers,
+                                                 progress=progress)
+                # разбор PDF/XLS замерен в окне приложения, где эндпоинта нет
+                from .metrics import record_timings
+                record_timings(timings, ("parse",))
+            finally:
+                self._analysis_lock.release()
+        except Exception:
+            return self._send(conn, {"event": "error", "message": traceback.format_exc()})
+        return self._send(conn, {"event": "done", "result": result, "timings": timings})
+
+    def _render(self, conn, request):
+        # без _analysis_lock: у графиков своя очередь (chart_queue), а отчёт
+        # из неё, если он ещё не нарисован, render_now поднимает в начало
+        try:
+            rendered = render_report(request["path"])
+        except Exception:
+            return self._send(conn, {"event": "error", "message": traceback.format_exc()})
+        return self._send(conn, {"event": "done", "result": rendered})
+
+    def _optimize(self, conn, request):
+        # фоновый шаг: без _analysis_lock, пул общий с анализом
+        try:
+            changed = optimize_rations(request["path"], request.get("md_path"), self.workers)
+        except Exception:
+            return self._send(conn, {"event": "error", "message": traceback.format_exc()})
+        return self._send(conn, {"event": "done", "result": changed})
+
+
+def analyze_report(path, data, md_path=None, cache=False, workers=None, progress=None):
+    """
+    Анализ отчёта от начала до конца: predict_from_file и write_report_files.
+    Выполняется в процессе анализа, а при AGROTECH_INFERENCE=local — в процессе
+    приложения. Возвращает ({кислота: значение}, meta.timings).
+    Варианты рациона сюда не входят — их отдельно считает optimize_rations.
+    """
+    from desktop.report import write_report_files
+
+    from .document import ReportDocument
+    from .executor import shared_executor
+    from .infer_model import predict_from_file
+    from .result_cache import result_cache
+
+    progress = progress or (lambda stage: None)
+    report = ReportDocument(path, data)
+    # варианты рациона относятся к прошлому анализу
+    report.data.pop("optimized_rations", None)
+
+    progress("analysis")
+    result = predict_from_file(report, executor=shared_executor(workers), cache=result_cache if cache else None)
+
+    progress("report")
+    write_report_files(input_json_path=report, out_report_md=md_path, update_json_with_report=True)
+
+    result = {acid: float(value[0]) for acid, value in result.items()}
+    return result, report["meta"].get("timings", {})
+
+
+def render_report(path):
+    """Дожидается графиков отчёта path (см. chart_queue.render_now); возвращает нарисованные файлы."""
+    from .charts import chart_queue
+
+    return [str(p) for p in chart_queue.render_now(path)]
+
+
+def optimize_rations(path, md_path=None, workers=None):
+    """
+    Варианты рациона для проанализированного отчёта path — фоновый шаг после
+    анализа, который его не задерживает. Считает, только если кислоты вне
+    коридоров config.borders, а вариантов в отчёте ещё нет; тогда пересобирает
+    отчёт (раздел «Варианты рациона»). Возвращает True, если отчёт изменился.
+    """
+    from desktop.report import write_report_files
+
+    from .document import ReportDocument
+    from .executor import shared_executor
+    from .metrics import report_timings, span
+    from .optimizer import optimize_report, outside_borders
+
+    report = ReportDocument.load(path)
+    if "optimized_rations" in report or not outside_borders(report.get("result_acids") or {}):
+        return False
+    with span("optimize", report_timings(report)):
+        optimize_report(report, executor=shared_executor(workers))
+    write_report_files(input_json_path=report, out_report_md=md_path, update_json_with_report=True)
+    return True
+
+
+class InferenceClient:
+    """
+    Клиент процесса анализа. На каждый вызов — своё соединение, поэтому
+    один экземпляр можно использовать из разных потоков и окон. Если
+    процесс не запущен, он стартует в фоне (start=True) и живёт дальше
+    независимо от приложения. Процесс другой версии (build_version)
+    завершается сам, а клиент переподключается к новому.
+    """
+
+    def __init__(self, address=None, authkey=None, start=True, start_timeout=DEFAULT_START_TIMEOUT, version=None):
+        self._address = address
+        self._authkey = authkey
+        self._version = version
+        self.start = start
+        self.start_timeout = start_timeout
+        self._start_lock = threading.Lock()
+
+    @property
+    def address(self):
+        if self._address is None:
+            self._address = default_address()
+        return self._address
+
+    @property
+    def authkey(self):
+        if self._authkey is None:
+            self._authkey = default_authkey()
+        return self._authkey
+
+    def _connect(self):
+        try:
+            return Client(self.address, authkey=self.authkey)
+        except AuthenticationError:
+            raise InferenceUnavailable(f"процесс анализа отклонил ключ ({self.address})")
+        except OSError:
+            if not self.start:
+                raise InferenceUnavailable(f"процесс анализа не запущен ({self.address})")
+
+        with self._start_lock:
+            try:
+                return Client(self.address, authkey=self.authkey)
+            except OSError:
+                process = spawn_server()
+            deadline = time.monotonic() + self.start_timeout
+            while time.monotonic() < deadline:
+                try:
+                    return Client(self.address, authkey=self.authkey)
+                except OSError:
+                    if process.poll() is not None and process.returncode != 0:
+                        break
+                    time.sleep(0.1)
+        raise InferenceUnavailable(f"не удалось запустить процесс анализа, см. {log_path()}")
+
+    @property
+    def version(self):
+        return self._version or build_version()
+
+    def request(self, op, on_event=None, **payload):
+        """Отправляет запрос и читает события до итогового; возвращает итоговое событие."""
+        for attempt in range(RESTART_ATTEMPTS):
+            try:
+                event = self._request(op, on_event, payload)
+            except InferenceUnavailable:
+                # старый процесс мог закрыть и это соединение, пока освобождал адрес
+                if attempt == 0:
+                    raise
+            else:
+                if event["event"] != "outdated":
+                    return event
+            time.sleep(0.1)
+        raise InferenceUnavailable(f"процесс анализа другой версии не освободил адрес ({self.address})")
+
+    def _request(self, op, on_event, payload):
+        with self._connect() as conn:
+            conn.send({"op": op, "version": self.version, **payload})
+            while True:
+                try:
+                    event = conn.recv()
+                except (EOFError, OSError) as e:
+                    raise InferenceUnavailable(f"процесс анализа закрыл соединение: {e}")
+                if event["event"] == "progress":
+                    if on_event is not None:
+                        on_event(event["stage"])
+                    continue
+                if event["event"] == "error":
+                    raise InferenceError(event["message"])
+                return event
+
+    def ping(self):
+        return self.request("ping")
+
+    def warm_up(self):
+        """Запускает процесс (если нужно) и ждёт, пока он прогреет модели."""
+        self.request("warm_up")
+
+    def analyze(self, path, data, md_path=None, cache=False, progress=None):
+        """analyze_report в процессе анализа; progress(stage) получает события по ходу."""
+        event = self.request("analyze", progress, path=str(Path(path).resolve()), data=data,
+                             md_path=str(Path(md_path).resolve()) if md_path else None, cache=cache)
+        return event["result"], event["timings"]
+
+    def render(self, path):
+        """render_report в процессе анализа."""
+        return self.request("render", path=str(Path(path).resolve()))["result"]
+
+    def optimize(self, path, md_path=None):
+        """optimize_rations в процессе анализа."""
+        return self.request("optimize", path=str(Path(path).resolve()),
+                            md_path=str(Path(md_path).resolve()) if md_path else None)["result"]
+
+    def shutdown(self):
+        try:
+            self.request("shutdown")
+        except InferenceUnavailable:
+            pass
+
+
+def log_path():
+    return Path(user_log_dir(APP_NAME, appauthor=False)) / "inference.log"
+
+
+def spawn_server():
+    """Запускает процесс анализа отдельно от приложения (переживает его закрытие)."""
+    log = log_path()
+    log.parent.mkdir(parents=True, exist_ok=True)
+
+    kwargs = {}
+    if sys.platform == "win32":
+        kwargs["creationflags"] = (subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+                                   | subprocess.CREATE_NO_WINDOW)
+    else:
+        kwargs["start_new_session"] = True
+
+    with open(log, "ab") as f:
+        # cwd — корень проекта: пути к моделям относительные
+        return subprocess.Popen([sys.executable, "-m", "desktop.data_utils.inference_server"],
+                                cwd=os.getcwd(), stdin=subprocess.DEVNULL, stdout=f, stderr=f, **kwargs)
+
+
+def run_analysis(path, data, md_path=None, cache=False, progress=None):
+    """
+    Анализ из окна приложения: в процессе анализа, а если его не удалось
+    запустить (или AGROTECH_INFERENCE=local) — здесь же, как раньше.
+    """
+    if use_inference_server():
+        try:
+            return inference_client.analyze(path, data, md_path, cache, progress)
+        except InferenceUnavailable:
+            traceback.print_exc()
+            # анализ остаётся в этом процессе — метрики тоже отсюда
+            from .metrics import start_metrics_from_env
+            try:
+                start_metrics_from_env()
+            except OSError:
+                traceback.print_exc()
+    return analyze_report(path, data, md_path, cache, progress=progress)
+
+
+def run_render(path):
+    """Графики отчёта для окна приложения: в процессе анализа или, без него, здесь же."""
+    if use_inference_server():
+        try:
+            return inference_client.render(path)
+        except InferenceUnavailable:
+            traceback.print_exc()
+    return render_report(path)
+
+
+def run_optimize(path, md_path=None):
+    """Варианты рациона для окна приложения: в процессе анализа или, без него, здесь же."""
+    if use_inference_server():
+        try:
+            return inference_client.optimize(path, md_path)
+        except InferenceUnavailable:
+            traceback.print_exc()
+    return optimize_rations(path, md_path)
+
+
+# Глобальный экземпляр
+inference_client = InferenceClient()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Процесс анализа отчётов AgroTech")
+    parser.add_argument("--idle-timeout", type=float, default=DEFAULT_IDLE_TIMEOUT,
+                        help="завершиться после стольких секунд без задач")
+    parser.add_argument("--workers", type=int, help="размер пула процессов")
+    parser.add_argument("--stop", action="store_true", help="остановить запущенный процесс")
+    args = parser.parse_args(argv)
+
+    if args.stop:
+        InferenceClient(start=False).shutdown()
+        return
+    InferenceServer(idle_timeout=args.idle_timeout, workers=args.workers).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
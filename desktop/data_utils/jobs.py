@@ -0,0 +1,133 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .executor import submit
+from .metrics import collect, record
+
+
+class Job:
+    """
+    Задача анализа: fn(values, *args), где values — значения колонок из групп
+    depends (в порядке колонок строки). Результат зависит только от них.
+    """
+
+    def __init__(self, name, depends, fn, *args):
+        self.name = name
+        self.depends = tuple(depends)
+        self.fn = fn
+        self.args = args
+
+
+def _run_job(fn, values, *args):
+    """Выполняет задачу и возвращает (результат, {стадия: мс}) её span'ов."""
+    with collect(defer=True) as timings:
+        result = fn(values, *args)
+    return result, timings
+
+
+class JobCache:
+    """LRU-кэш результатов задач в памяти процесса: ключ -> результат."""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class JobGraph:
+    """
+    Граф задач анализа над одной строкой признаков.
+
+    groups — именованные группы колонок (например, "ration" и "nutrients"),
+    у каждой задачи свой список групп-зависимостей. Ключ задачи — хэш её
+    имени, версии моделей и значений только этих колонок, поэтому после
+    правки одной таблицы пересчитываются лишь задачи, зависящие от неё,
+    а остальные берутся из JobCache.
+    """
+
+    def __init__(self, groups, jobs, version=""):
+        self.groups = {name: list(columns) for name, columns in groups.items()}
+        self.jobs = list(jobs)
+        self.version = version
+        self.recomputed = []
+        self.reused = []
+        self.timings = {}
+
+    def columns(self, job, data):
+        """Колонки, от которых зависит задача, в порядке колонок data."""
+        wanted = {c for group in job.depends for c in self.groups[group]}
+        return [c for c in data.columns if c in wanted]
+
+    def key(self, job, data):
+        values = np.ascontiguousarray(data[self.columns(job, data)].to_numpy(dtype=np.float64)[0], dtype="<f8")
+        h = hashlib.sha256()
+        h.update(f"{job.name}:{self.version}:{job.args!r}:".encode("utf-8"))
+        h.update(values.tobytes())
+        return h.hexdigest()
+
+    def run(self, data, executor=None, cache=None):
+        """
+        Выполняет задачи для однострочного DataFrame data. Промахи кэша уходят
+        в executor параллельно. Возвращает {имя задачи: результат}.
+
+        В timings — сумма span'ов (predict, explain) пересчитанных задач в мс;
+        задачи из кэша в неё не входят.
+        """
+        self.recomputed, self.reused, self.timings = [], [], {}
+        results, pending = {}, {}
+
+        for job in self.jobs:
+            key = self.key(job, data)
+            hit = cache.get(key) if cache is not None else None
+            if hit is not None:
+                results[job.name] = hit
+                self.reused.append(job.name)
+                continue
+
+            values = data[self.columns(job, data)].to_numpy()[0]
+            pending[job.name] = (key, submit(executor, _run_job, job.fn, values, *job.args))
+            self.recomputed.append(job.name)
+
+        for name, (key, future) in pending.items():
+            results[name], timings = future.result()
+            for stage, ms in timings.items():
+                self.timings[stage] = round(self.timings.get(stage, 0.0) + ms, 1)
+                record(stage, ms / 1000)
+            if cache is not None:
+                cache.put(key, results[name])
+
+        return results
+
+
+# Глобальный экземпляр
+job_cache = JobCache()
@@ -0,0 +1,160 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+
+# стадии, для которых строятся гистограммы; span с другим именем тоже пишется
+STAGES = ("parse", "prepare", "predict", "explain", "importance", "render", "report")
+
+DEFAULT_PORT = 9464
+
+# порт эндпоинта; его поднимает процесс, где идёт анализ (см. start_metrics_from_env)
+PORT_ENV = "AGROTECH_METRICS_PORT"
+
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_local = threading.local()
+_histogram = None
+_server_lock = threading.Lock()
+
+
+def record(stage, seconds):
+    """Одно наблюдение в гистограмму стадии (если экспорт метрик включён)."""
+    if _histogram is not None:
+        _histogram.labels(stage).observe(seconds)
+
+
+def record_timings(timings, stages):
+    """Переносит в гистограммы стадии из meta.timings (мс), замеренные в другом процессе."""
+    for stage in stages:
+        if stage in timings:
+            record(stage, timings[stage] / 1000)
+
+
+def _add(timings, stage, seconds):
+    timings[stage] = round(timings.get(stage, 0.0) + seconds * 1000, 1)
+
+
+@contextmanager
+def span(stage, timings=None):
+    """
+    Замер стадии. Длительность (мс) записывается в timings[stage], если он
+    передан (например, meta.timings отчёта), и прибавляется во все открытые
+    в этом потоке collect(). Вне collect(defer=True) она сразу идёт в гистограмму.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        if timings is not None:
+            timings[stage] = round(seconds * 1000, 1)
+        frames = getattr(_local, "frames", ())
+        for frame, _ in frames:
+            _add(frame, stage, seconds)
+        if not any(defer for _, defer in frames):
+            record(stage, seconds)
+
+
+def timed(stage):
+    """Декоратор: каждый вызов функции — span(stage)."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def collect(defer=False):
+    """
+    Собирает span'ы этого потока в словарь {стадия: мс}.
+
+    defer=True — для задач, которые могут выполняться в другом процессе:
+    гистограммы там не пишутся, вызывающая сторона передаёт собранное
+    в record сама (см. jobs.JobGraph).
+    """
+    frames = getattr(_local, "frames", ())
+    timings = {}
+    _local.frames = frames + ((timings, defer),)
+    try:
+        yield timings
+    finally:
+        _local.frames = frames
+
+
+def report_timings(report):
+    """meta.timings отчёта (ReportDocument или dict); создаётся при первом обращении."""
+    meta = report.get("meta")
+    if not isinstance(meta, dict):
+        meta = report["meta"] = {}
+    return meta.setdefault("timings", {})
+
+
+class _CacheCollector:
+    """Попадания и промахи кэшей моделей и результатов на момент опроса."""
+
+    def __init__(self, caches):
+        self.caches = caches
+
+    def collect(self):
+        from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+        hits = CounterMetricFamily("agrotech_cache_hits", "Попадания в кэш", labels=["cache"])
+        misses = CounterMetricFamily("agrotech_cache_misses", "Промахи кэша", labels=["cache"])
+        ratio = GaugeMetricFamily("agrotech_cache_hit_ratio", "Доля попаданий в кэш", labels=["cache"])
+        for name, cache in self.caches().items():
+            total = cache.hits + cache.misses
+            hits.add_metric([name], cache.hits)
+            misses.add_metric([name], cache.misses)
+            ratio.add_metric([name], cache.hits / total if total else 0.0)
+        yield hits
+        yield misses
+        yield ratio
+
+
+def _caches():
+    from .jobs import job_cache
+    from .nutri_memo import nutri_memo
+    from .registry import model_registry
+    from .result_cache import result_cache
+
+    return {"models": model_registry, "results": result_cache, "jobs": job_cache, "nutri": nutri_memo}
+
+
+def start_metrics_server(port=DEFAULT_PORT, addr="127.0.0.1"):
+    """
+    Поднимает локальный HTTP-эндпоинт Prometheus (/metrics): гистограммы
+    agrotech_stage_seconds{stage=...} и счётчики кэшей. prometheus_client —
+    необязательная зависимость: без неё возвращает False, и span'ы
+    продолжают писать только meta.timings.
+    """
+    global _histogram
+
+    try:
+        from prometheus_client import REGISTRY, Histogram, start_http_server
+    except ImportError:
+        return False
+
+    with _server_lock:
+        if _histogram is None:
+            histogram = Histogram("agrotech_stage_seconds", "Длительность стадии анализа отчёта",
+                                  ["stage"], buckets=_BUCKETS)
+            for stage in STAGES:
+                histogram.labels(stage)
+            REGISTRY.register(_CacheCollector(_caches))
+            start_http_server(port, addr)
+            _histogram = histogram
+    return True
+
+
+def start_metrics_from_env():
+    """start_metrics_server на порту из AGROTECH_METRICS_PORT; без переменной — False."""
+    port = os.environ.get(PORT_ENV)
+    if not port:
+        return False
+    return start_metrics_server(int(port))
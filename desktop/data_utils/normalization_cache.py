@@ -0,0 +1,201 @@
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from platformdirs import user_data_dir
+
+
+APP_NAME = "AgroTech"
+
+# откуда взялась запись: посчитана нормализатором или исправлена администратором
+AUTO = "auto"
+ADMIN = "admin"
+
+DEFAULT_MAX_ENTRIES = 50_000
+
+# путь к базе вместо каталога данных пользователя (тесты, несколько установок)
+PATH_ENV = "AGROTECH_NORMALIZATION_CACHE"
+
+
+def default_cache_path():
+    if os.environ.get(PATH_ENV):
+        return Path(os.environ[PATH_ENV])
+    return Path(user_data_dir(APP_NAME, appauthor=False)) / "normalization.sqlite3"
+
+
+class NormalizationCache:
+    """
+    Постоянный кэш нормализации: сырое значение «Ингредиенты» -> колонка модели.
+
+    Хранится в SQLite в каталоге данных пользователя и переживает перезапуски.
+    Перед базой стоит словарь в памяти, так что повторное название стоит одного
+    обращения к dict; промахи дочитываются из базы. Базу делят процессы
+    (приложение и сервер анализа): когда её меняет другое соединение
+    (PRAGMA data_version), словарь сбрасывается. Автоматические записи
+    вытесняются по LRU, когда их больше max_entries; исправления администратора
+    не вытесняются и имеют приоритет. Автоматическая запись помнит версию
+    нормализатора (IngredientNormalizer.version), который её посчитал: get_many
+    с другой версией её не возвращает. Соединение открывается при первом обращении.
+    """
+
+    def __init__(self, path=None, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = Path(path) if path is not None else None
+        self.max_entries = max_entries
+        self._conn = None
+        # raw -> (normalized, source, version) или None, если в базе такого нет
+        self._memory = {}
+        self._version = None
+        self._touched = {}
+        self._lock = threading.RLock()
+
+    def _connect(self):
+        if self._conn is None:
+            if self.path is None:
+                self.path = default_cache_path()
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS names ("
+                " raw TEXT PRIMARY KEY,"
+                " normalized TEXT NOT NULL,"
+                " source TEXT NOT NULL,"
+                " used_at REAL NOT NULL,"
+                " version TEXT NOT NULL DEFAULT '')"
+            )
+            # базы без версии: их автоматические записи не совпадут ни с одной версией
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(names)")]
+            if "version" not in columns:
+                conn.execute("ALTER TABLE names ADD COLUMN version TEXT NOT NULL DEFAULT ''")
+            conn.execute("CREATE INDEX IF NOT EXISTS names_lru ON names (source, used_at)")
+            conn.commit()
+            self._conn = conn
+        self._sync()
+        return self._conn
+
+    def _sync(self):
+        # data_version меняется, только когда базу записало другое соединение
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._version:
+            self._version = version
+            self._memory = {}
+
+    def _load(self, raws):
+        for start in range(0, len(raws), 500):
+            chunk = raws[start:start + 500]
+            for raw in chunk:
+                self._memory[raw] = None
+            rows = self._conn.execute(
+                f"SELECT raw, normalized, source, version FROM names WHERE raw IN ({', '.join('?' * len(chunk))})",
+                chunk)
+            for raw, normalized, source, version in rows:
+                self._memory[raw] = (normalized, source, version)
+
+    def get_many(self, raws, version=None):
+        """
+        {raw: (normalized, source)} для найденных в кэше значений. С version
+        автоматические записи другой версии нормализатора пропускаются.
+        """
+        with self._lock:
+            self._connect()
+            raws = list(dict.fromkeys(raws))
+            self._load([raw for raw in raws if raw not in self._memory])
+            found = {}
+            for raw in raws:
+                entry = self._memory[raw]
+                if entry is None or (version is not None and entry[1] == AUTO and entry[2] != version):
+                    continue
+                found[raw] = entry[:2]
+            # время обращения копится в памяти и пишется в базу вместе с записью
+            now = time.time()
+            for raw in found:
+                self._touched[raw] = now
+            return found
+
+    def get(self, raw, version=None):
+        return self.get_many([raw], version).get(raw)
+
+    def put_many(self, mapping, source=AUTO, version=""):
+        """
+        Записывает {raw: normalized}, посчитанные нормализатором версии
+        version. Автоматическое значение не затирает
+        исправление администратора — и своё, и записанное другим процессом:
+        проверка в самом UPSERT, а не по словарю в памяти.
+        """
+        if not mapping:
+            return
+        with self._lock:
+            self._connect()
+            keep = ADMIN if source == AUTO else ""
+            now = time.time()
+            self._conn.executemany(
+                "INSERT INTO names (raw, normalized, source, used_at, version) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT(raw) DO UPDATE SET normalized = excluded.normalized,"
+                " source = excluded.source, used_at = excluded.used_at, version = excluded.version"
+                " WHERE names.source != ?",
+                [(raw, value, source, now, version, keep) for raw, value in mapping.items()],
+            )
+            # что осталось в базе, дочитается при следующем get
+            for raw in mapping:
+                self._memory.pop(raw, None)
+                self._touched.pop(raw, None)
+            self._flush_touched()
+            self._evict()
+            self._conn.commit()
+
+    def put(self, raw, normalized, source=AUTO, version=""):
+        self.put_many({raw: normalized}, source, version)
+
+    def _flush_touched(self):
+        if self._touched:
+            self._conn.executemany("UPDATE names SET used_at = ? WHERE raw = ?",
+                                   [(at, raw) for raw, at in self._touched.items()])
+            self._touched = {}
+
+    def _evict(self):
+        (count,), = self._conn.execute("SELECT COUNT(*) FROM names WHERE source = ?", (AUTO,))
+        excess = count - self.max_entries
+        if excess <= 0:
+            return
+        stale = [raw for (raw,) in self._conn.execute(
+            "SELECT raw FROM names WHERE source = ? ORDER BY used_at LIMIT ?", (AUTO, excess))]
+        self._conn.executemany("DELETE FROM names WHERE raw = ?", [(raw,) for raw in stale])
+        for raw in stale:
+            self._memory.pop(raw, None)
+
+    def forget(self, raw):
+        with self._lock:
+            self._connect()
+            self._conn.execute("DELETE FROM names WHERE raw = ?", (raw,))
+            self._conn.commit()
+            self._memory.pop(raw, None)
+            self._touched.pop(raw, None)
+
+    def clear(self):
+        with self._lock:
+            self._connect()
+            self._conn.execute("DELETE FROM names")
+            self._conn.commit()
+            self._memory.clear()
+            self._touched.clear()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._flush_touched()
+                self._conn.commit()
+                self._conn.close()
+                self._conn = None
+                self._memory = {}
+                self._version = None
+
+    def __len__(self):
+        with self._lock:
+            (count,), = self._connect().execute("SELECT COUNT(*) FROM names")
+            return count
+
+
+# Глобальный экземпляр
+normalization_cache = NormalizationCache()
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import re
+
+from training import change_mapping, cultures, uniq_changed_ration
+
+from .normalization_cache import ADMIN, normalization_cache
+
+
+CULTURE_CODE = re.compile(r"\d{4}\.\d{2}\.(\d{2})\.?(\d{2})?")
+
+# меняется вместе с правилами fix_name: старые автоматические записи кэша перестают совпадать
+NORMALIZER_FORMAT = 1
+
+
+def _is_word_char(ch):
+    # то же, что \w в re для str
+    return ch.isalnum() or ch == "_"
+
+
+class _KeywordAutomaton:
+    """
+    Автомат Ахо–Корасик по ключевым словам рациона. Один проход по строке
+    находит все вхождения; из них берётся то же, что нашла бы регулярка
+    r'\\b(w1|w2|...)\\b' с IGNORECASE: самое левое, а при равном начале —
+    слово, раньше стоящее в списке.
+    """
+
+    def __init__(self, keywords):
+        self.keywords = list(keywords)
+        self.max_len = max(len(w) for w in self.keywords)
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+
+        for rank, word in enumerate(self.keywords):
+            state = 0
+            for ch in word.lower():
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = nxt
+            self._out[state].append((rank, len(word)))
+
+        queue = list(self._goto[0].values())
+        while queue:
+            state = queue.pop(0)
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def search(self, text):
+        """Каноническое ключевое слово из text или None."""
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            # редкие символы меняют длину при lower() — сверяем по исходной строке
+            lowered = text
+
+        best = None
+        state = 0
+        for end, ch in enumerate(lowered, 1):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+
+            for rank, length in self._out[state]:
+                start = end - length
+                if start > 0 and _is_word_char(lowered[start - 1]):
+                    continue
+                if end < len(lowered) and _is_word_char(lowered[end]):
+                    continue
+                if best is None or (start, rank) < best:
+                    best = (start, rank)
+
+            # совпадение дальше по строке не может начаться левее найденного
+            if best is not None and end >= best[0] + self.max_len:
+                break
+
+        return None if best is None else self.keywords[best[1]]
+
+
+class IngredientNormalizer:
+    """
+    Приводит названия ингредиентов из отчёта к колонкам модели (uniq_changed_ration).
+
+    Все структуры строятся один раз: точный словарь (канонические имена и
+    change_mapping()), автомат ключевых слов и декодер кода культуры
+    вида 1603.01.05... Порядок проверок тот же, что в extract_to_row/fix_name.
+
+    С cache (NormalizationCache) normalize_many сначала смотрит в постоянный
+    кэш: исправление администратора важнее всего, затем точный словарь,
+    затем запомненный результат fix_name; новые результаты fix_name
+    дописываются в кэш. Запомненные результаты привязаны к version — хэшу
+    колонок, change_mapping() и кодов культур, — поэтому после их изменения
+    пересчитываются; значения, которые больше не колонки модели, не используются.
+    """
+
+    def __init__(self, names=None, mapping=None, culture_codes=None, default=None, cache=None):
+        names = list(names if names is not None else uniq_changed_ration)
+        mapping = mapping if mapping is not None else change_mapping()
+
+        self.names = names
+        self.default = default if default is not None else names[0]
+        self.exact = {**mapping, **{name: name for name in names}}
+        self.cultures = dict(culture_codes if culture_codes is not None else cultures)
+        self.automaton = _KeywordAutomaton(names)
+        self.cache = cache
+        self.version = hashlib.sha256(json.dumps(
+            [NORMALIZER_FORMAT, names, mapping, self.cultures], ensure_ascii=False, sort_keys=True,
+        ).encode("utf-8")).hexdigest()[:16]
+        self._columns = set(names)
+
+    def decode_culture(self, value):
+        match = CULTURE_CODE.search(value)
+        if match is None:
+            return None
+        return self.cultures.get(match.group(1))
+
+    def fix_name(self, value):
+        """Ключевое слово или культура по коду; None, если ничего не найдено."""
+        return self.automaton.search(value) or self.decode_culture(value)
+
+    def normalize(self, value):
+        exact = self.exact.get(value)
+        if exact is not None:
+            return exact
+        return self.fix_name(value) or self.default
+
+    def normalize_many(self, values):
+        """Нормализует список названий; повторы внутри пачки считаются один раз."""
+        values = list(values)
+        if self.cache is None:
+            seen = {}
+            for value in values:
+                if value not in seen:
+                    seen[value] = self.normalize(value)
+            return [seen[value] for value in values]
+
+        cached = self.cache.get_many(values, self.version)
+        seen, learned = {}, {}
+        for value in dict.fromkeys(values):
+            hit = cached.get(value)
+            if hit is not None and hit[0] not in self._columns:
+                # исправление под колонку, которой больше нет в модели
+                hit = None
+            if hit is not None and hit[1] == ADMIN:
+                seen[value] = hit[0]
+            elif value in self.exact:
+                seen[value] = self.exact[value]
+            elif hit is not None:
+                seen[value] = hit[0]
+            else:
+                seen[value] = learned[value] = self.fix_name(value) or self.default
+
+        self.cache.put_many(learned, version=self.version)
+        return [seen[value] for value in values]
+
+    def learn(self, value, normalized):
+        """Запоминает исправление администратора: value всегда нормализуется в normalized."""
+        if normalized not in self.names:
+            raise ValueError(f"{normalized!r} не является колонкой модели")
+        if self.cache is None:
+            raise RuntimeError("исправления сохраняются только в нормализатор с кэшем")
+        self.cache.put(value, normalized, source=ADMIN)
+
+
+# Глобальный экземпляр
+ingredient_normalizer = IngredientNormalizer(cache=normalization_cache)
@@ -0,0 +1,90 @@
+"""
+Сравнение IngredientNormalizer с прежней нормализацией названий.
+
+    python -m desktop.data_utils.normalizer_benchmark
+
+legacy_normalize_report — путь extract_to_row до IngredientNormalizer:
+эталон для test_normalizer и для замеров времени ниже.
+"""
+import glob
+import re
+import tempfile
+import time
+
+from training import change_mapping, cultures, uniq_changed_ration
+
+from .normalization_cache import NormalizationCache
+from .normalizer import IngredientNormalizer
+
+
+def legacy_fix_name(value):
+    # fix_name до IngredientNormalizer — эталон для сравнения
+    code_pattern = re.compile(r"\d{4}\.\d{2}\.(\d{2})\.?(\d{2})?")
+    match = code_pattern.search(value)
+
+    name_pattern = r'\b(' + '|'.join(re.escape(w) for w in uniq_changed_ration) + r')\b'
+    name_match = re.search(name_pattern, value, flags=re.IGNORECASE)
+
+    if name_match:
+        return name_match.group(1)
+    if not match:
+        return None
+    return cultures.get(match.groups()[0])
+
+
+def legacy_normalize_report(values):
+    # прежний путь extract_to_row: change_mapping() на каждый отчёт и fix_name на имя
+    mapping = change_mapping()
+    result = []
+    for value in values:
+        if value in uniq_changed_ration:
+            result.append(value)
+        elif value in mapping:
+            result.append(mapping[value])
+        else:
+            result.append(legacy_fix_name(value) or uniq_changed_ration[0])
+    return result
+
+
+def main(folder="training/parsed_data", repeat=5):
+    """Сравнение со старым кодом на рационах из training/parsed_data (по отчёту на файл)."""
+    reports = []
+    for path in sorted(glob.glob(f"{folder}/*.csv")):
+        with open(path, encoding="utf-8") as f:
+            reports.append([line.split("|", 1)[0] for line in f.read().splitlines()[1:] if line])
+    names = [name for report in reports for name in report]
+
+    expected = [n.lower() for report in reports for n in legacy_normalize_report(report)]
+    actual = IngredientNormalizer().normalize_many(names)
+    mismatches = [(n, a, e) for n, a, e in zip(names, actual, expected) if a != e]
+
+    def timed(fn):
+        t = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        return (time.perf_counter() - t) / repeat * 1000
+
+    legacy = timed(lambda: [legacy_normalize_report(r) for r in reports])
+    build = timed(IngredientNormalizer)
+    plain = IngredientNormalizer()
+    batch = timed(lambda: [plain.normalize_many(r) for r in reports])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cached = IngredientNormalizer(cache=NormalizationCache(f"{tmp}/normalization.sqlite3"))
+        for report in reports:
+            cached.normalize_many(report)
+        warm = timed(lambda: [cached.normalize_many(r) for r in reports])
+        cached.cache.close()
+
+    print(f"отчётов: {len(reports)}, названий: {len(names)}, расхождений: {len(mismatches)}")
+    for label, ms in (("старый код", legacy),
+                      ("сборка IngredientNormalizer", build),
+                      ("normalize_many по отчётам", batch),
+                      ("то же с тёплым кэшем", warm)):
+        print(f"{label:<30}{ms:8.1f} мс")
+    for name, got, want in mismatches[:10]:
+        print("  ", name, "->", got, "/", want)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,427 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+import numpy as np
+
+
+COMPILED_ROOT = "models/numpy"
+
+# версия формата .npz: меняется вместе с устройством классов ниже
+FORMAT_VERSION = 1
+
+
+class Scaler:
+    """StandardScaler: (X - mean) / scale."""
+
+    kind = "scaler"
+    arrays = ("mean", "scale")
+
+    def __init__(self, mean, scale):
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+
+    def transform(self, X):
+        return (X - self.mean) / self.scale
+
+
+class Linear:
+    """Ridge/LinearRegression: X @ coef + intercept."""
+
+    kind = "linear"
+    arrays = ("coef",)
+    scalars = ("intercept",)
+
+    def __init__(self, coef, intercept):
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.intercept = float(intercept)
+
+    def predict(self, X):
+        return X @ self.coef + self.intercept
+
+
+class RbfSVR:
+    """SVR с RBF-ядром: sum(dual_coef * exp(-gamma * |x - sv|^2)) + intercept."""
+
+    kind = "rbf_svr"
+    arrays = ("support_vectors", "dual_coef")
+    scalars = ("gamma", "intercept")
+
+
+    def __init__(self, support_vectors, dual_coef, gamma, intercept):
+        self.support_vectors = np.asarray(support_vectors, dtype=np.float64)
+        self.dual_coef = np.asarray(dual_coef, dtype=np.float64)
+        self.gamma = float(gamma)
+        self.intercept = float(intercept)
+
+    def predict(self, X):
+        # |x - sv|^2 = |x|^2 + |sv|^2 - 2 x.sv: одно матричное умножение вместо
+        # тензора разностей n x n_sv x n_features
+        sv = self.support_vectors
+        sq_dist = (np.einsum("ij,ij->i", X, X)[:, None] + np.einsum("ij,ij->i", sv, sv)[None, :]
+                   - 2.0 * (X @ sv.T))
+        kernel = np.exp(-self.gamma * np.maximum(sq_dist, 0.0))
+        return kernel @ self.dual_coef + self.intercept
+
+
+class TreeEnsemble:
+    """
+    Лес решающих деревьев (RandomForestRegressor) в плоских массивах узлов.
+
+    Узлы всех деревьев лежат подряд, left/right — глобальные индексы, у листьев -1.
+    Как и sklearn, признаки сравниваются во float32: x <= threshold идёт влево.
+    Предсказание — среднее по деревьям.
+    """
+
+    kind = "tree_ensemble"
+    arrays = ("feature", "threshold", "left", "right", "value", "missing_left", "roots")
+
+    def __init__(self, feature, threshold, left, right, value, missing_left, roots):
+        self.feature = np.asarray(feature, dtype=np.int64)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.left = np.asarray(left, dtype=np.int64)
+        self.right = np.asarray(right, dtype=np.int64)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.missing_left = np.asarray(missing_left, dtype=bool)
+        self.roots = np.asarray(roots, dtype=np.int64)
+
+    def apply(self, X):
+        """Индексы листьев, shape (n_samples, n_trees)."""
+        X = np.asarray(X, dtype=np.float32)
+        node = np.broadcast_to(self.roots, (len(X), len(self.roots))).copy()
+
+        active = self.left[node] >= 0
+        while active.any():
+            r, t = np.nonzero(active)
+            current = node[r, t]
+            x = X[r, self.feature[current]]
+            go_left = np.where(np.isnan(x), self.missing_left[current], x <= self.threshold[current])
+            node[r, t] = np.where(go_left, self.left[current], self.right[current])
+            active[r, t] = self.left[node[r, t]] >= 0
+        return node
+
+    def predict(self, X):
+        return self.value[self.apply(X)].mean(axis=1)
+
+
+class ObliviousTrees:
+    """
+    Симметричные деревья CatBoost: на каждом уровне дерева одно условие
+    x[feature] > border (во float32), бит уровня j даёт 2**j в номере листа.
+    Ответ — scale * сумма значений листьев + bias.
+    """
+
+    kind = "oblivious_trees"
+    arrays = ("split_feature", "split_border", "depth", "leaf_values")
+    scalars = ("scale", "bias")
+
+    def __init__(self, split_feature, split_border, depth, leaf_values, scale=1.0, bias=0.0):
+        self.split_feature = np.asarray(split_feature, dtype=np.int64)
+        self.split_border = np.asarray(split_border, dtype=np.float32)
+        self.depth = np.asarray(depth, dtype=np.int64)
+        self.leaf_values = np.asarray(leaf_values, dtype=np.float64)
+        self.scale = float(scale)
+        self.bias = float(bias)
+
+        if (self.depth < 1).any():
+            raise ValueError("деревья глубины 0 не поддерживаются")
+        self._split_offset = np.concatenate([[0], np.cumsum(self.depth)[:-1]])
+        self._leaf_offset = np.concatenate([[0], np.cumsum(2 ** self.depth)[:-1]])
+        self._bit = 2 ** (np.arange(len(self.split_feature)) - np.repeat(self._split_offset, self.depth))
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        # NaN > border == False — как nan_mode="Min" по умолчанию в CatBoost
+        bits = (X[:, self.split_feature] > self.split_border) * self._bit
+        leaves = np.add.reduceat(bits, self._split_offset, axis=1) + self._leaf_offset
+        return self.scale * self.leaf_values[leaves].sum(axis=1) + self.bias
+
+
+class Chain:
+    """Pipeline: преобразования по очереди, затем модель."""
+
+    kind = "chain"
+
+    def __init__(self, steps, model):
+        self.steps = list(steps)
+        self.model = model
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        for step in self.steps:
+            X = step.transform(X)
+        return self.model.predict(X)
+
+
+class Voting:
+    """VotingRegressor: взвешенное среднее предсказаний участников."""
+
+    kind = "voting"
+
+    def __init__(self, members, weights=None):
+        self.members = list(members)
+        self.weights = None if weights is None else np.asarray(weights, dtype=np.float64)
+
+    def predict(self, X):
+        predictions = np.column_stack([member.predict(X) for member in self.members])
+        return np.average(predictions, axis=1, weights=self.weights)
+
+
+_KINDS = {cls.kind: cls for cls in (Scaler, Linear, RbfSVR, TreeEnsemble, ObliviousTrees, Chain, Voting)}
+
+
+def _compile_forest(forest):
+    feature, threshold, left, right, value, missing_left, roots = [], [], [], [], [], [], []
+    offset = 0
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        is_leaf = tree.children_left < 0
+        roots.append(offset)
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(tree.threshold)
+        left.append(np.where(is_leaf, -1, tree.children_left + offset))
+        right.append(np.where(is_leaf, -1, tree.children_right + offset))
+        value.append(tree.value[:, 0, 0])
+        missing = getattr(tree, "missing_go_to_left", None)
+        missing_left.append(np.zeros(tree.node_count, dtype=bool) if missing is None else missing.astype(bool))
+        offset += tree.node_count
+
+    return TreeEnsemble(*(np.concatenate(a) for a in (feature, threshold, left, right, value, missing_left)),
+                        roots=roots)
+
+
+def _compile_catboost(model):
+    fd, path = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    try:
+        model.save_model(path, format="json")
+        with open(path, encoding="utf-8") as f:
+            dump = json.load(f)
+    finally:
+        os.remove(path)
+
+    split_feature, split_border, depth, leaf_values = [], [], [], []
+    for tree in dump["oblivious_trees"]:
+        for split in tree["splits"]:
+            if split["split_type"] != "FloatFeature":
+                raise TypeError(f"неподдерживаемый тип сплита CatBoost: {split['split_type']}")
+            split_feature.append(split["float_feature_index"])
+            split_border.append(split["border"])
+        depth.append(len(tree["splits"]))
+        leaf_values.extend(tree["leaf_values"])
+
+    if len(leaf_values) != sum(2 ** d for d in depth):
+        raise TypeError("поддерживаются только одномерные ответы CatBoost")
+
+    scale, bias = dump.get("scale_and_bias", [1.0, [0.0]])
+    return ObliviousTrees(split_feature, split_border, depth, leaf_values, scale, np.ravel(bias)[0])
+
+
+def compile_model(estimator):
+    """
+    Переводит обученную модель sklearn/CatBoost в объекты этого модуля.
+    Тип определяется по имени класса, поэтому сам модуль не импортирует ни
+    sklearn, ни catboost.
+    """
+    name = type(estimator).__name__
+
+    if name == "Pipeline":
+        *steps, (_, final) = estimator.steps
+        return Chain([compile_model(step) for _, step in steps], compile_model(final))
+    if name == "VotingRegressor":
+        return Voting([compile_model(e) for e in estimator.estimators_], estimator.weights)
+    if name == "StandardScaler":
+        mean = estimator.mean_ if estimator.with_mean else np.zeros(estimator.n_features_in_)
+        scale = estimator.scale_ if estimator.with_std else np.ones(estimator.n_features_in_)
+        return Scaler(mean, scale)
+    if name in ("Ridge", "LinearRegression", "Lasso"):
+        return Linear(np.ravel(estimator.coef_), np.ravel(estimator.intercept_)[0])
+    if name == "SVR":
+        if estimator.kernel != "rbf":
+            raise TypeError(f"поддерживается только SVR с ядром rbf, а не {estimator.kernel}")
+        return RbfSVR(estimator.support_vectors_, estimator.dual_coef_[0],
+                      estimator._gamma, estimator.intercept_[0])
+    if name in ("RandomForestRegressor", "ExtraTreesRegressor"):
+        return _compile_forest(estimator)
+    if name == "CatBoostRegressor":
+        return _compile_catboost(estimator)
+
+    raise TypeError(f"не умею компилировать {name}")
+
+
+def _pack(obj, arrays, prefix):
+    if isinstance(obj, Chain):
+        return {"kind": obj.kind,
+                "steps": [_pack(s, arrays, f"{prefix}steps.{i}.") for i, s in enumerate(obj.steps)],
+                "model": _pack(obj.model, arrays, f"{prefix}model.")}
+    if isinstance(obj, Voting):
+        return {"kind": obj.kind,
+                "members": [_pack(m, arrays, f"{prefix}members.{i}.") for i, m in enumerate(obj.members)],
+                "weights": None if obj.weights is None else obj.weights.tolist()}
+
+    spec = {"kind": obj.kind}
+    for field in obj.arrays:
+        arrays[prefix + field] = getattr(obj, field)
+        spec[field] = prefix + field
+    for field in getattr(obj, "scalars", ()):
+        spec[field] = getattr(obj, field)
+    return spec
+
+
+def _unpack(spec, arrays):
+    cls = _KINDS[spec["kind"]]
+    if cls is Chain:
+        return Chain([_unpack(s, arrays) for s in spec["steps"]], _unpack(spec["model"], arrays))
+    if cls is Voting:
+        return Voting([_unpack(m, arrays) for m in spec["members"]], spec["weights"])
+
+    kwargs = {field: arrays[spec[field]] for field in cls.arrays}
+    kwargs.update({field: spec[field] for field in getattr(cls, "scalars", ())})
+    return cls(**kwargs)
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def save_compiled(model, path, source=None):
+    """
+    Сохраняет модель в .npz: массивы плюс JSON-описание структуры (без pickle).
+    source — sha256 исходного pkl, по нему resolve_model_path узнаёт устаревшие файлы.
+    """
+    arrays = {}
+    spec = {"format": FORMAT_VERSION, "source": source, "model": _pack(model, arrays, "")}
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        np.savez(f, __spec__=np.array(json.dumps(spec)), **arrays)
+
+
+def _read_spec(data, path):
+    spec = json.loads(str(data["__spec__"]))
+    if spec["format"] != FORMAT_VERSION:
+        raise ValueError(f"{path}: формат {spec['format']}, ожидается {FORMAT_VERSION}")
+    return spec
+
+
+def load_compiled(path):
+    with np.load(path, allow_pickle=False) as data:
+        spec = _read_spec(data, path)
+        model = _unpack(spec["model"], data)
+    model.source = spec.get("source")
+    return model
+
+
+def compiled_path(pkl_path, compiled_root=COMPILED_ROOT):
+    """models/classic_pipe/acids/X_ensemble.pkl -> models/numpy/acids/X_ensemble.npz"""
+    pkl_path = Path(pkl_path)
+    return Path(compiled_root) / pkl_path.parent.name / f"{pkl_path.stem}.npz"
+
+
+_resolved = {}
+_resolved_lock = threading.Lock()
+
+
+def _stamp(path):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def resolve_model_path(pkl_path, compiled_root=COMPILED_ROOT):
+    """
+    Путь к .npz, если он собран именно из этого pkl, иначе сам pkl.
+    Проверка (sha256 pkl против записанного при экспорте) кэшируется
+    до изменения любого из файлов.
+    """
+    npz_path = compiled_path(pkl_path, compiled_root)
+    if not npz_path.exists():
+        return str(pkl_path)
+
+    key = (str(Path(pkl_path).resolve()), _stamp(pkl_path), _stamp(npz_path))
+    with _resolved_lock:
+        fresh = _resolved.get(key)
+    if fresh is None:
+        try:
+            with np.load(npz_path, allow_pickle=False) as data:
+                fresh = _read_spec(data, npz_path).get("source") == file_digest(pkl_path)
+        except (OSError, ValueError, KeyError):
+            fresh = False
+        with _resolved_lock:
+            _resolved[key] = fresh
+    return str(npz_path) if fresh else str(pkl_path)
+
+
+def check_compiled(estimator, compiled, n_samples=2000, seed=0):
+    """
+    Наибольшее расхождение compiled.predict с estimator.predict на случайных
+    точках вокруг обучающего распределения (по статистикам первого скейлера).
+    """
+    first = estimator.estimators_[0] if type(estimator).__name__ == "VotingRegressor" else estimator
+    scaler = first.steps[0][1]
+    rng = np.random.default_rng(seed)
+    X = scaler.mean_ + scaler.scale_ * rng.normal(scale=1.5, size=(n_samples, len(scaler.mean_)))
+    return float(np.max(np.abs(compiled.predict(X) - estimator.predict(X))))
+
+
+def export_models(model_root="models/classic_pipe", compiled_root=COMPILED_ROOT, tolerance=1e-9):
+    """
+    Компилирует acids/*_ensemble.pkl и nutri/*_catboost.pkl в .npz и сверяет
+    с исходными моделями. Возвращает {путь .npz: расхождение}.
+    """
+    import joblib as jl
+
+    root = Path(model_root)
+    report = {}
+    for pkl in sorted([*root.glob("acids/*_ensemble.pkl"), *root.glob("nutri/*_catboost.pkl")]):
+        estimator = jl.load(pkl)
+        compiled = compile_model(estimator)
+        error = check_compiled(estimator, compiled)
+        if error > tolerance:
+            raise ValueError(f"{pkl}: расхождение {error:.3g} больше {tolerance:g}")
+
+        path = compiled_path(pkl, compiled_root)
+        save_compiled(compiled, path, source=file_digest(pkl))
+        report[str(path)] = error
+    return report
+
+
+def _benchmark(model_root="models/classic_pipe", compiled_root=COMPILED_ROOT, repeat=20):
+    """Время загрузки и предсказания: pkl (joblib + sklearn/catboost) против .npz."""
+    import time
+
+    import joblib as jl
+
+    root = Path(model_root)
+    pkls = sorted([*root.glob("acids/*_ensemble.pkl"), *root.glob("nutri/*_catboost.pkl")])
+
+    def timed(fn, n=1):
+        t = time.perf_counter()
+        for _ in range(n):
+            result = fn()
+        return (time.perf_counter() - t) / n * 1000, result
+
+    load_pkl, estimators = timed(lambda: [jl.load(p) for p in pkls])
+    load_npz, compiled = timed(lambda: [load_compiled(compiled_path(p, compiled_root)) for p in pkls])
+
+    for rows in (1, 1000):
+        rng = np.random.default_rng(0)
+        inputs = [e.estimators_[0].steps[0][1].mean_ if hasattr(e, "estimators_") else e.steps[0][1].mean_
+                  for e in estimators]
+        inputs = [m + rng.normal(size=(rows, len(m))) for m in inputs]
+        sk, _ = timed(lambda: [e.predict(X) for e, X in zip(estimators, inputs)], repeat)
+        np_, _ = timed(lambda: [c.predict(X) for c, X in zip(compiled, inputs)], repeat)
+        print(f"предсказание {rows:>4} строк, все модели: pkl {sk:8.1f} мс   npz {np_:8.1f} мс")
+
+    print(f"загрузка {len(pkls)} моделей: pkl {load_pkl:8.1f} мс   npz {load_npz:8.1f} мс")
+
+
+if __name__ == "__main__":
+    for path, error in export_models().items():
+        print(f"{path}: max|Δ| = {error:.2e}")
+    _benchmark()
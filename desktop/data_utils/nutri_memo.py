@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import shap
+from platformdirs import user_cache_dir
+
+from .result_cache import APP_NAME, ResultCache
+
+
+# шаг квантования долей рациона (% СВ): рационы, отличающиеся меньше чем
+# на полшага по каждому ингредиенту, считаются одним и тем же
+QUANT_STEP = 0.01
+
+# "memory" — только LRU в памяти процесса, "disk" — ещё и JSON на диске
+MODE_ENV = "AGROTECH_NUTRI_MEMO"
+
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+
+MEMO_FORMAT = 1
+
+
+def ration_key(ration, version, step=QUANT_STEP):
+    """
+    Ключ по рациону: имена колонок и доли, округлённые до step, плюс версия
+    моделей и точность SHAP. Таблица нутриентов в ключ не входит.
+    """
+    values = np.rint(ration.to_numpy(dtype=np.float64)[0] / step).astype("<i8")
+    h = hashlib.sha256()
+    h.update(f"{MEMO_FORMAT}:{version}:{step}:".encode("ascii"))
+    h.update(json.dumps([str(c) for c in ration.columns], ensure_ascii=False).encode("utf-8"))
+    h.update(values.tobytes())
+    return h.hexdigest()
+
+
+def memo_entry(explanations, top_features):
+    """
+    Запись мемо по результатам 13 моделей нутриентов: предсказание
+    (base_value + сумма SHAP), топ признаков и сам SHAP-вектор для waterfall.
+    """
+    first = next(iter(explanations.values()))
+    targets = {}
+    for key, explanation in explanations.items():
+        values = np.asarray(explanation.values, dtype=float)
+        base_value = float(np.ravel(explanation.base_values)[0])
+        targets[str(key)] = {
+            "prediction": base_value + float(values.sum()),
+            "top": top_features[key],
+            "values": values.tolist(),
+            "base_value": base_value,
+        }
+    return {"feature_names": list(first.feature_names), "targets": targets}
+
+
+def entry_explanations(entry, ration_row):
+    """
+    {ключ нутриента: shap.Explanation} из записи мемо. data — доли текущего
+    рациона: при совпадении с точностью до QUANT_STEP SHAP-вектор общий.
+    """
+    data = np.asarray(ration_row, dtype=float)
+    return {
+        int(key): shap.Explanation(
+            values=np.asarray(target["values"]),
+            base_values=target["base_value"],
+            data=data,
+            feature_names=entry["feature_names"],
+        )
+        for key, target in entry["targets"].items()
+    }
+
+
+def default_memo_root():
+    return Path(user_cache_dir(APP_NAME, appauthor=False)) / "nutri"
+
+
+class NutriMemo:
+    """
+    Мемо блока моделей нутриентов по квантованному вектору рациона.
+
+    Модели нутриентов зависят только от рациона, а у отчётов одной фермы
+    за период рацион обычно тот же при других лабораторных значениях.
+    Найденная запись заменяет 13 задач predict+SHAP. В памяти — LRU на
+    max_entries записей; disk=True добавляет второй уровень: JSON-файлы
+    с вытеснением по давности обращения (см. ResultCache), которые
+    переживают перезапуск приложения.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, disk=False, root=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.disk = ResultCache(root or default_memo_root(), max_bytes) if disk else None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        entry = self.disk.get(key) if self.disk is not None else None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, entry)
+        return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._remember(key, entry)
+        if self.disk is not None:
+            self.disk.put(key, entry)
+
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+        if self.disk is not None:
+            self.disk.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Глобальный экземпляр
+nutri_memo = NutriMemo(disk=os.environ.get(MODE_ENV, "memory").lower() == "disk")
@@ -0,0 +1,286 @@
+import numpy as np
+
+from training import uniq_changed_ration
+
+from .config import borders, nutri
+from .executor import create_executor, submit
+from .numpy_models import resolve_model_path
+from .registry import model_registry
+from .scenarios import SCHEMA, ScenarioEngine
+
+
+class RationProblem:
+    """
+    Постановка поиска рациона: доли ингредиентов (uniq_changed_ration) в сумме
+    дают столько же % СВ, сколько исходный рацион (в разобранных отчётах это
+    не ровно 100), каждая лежит в своих границах, а суммарный перенос
+    0.5 * sum|x - x0| не больше max_change. Цель — все кислоты внутри borders.
+
+    По умолчанию ингредиенты, которых нет в исходном рационе, не добавляются
+    (allow_new разрешает их). С update_nutrients=True таблица нутриентов
+    сдвигается на изменение, предсказанное моделями нутриентов по рациону.
+    """
+
+    def __init__(self, base, bounds=None, max_change=20.0, targets=None, allow_new=(),
+                 update_nutrients=True, model_path="models/classic_pipe/acids",
+                 nutri_path="models/classic_pipe/nutri", target_margin=0.1):
+        targets = dict(borders if targets is None else targets)
+        self.engine = ScenarioEngine(model_path, list(targets))
+        self.lo_target = np.array([targets[t][0] for t in self.engine.targets], dtype=float)
+        self.hi_target = np.array([targets[t][1] for t in self.engine.targets], dtype=float)
+        self.width = self.hi_target - self.lo_target
+        self.max_change = float(max_change)
+        self.target_margin = target_margin
+        self.nutri_path = nutri_path if update_nutrients else None
+
+        self.base_full = self.engine.base_vector(base)
+        n = len(uniq_changed_ration)
+        ration = np.nan_to_num(self.base_full[:n])
+        if ration.sum() <= 0:
+            raise ValueError("в исходном рационе нет ингредиентов")
+
+        self.lo = np.zeros(n)
+        self.hi = np.where((ration > 0) | np.isin(uniq_changed_ration, list(allow_new)), 100.0, 0.0)
+        for name, (lo, hi) in (bounds or {}).items():
+            if name not in uniq_changed_ration:
+                raise KeyError(f"{name!r} не является ингредиентом рациона")
+            i = uniq_changed_ration.index(name)
+            self.lo[i], self.hi[i] = lo, hi
+        # рацион не масштабируется к 100 %: прогноз исходного варианта совпадает
+        # с result_acids отчёта, а изменения считаются от того, что ввёл пользователь
+        self.ration = ration
+        self.total = float(ration.sum())
+        if self.lo.sum() > self.total or self.hi.sum() < self.total:
+            raise ValueError(f"границы ингредиентов несовместимы с суммой {self.total:g} % СВ")
+
+        self.x0 = _repair(ration, self.lo, self.hi, self.total)
+        self._nutri_columns = [SCHEMA.index(name) for name in nutri.values()]
+        self._nutri_base = self._predict_nutrients(self.x0[None])[0] if self.nutri_path else None
+
+    def _predict_nutrients(self, X):
+        models = [model_registry.load(resolve_model_path(f"{self.nutri_path}/{key}_catboost.pkl"))
+                  for key in nutri]
+        return np.column_stack([model.predict(X) for model in models])
+
+    def rows(self, X):
+        """Доли ингредиентов -> строки в схеме SCHEMA (нутриенты исходного отчёта)."""
+        full = np.tile(self.base_full, (len(X), 1))
+        full[:, :len(uniq_changed_ration)] = X
+        if self.nutri_path:
+            full[:, self._nutri_columns] += self._predict_nutrients(X) - self._nutri_base
+        return full
+
+    def measure(self, X):
+        """(предсказания, нарушение коридоров, запас до границ, перенесённый % СВ)."""
+        predictions = self.engine.predict(self.rows(X))
+        below = np.maximum(self.lo_target - predictions, 0.0)
+        above = np.maximum(predictions - self.hi_target, 0.0)
+        violation = ((below + above) / self.width).sum(axis=1)
+        margin = (np.minimum(predictions - self.lo_target, self.hi_target - predictions) / self.width).min(axis=1)
+        moved = 0.5 * np.abs(X - self.x0).sum(axis=1)
+        return predictions, violation, margin, moved
+
+    def loss(self, X):
+        # сначала попасть в коридоры, затем отойти от границ на target_margin,
+        # при прочих равных — меньше менять рацион
+        _, violation, margin, moved = self.measure(X)
+        return 10.0 * violation - np.minimum(margin, self.target_margin) + 1e-3 * moved
+
+    def candidate(self, x):
+        predictions, violation, margin, moved = self.measure(x[None])
+        return RationCandidate(self, x, predictions[0], violation[0], margin[0], moved[0])
+
+
+def _repair(x, lo, hi, total):
+    """Зажимает x в [lo, hi] и добирает сумму до total пропорционально запасу."""
+    x = np.clip(x, lo, hi)
+    for _ in range(len(x)):
+        gap = total - x.sum()
+        if abs(gap) < 1e-9:
+            break
+        room = (hi - x) if gap > 0 else (x - lo)
+        if room.sum() <= 0:
+            break
+        x = np.clip(x + gap * room / room.sum(), lo, hi)
+    return x
+
+
+class RationCandidate:
+    """Найденный рацион: доли, изменения относительно исходного и прогноз кислот."""
+
+    def __init__(self, problem, x, predictions, violation, margin, moved):
+        self.ration = {name: float(v) for name, v in zip(uniq_changed_ration, x) if v > 1e-6}
+        # изменения — относительно рациона отчёта (x0 отличается от него, только если его сдвинули bounds)
+        self.changes = {name: float(v - v0) for name, v, v0 in zip(uniq_changed_ration, x, problem.ration)
+                        if abs(v - v0) >= 0.01}
+        self.predictions = dict(zip(problem.engine.targets, map(float, predictions)))
+        # кислоты, которые и в этом варианте остаются вне коридора
+        self.outside = [target for target, p, lo, hi
+                        in zip(problem.engine.targets, predictions, problem.lo_target, problem.hi_target)
+                        if p < lo or p > hi]
+        self.violation = float(violation)
+        self.margin = float(margin)
+        self.moved = float(moved)
+        self.feasible = self.violation == 0.0
+        self._x = np.asarray(x)
+
+    def rank_key(self):
+        return (not self.feasible, round(self.violation, 6), round(self.moved, 2), -self.margin)
+
+    def to_dict(self):
+        return {
+            "feasible": self.feasible,
+            "outside": list(self.outside),
+            "moved": round(self.moved, 2),
+            "margin": round(self.margin, 3),
+            "predictions": {k: round(v, 3) for k, v in self.predictions.items()},
+            "changes": {k: round(v, 2) for k, v in sorted(self.changes.items(), key=lambda kv: -abs(kv[1]))},
+            "ration": {k: round(v, 2) for k, v in self.ration.items()},
+        }
+
+
+def search(problem, seed=0, iterations=300, batch=64, step=2.0, min_step=0.05, patience=25):
+    """
+    Один запуск локального поиска. На каждой итерации batch случайных переносов
+    доли между двумя ингредиентами оцениваются одним пакетом; лучший принимается,
+    если уменьшает loss. Без улучшений шаг уменьшается вдвое; поиск
+    останавливается, когда все кислоты в коридорах с запасом target_margin,
+    шаг стал меньше min_step или patience итераций подряд без улучшения.
+    """
+    rng = np.random.default_rng(seed)
+    movable = np.flatnonzero(problem.hi > problem.lo)
+    x = problem.x0.copy()
+    if seed and len(movable) > 1:
+        # остальные запуски стартуют из случайной точки внутри бюджета
+        x = _random_start(problem, rng, movable)
+
+    current = problem.loss(x[None])[0]
+    stale = 0
+    for _ in range(iterations):
+        i, j = rng.choice(movable, batch), rng.choice(movable, batch)
+        amount = step * rng.uniform(0.25, 1.0, batch)
+        amount = np.minimum(amount, np.minimum(x[i] - problem.lo[i], problem.hi[j] - x[j]))
+        ok = (i != j) & (amount > 1e-9)
+
+        candidates = np.tile(x, (batch, 1))
+        rows = np.arange(batch)
+        candidates[rows, i] -= amount
+        candidates[rows, j] += amount
+        ok &= 0.5 * np.abs(candidates - problem.x0).sum(axis=1) <= problem.max_change + 1e-9
+        if not ok.any():
+            stale += 1
+        else:
+            candidates = candidates[ok]
+            losses = problem.loss(candidates)
+            best = int(np.argmin(losses))
+            if losses[best] < current - 1e-9:
+                x, current, stale = candidates[best], losses[best], 0
+            else:
+                stale += 1
+
+        if stale and stale % 5 == 0:
+            step /= 2
+        _, violation, margin, _ = problem.measure(x[None])
+        if (violation[0] == 0 and margin[0] >= problem.target_margin) or step < min_step or stale >= patience:
+            break
+
+    return problem.candidate(x)
+
+
+def _random_start(problem, rng, movable):
+    x = problem.x0.copy()
+    budget = problem.max_change * rng.uniform(0.2, 0.8)
+    moved = 0.0
+    for _ in range(4 * len(movable)):
+        i, j = rng.choice(movable, 2, replace=False)
+        amount = min(rng.uniform(0, problem.max_change / 4), x[i] - problem.lo[i], problem.hi[j] - x[j],
+                     budget - moved)
+        if amount <= 0:
+            continue
+        trial = x.copy()
+        trial[i] -= amount
+        trial[j] += amount
+        if 0.5 * np.abs(trial - problem.x0).sum() <= budget:
+            x = trial
+            moved = 0.5 * np.abs(x - problem.x0).sum()
+    return x
+
+
+def optimize(base, restarts=8, executor=None, workers=None, seed=0, limit=5, **problem_args):
+    """
+    Подбирает рационы под borders: restarts независимых запусков search
+    (в executor параллельно, как задачи predict_from_file), результаты без
+    повторов сортируются по величине изменения. Возвращает не больше limit
+    RationCandidate: только попавшие во все коридоры, а если таких нет —
+    ближайшие к ним (feasible=False, кислоты вне коридора — в outside).
+    """
+    problem = RationProblem(base, **problem_args)
+
+    own_executor = None
+    if executor is None and workers:
+        executor = own_executor = create_executor(workers)
+    try:
+        jobs = [submit(executor, search, problem, seed + r) for r in range(restarts)]
+        candidates = [job.result() for job in jobs]
+    finally:
+        if own_executor is not None:
+            own_executor.shutdown()
+
+    unique = {}
+    for candidate in sorted(candidates, key=RationCandidate.rank_key):
+        unique.setdefault(tuple(np.round(candidate._x, 1)), candidate)
+    ranked = list(unique.values())
+    # варианты, не решающие задачу, не смешиваются с решениями
+    return ([c for c in ranked if c.feasible] or ranked)[:limit]
+
+
+def outside_borders(result_acids, targets=None):
+    """Кислоты из result_acids отчёта вне целевых коридоров (borders)."""
+    targets = borders if targets is None else targets
+    return [acid for acid, (lo, hi) in targets.items()
+            if acid in result_acids and not lo <= result_acids[acid] <= hi]
+
+
+def add_optimized_rations(report, candidates):
+    """Сохраняет варианты рациона в отчёт (раздел «Варианты рациона» в build_report)."""
+    report["optimized_rations"] = [candidate.to_dict() for candidate in candidates]
+
+
+def optimize_report(report, only_outside=True, **kwargs):
+    """
+    optimize по рациону и нутриентам отчёта (ReportDocument или путь) с записью
+    в отчёт. only_outside=True — только если после анализа (result_acids) есть
+    кислоты вне коридоров; иначе варианты в отчёте очищаются.
+    """
+    from .document import open_report
+    from .infer_model import load_data_from_json
+
+    with open_report(report) as document:
+        if only_outside and not outside_borders(document.get("result_acids") or {}):
+            candidates = []
+        else:
+            candidates = optimize(load_data_from_json(document), **kwargs)
+        add_optimized_rations(document, candidates)
+    return candidates
+
+
+def _benchmark(report=None):
+    import glob
+    import time
+
+    from .infer_model import load_data_from_json
+
+    report = report or sorted(glob.glob("desktop/reports/*.json"))[0]
+    base = load_data_from_json(report)
+
+    t = time.perf_counter()
+    candidates = optimize(base, restarts=4)
+    print(f"поиск: {time.perf_counter() - t:.2f} с")
+    problem = RationProblem(base)
+    print("исходный:", problem.candidate(problem.x0).to_dict()["predictions"])
+    for candidate in candidates:
+        print(candidate.to_dict())
+
+
+if __name__ == "__main__":
+    _benchmark()
@@ -1,9 +1,43 @@
-ensemble = None
+import copy
+
+from shap.models import Model
+
+
+class ModelPredict:
+    """
+    Picklable-обёртка над model.predict для shap.Explainer.
+
+    Каждый explainer держит ссылку на свою модель, поэтому объяснения
+    разных кислот и нутриентов можно считать параллельно в потоках
+    или процессах — без общего глобального состояния.
+    """
+
+    def __init__(self, model):
+        self.model = model
+
+    def __call__(self, X):
+        return self.model.predict(X)
+
+
+def bind_explainer(explainer, model):
+    """
+    Возвращает копию shap.Explainer, привязанную к model через ModelPredict.
+
+    Старые pkl (до отказа от глобального ensemble) хранят ссылку на
+    ensemble_predict; исходный объект не меняется, так как он может
+    лежать в общем кэше model_registry.
+    """
+    if isinstance(explainer.model, Model) and isinstance(explainer.model.inner_model, ModelPredict):
+        if explainer.model.inner_model.model is model:
+            return explainer
+
+    bound = copy.copy(explainer)
+    bound.model = Model(ModelPredict(model))
+    return bound
 
-def set_ensemble(model):
-    global ensemble
-    ensemble = model
 
 def ensemble_predict(X):
-    global ensemble
-    return ensemble.predict(X)
\ No newline at end of file
+    # Оставлено только для распаковки старых pkl, ссылающихся на эту функцию.
+    # Такие explainer'ы нужно привязать к модели через bind_explainer.
+    raise RuntimeError("explainer не привязан к модели: используйте bind_explainer "
+                       "или пересоберите pkl (python -m desktop.data_utils.explainers)")
@@ -0,0 +1,119 @@
+import os
+import threading
+from pathlib import Path
+
+from .numpy_models import load_compiled
+
+
+MODELS_ROOT = "models/classic_pipe"
+
+
+def _joblib():
+    # joblib (вместе с loky и cloudpickle) нужен только при чтении pkl,
+    # а registry импортируется ещё при запуске окна
+    import joblib
+    return joblib
+
+
+class ModelRegistry:
+    """
+    Общий на процесс кэш артефактов из models/classic_pipe/**.
+
+    Ключ записи — абсолютный путь к файлу, рядом хранится (mtime_ns, size):
+    если файл на диске поменялся (переобучили модель), он будет перечитан
+    при следующем обращении. Повторные анализы в одной сессии не читают
+    и не распаковывают pkl заново.
+    """
+
+    def __init__(self, root=MODELS_ROOT):
+        self.root = Path(root)
+        self._entries = {}
+        self._derived = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(path):
+        return str(Path(path).resolve())
+
+    @staticmethod
+    def _stamp(key):
+        st = os.stat(key)
+        return st.st_mtime_ns, st.st_size
+
+    def load(self, path):
+        """Возвращает объект из кэша или загружает его (joblib, .npz — load_compiled)."""
+        key = self._key(path)
+        stamp = self._stamp(key)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                self.hits += 1
+                return entry[1]
+
+            obj = load_compiled(key) if key.endswith(".npz") else _joblib().load(key)
+            self._entries[key] = (stamp, obj)
+            self.misses += 1
+            return obj
+
+    def derive(self, tag, paths, factory):
+        """
+        Кэширует объект, построенный factory(*артефакты) из нескольких файлов
+        (например, explainer поверх конкретного ансамбля). Пересобирается,
+        если изменился любой из исходных файлов.
+        """
+        keys = tuple(self._key(p) for p in paths)
+        stamp = tuple(self._stamp(k) for k in keys)
+
+        with self._lock:
+            entry = self._derived.get((tag, keys))
+            if entry is not None and entry[0] == stamp:
+                self.hits += 1
+                return entry[1]
+
+            obj = factory(*(self.load(k) for k in keys))
+            self._derived[(tag, keys)] = (stamp, obj)
+            return obj
+
+    def dump(self, obj, path):
+        """Сохраняет артефакт на диск и сразу кладёт его в кэш (для скриптов обучения)."""
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        _joblib().dump(obj, path)
+
+        key = self._key(path)
+        with self._lock:
+            self._entries[key] = (self._stamp(key), obj)
+
+    def preload(self, root=None):
+        """Загружает все *.pkl из каталога моделей; возвращает число артефактов."""
+        root = Path(root) if root is not None else self.root
+        paths = sorted(root.glob("**/*.pkl"))
+        for path in paths:
+            self.load(path)
+        return len(paths)
+
+    def invalidate(self, path):
+        key = self._key(path)
+        with self._lock:
+            self._entries.pop(key, None)
+            for derived_key in [k for k in self._derived if key in k[1]]:
+                del self._derived[derived_key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._derived.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __contains__(self, path):
+        return self._key(path) in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Глобальный экземпляр
+model_registry = ModelRegistry()
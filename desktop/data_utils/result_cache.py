@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+from platformdirs import user_cache_dir
+
+from .document import atomic_write_json
+from .numpy_models import COMPILED_ROOT, file_digest
+from .registry import MODELS_ROOT
+
+
+APP_NAME = "AgroTech"
+
+# меняется вместе с составом и смыслом сохраняемых полей
+CACHE_FORMAT = 1
+
+# поля отчёта, которые заполняет predict_from_file
+RESULT_FIELDS = ("result_acids", "importance_acid", "importance_nutrient", "shap_values", "composites")
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+_bundle_versions = {}
+_bundle_lock = threading.Lock()
+
+
+def bundle_version(roots=(MODELS_ROOT, COMPILED_ROOT)):
+    """
+    Версия набора моделей: sha256 по содержимому всех файлов в roots.
+    Пересчитывается, только если у какого-то файла поменялись mtime или размер.
+    """
+    files = sorted(p for root in roots for p in Path(root).glob("**/*") if p.is_file())
+    stamp = tuple((str(p), p.stat().st_mtime_ns, p.stat().st_size) for p in files)
+
+    with _bundle_lock:
+        version = _bundle_versions.get(stamp)
+    if version is None:
+        h = hashlib.sha256()
+        for path in files:
+            h.update(path.as_posix().encode("utf-8"))
+            h.update(file_digest(path).encode("ascii"))
+        version = h.hexdigest()
+        with _bundle_lock:
+            _bundle_versions[stamp] = version
+    return version
+
+
+def row_key(data, version):
+    """
+    Ключ анализа: строка признаков после clear_data (имена колонок и значения
+    float64) плюс версия моделей. Не зависит от имени, комплекса и периода отчёта.
+    """
+    h = hashlib.sha256()
+    h.update(f"{CACHE_FORMAT}:{version}:".encode("ascii"))
+    h.update(json.dumps([str(c) for c in data.columns], ensure_ascii=False).encode("utf-8"))
+    h.update(np.ascontiguousarray(data.to_numpy(dtype=np.float64), dtype="<f8").tobytes())
+    return h.hexdigest()
+
+
+class ResultCache:
+    """
+    Дисковый кэш результатов анализа по содержимому рациона.
+
+    Запись — JSON с полями RESULT_FIELDS, имя файла — row_key. Повторный
+    анализ того же рациона (например, после правки только названия отчёта)
+    читает один файл вместо 18 задач predict+SHAP. При превышении max_bytes
+    удаляются записи, к которым дольше всего не обращались (по mtime).
+    """
+
+    def __init__(self, root=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = Path(root) if root is not None else Path(user_cache_dir(APP_NAME, appauthor=False)) / "results"
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return self.root / key[:2] / f"{key}.json"
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        atomic_write_json(self._path(key), value)
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        entries = []
+        for path in self.root.glob("*/*.json"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime_ns, st.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+
+    def size(self):
+        return sum(p.stat().st_size for p in self.root.glob("*/*.json"))
+
+    def clear(self):
+        for path in self.root.glob("*/*.json"):
+            path.unlink(missing_ok=True)
+
+
+# Глобальный экземпляр
+result_cache = ResultCache()
@@ -0,0 +1,160 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from training import uniq_changed_ration, uniq_step
+
+from .config import acids, for_dropping, medians_of_data
+from .numpy_models import resolve_model_path
+from .registry import model_registry
+
+
+SCHEMA = list(uniq_changed_ration) + list(uniq_step)
+
+
+def single(columns, deltas):
+    """Каждая колонка из columns сдвигается на каждое значение из deltas."""
+    return [{column: delta} for column in columns for delta in deltas]
+
+
+def pairwise(columns, amount, targets=None):
+    """Перенос amount %СВ: +amount к одной колонке и -amount к другой, для всех упорядоченных пар."""
+    targets = columns if targets is None else targets
+    return [{add: amount, remove: -amount}
+            for add in columns for remove in targets if add != remove]
+
+
+def grid(axes):
+    """Полный перебор: axes = {колонка: [сдвиги]}."""
+    names = list(axes)
+    return [dict(zip(names, combo)) for combo in itertools.product(*axes.values())]
+
+
+def describe(perturbation):
+    return ", ".join(f"{delta:+g} {column}" for column, delta in perturbation.items() if delta)
+
+
+class ScenarioResult:
+    """Предсказания кислот по сценариям и их отличие от исходного рациона."""
+
+    def __init__(self, perturbations, targets, base, predictions):
+        self.perturbations = perturbations
+        self.targets = list(targets)
+        self.base = dict(zip(self.targets, base))
+        self.predictions = predictions
+        self.deltas = predictions - base
+
+    def to_frame(self):
+        frame = pd.DataFrame(self.deltas, columns=self.targets)
+        frame.insert(0, "сценарий", [describe(p) for p in self.perturbations])
+        return frame
+
+    def top(self, target, n=10, ascending=False):
+        """n сценариев с наибольшим (ascending=True — наименьшим) изменением target."""
+        return self.to_frame().sort_values(target, ascending=ascending).head(n)
+
+    def __len__(self):
+        return len(self.perturbations)
+
+
+class ScenarioEngine:
+    """
+    Что будет, если поменять рацион: сценарии (сдвиги колонок схемы
+    uniq_changed_ration + uniq_step) собираются в одну матрицу вместе с
+    исходной строкой и проходят через каждый ансамбль кислот одним вызовом
+    predict. Предобработка — та же, что в clear_data, только на NumPy.
+    """
+
+    def __init__(self, model_path="models/classic_pipe/acids", targets=acids):
+        self.model_path = model_path
+        self.targets = list(targets)
+        self._index = {column: i for i, column in enumerate(SCHEMA)}
+        self._keep = np.array([i for i, column in enumerate(SCHEMA) if column not in for_dropping])
+        self._medians = np.array([medians_of_data.get(SCHEMA[i], np.nan) for i in self._keep], dtype=float)
+        self._ration = len(uniq_changed_ration)
+
+    def models(self):
+        return [model_registry.load(resolve_model_path(f"{self.model_path}/{target}_ensemble.pkl"))
+                for target in self.targets]
+
+    def base_vector(self, base):
+        """Строка в схеме SCHEMA из DataFrame (extract_to_row) или словаря {колонка: значение}."""
+        if isinstance(base, pd.DataFrame):
+            base = base.iloc[0].to_dict()
+        return np.array([base.get(column, 0.0) for column in SCHEMA], dtype=float)
+
+    def matrix(self, base, perturbations, clip=True):
+        """
+        Матрица признаков моделей: первая строка — исходный рацион, далее по
+        строке на сценарий. clip=True не даёт доле ингредиента уйти ниже нуля.
+        """
+        rows, cols, values = [], [], []
+        for row, perturbation in enumerate(perturbations, start=1):
+            for column, delta in perturbation.items():
+                if column not in self._index or column in for_dropping:
+                    raise KeyError(f"колонка {column!r} не используется моделями")
+                rows.append(row)
+                cols.append(self._index[column])
+                values.append(delta)
+
+        full = np.tile(self.base_vector(base), (len(perturbations) + 1, 1))
+        np.add.at(full, (np.array(rows, dtype=int), np.array(cols, dtype=int)), np.array(values, dtype=float))
+        return self.features(full, clip)
+
+    def features(self, full, clip=True):
+        """Строки в схеме SCHEMA -> признаки моделей кислот (как clear_data)."""
+        if clip:
+            full = full.copy()
+            np.maximum(full[:, :self._ration], 0.0, out=full[:, :self._ration])
+
+        X = full[:, self._keep]
+        return np.where(np.isnan(X), self._medians, X)
+
+    def predict(self, full, clip=True):
+        """Предсказания всех целей для строк в схеме SCHEMA, shape (n, len(targets))."""
+        X = self.features(np.atleast_2d(full), clip)
+        return np.column_stack([model.predict(X) for model in self.models()])
+
+    def evaluate(self, base, perturbations, clip=True):
+        perturbations = list(perturbations)
+        X = self.matrix(base, perturbations, clip)
+        predictions = np.column_stack([model.predict(X) for model in self.models()])
+        return ScenarioResult(perturbations, self.targets, predictions[0], predictions[1:])
+
+    def evaluate_report(self, report, perturbations, clip=True):
+        """То же для отчёта (ReportDocument или путь к JSON)."""
+        from .infer_model import load_data_from_json
+
+        return self.evaluate(load_data_from_json(report), perturbations, clip)
+
+
+def _benchmark(report=None, repeat=5):
+    import glob
+    import time
+
+    report = report or sorted(glob.glob("desktop/reports/*.json"))[0]
+    engine = ScenarioEngine()
+
+    from .infer_model import load_data_from_json
+    base = load_data_from_json(report)
+    engine.models()
+
+    cases = {
+        "одиночные": single(uniq_changed_ration, np.linspace(-5, 5, 21)),
+        "пары": pairwise(uniq_changed_ration, 2.0),
+        "сетка": grid({"рапс": np.linspace(-5, 5, 41), "кукуруза": np.linspace(-10, 10, 41),
+                       "соя": np.linspace(-3, 3, 7)}),
+    }
+    for name, perturbations in cases.items():
+        t = time.perf_counter()
+        for _ in range(repeat):
+            result = engine.evaluate(base, perturbations)
+        ms = (time.perf_counter() - t) / repeat * 1000
+        print(f"{name:<10}{len(result):>7} сценариев {ms:8.1f} мс")
+
+    print(result.top("Олеиновая", 5).to_string(index=False))
+
+
+if __name__ == "__main__":
+    _benchmark()
@@ -0,0 +1,30 @@
+import time
+
+from training import uniq_step
+
+from .benchmark import StageTimer, synthetic_rations
+from .document import ReportDocument
+from .extract_data import tables_to_report
+from .infer_model import load_data_from_json
+
+
+def test_stage_timer_summary():
+    timer = StageTimer()
+    for _ in range(3):
+        with timer.stage("sleep"):
+            time.sleep(0.01)
+
+    summary = timer.summary()["sleep"]
+    assert summary["n"] == 3
+    assert 5 <= summary["p50_ms"] <= summary["p95_ms"] <= summary["max_ms"]
+
+
+def test_synthetic_report_matches_window_format(tmp_path):
+    name, ration, step_table = next(synthetic_rations(1, seed=1))
+    data = tables_to_report(ration, step_table, name)
+
+    assert [row["Нутриент"] for row in data["nutrients_rows"]] == list(uniq_step)
+    assert abs(sum(float(row["%СВ"].replace(",", ".")) for row in data["ration_rows"]) - 100) < 0.01
+
+    row = load_data_from_json(ReportDocument(tmp_path / "r.json", data))
+    assert len(row) == 1
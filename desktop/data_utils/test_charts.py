@@ -0,0 +1,103 @@
+import copy
+import json
+import os
+
+import numpy as np
+import pytest
+import shap
+
+from desktop.data_utils.charts import ChartRenderQueue, add_composite, add_waterfall, export_panels
+from desktop.data_utils.document import ReportDocument
+from desktop.data_utils.graphics_store import THUMB, GraphicsStore, is_chart_id
+
+
+@pytest.fixture
+def report(tmp_path):
+    report = ReportDocument(tmp_path / "reports" / "Тест_2025.json", {"meta": {}})
+
+    for key, shift in (("Олеиновая", 0.5), ("Стеариновая", -0.3)):
+        explanation = shap.Explanation(values=np.array([shift, -0.2, 0.1]),
+                                       base_values=30.0,
+                                       data=np.array([12.0, 3.5, 0.0]),
+                                       feature_names=["кукуруза", "СП (%)", "рапс"])
+        add_waterfall(report, key, explanation, key)
+    add_composite(report, "uni", ["Олеиновая", "Стеариновая"])
+    return report
+
+
+@pytest.fixture
+def store(tmp_path):
+    return GraphicsStore(tmp_path / "graphics")
+
+
+def test_vectors_are_persisted_without_rendering(report, store):
+    restored = json.loads(json.dumps(report.data))
+
+    assert restored["shap_values"]["Олеиновая"]["values"] == [0.5, -0.2, 0.1]
+    assert restored["composites"] == {"uni": ["Олеиновая", "Стеариновая"]}
+    assert list(restored["graphics"]) == ["uni"]
+    assert is_chart_id(restored["graphics"]["uni"])
+    assert store.usage() == (0, 0)
+
+
+def test_render_now_draws_queued_report(report, store):
+    charts = ChartRenderQueue(store=store)
+    charts.submit(report)
+    charts.render_now(report, timeout=60)
+
+    chart = report["graphics"]["uni"]
+    assert open(store.path(chart), "rb").read(4) == b"\x89PNG"
+    assert store.path(chart, THUMB).exists()
+    # отдельные панели без запроса не выгружаются
+    assert list(store.files()) == [chart]
+    assert charts.pending() == 0
+
+
+def test_panels_are_exported_on_request(report, store):
+    export_panels(report, ["Стеариновая"])
+    ChartRenderQueue(dpi=50, store=store).render_now(report, timeout=60)
+
+    assert sorted(store.files()) == sorted(report["graphics"].values())
+    assert len(store.files()) == 2
+
+
+def test_identical_charts_are_stored_once(report, store, tmp_path):
+    charts = ChartRenderQueue(dpi=50, store=store)
+    charts.render_now(report, timeout=60)
+    path = store.path(report["graphics"]["uni"])
+    mtime = path.stat().st_mtime_ns
+
+    other = ReportDocument(tmp_path / "reports" / "Другой.json", copy.deepcopy(report.data))
+    charts.submit(other, force=True)
+    charts.render_now(other, timeout=60)
+
+    assert other["graphics"] == report["graphics"]
+    assert path.stat().st_mtime_ns == mtime
+    assert len(store.files()) == 1
+
+
+def test_gc_drops_orphans(report, store, tmp_path):
+    ChartRenderQueue(dpi=50, store=store).render_now(report, timeout=60)
+    export_panels(report, ["Олеиновая"])
+    ChartRenderQueue(dpi=50, store=store).render_now(report, timeout=60)
+    panel = report["graphics"].pop("Олеиновая")
+
+    removed, freed = store.gc(set(report["graphics"].values()))
+
+    assert removed == 1 and freed > 0
+    assert list(store.files()) == [report["graphics"]["uni"]]
+    assert not store.path(panel).exists()
+
+
+def test_pins_expire(store):
+    chart = "ab" * 16
+    store.pin("old", [chart, "не ID"])
+    store.pin("fresh", [chart])
+    old = store.pins_dir / "old.json"
+    os.utime(old, (old.stat().st_atime, old.stat().st_mtime - 3600))
+
+    assert store.pinned(max_age=60, dry_run=True) == {chart}
+    assert old.exists()
+    assert store.pinned(max_age=60) == {chart}
+    assert not old.exists()
+    assert [p.name for p in store.pins_dir.iterdir()] == ["fresh.json"]
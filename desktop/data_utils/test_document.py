@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from desktop.data_utils.document import _UMASK, ReportDocument, atomic_write_json, open_report
+
+
+def test_atomic_write_leaves_no_temp_files(tmp_path):
+    path = tmp_path / "report.json"
+    atomic_write_json(path, {"meta": {"name": "Тест"}})
+    atomic_write_json(path, {"meta": {"name": "Тест 2"}})
+
+    assert json.loads(path.read_text(encoding="utf-8")) == {"meta": {"name": "Тест 2"}}
+    assert [p.name for p in tmp_path.iterdir()] == ["report.json"]
+
+
+def test_atomic_write_keeps_file_mode(tmp_path):
+    path = tmp_path / "report.json"
+    atomic_write_json(path, {"ok": True})
+    assert path.stat().st_mode & 0o777 == 0o666 & ~_UMASK
+
+    path.chmod(0o640)
+    atomic_write_json(path, {"ok": False})
+    assert path.stat().st_mode & 0o777 == 0o640
+
+
+def test_failed_write_keeps_previous_file(tmp_path):
+    path = tmp_path / "report.json"
+    atomic_write_json(path, {"ok": True})
+
+    with pytest.raises(TypeError):
+        atomic_write_json(path, {"bad": object()})
+
+    assert json.loads(path.read_text(encoding="utf-8")) == {"ok": True}
+    assert [p.name for p in tmp_path.iterdir()] == ["report.json"]
+
+
+def test_open_report_saves_path_once(tmp_path, monkeypatch):
+    path = tmp_path / "Тест_2025.json"
+    path.write_text(json.dumps({"ration_rows": []}), encoding="utf-8")
+
+    saves = []
+    monkeypatch.setattr(ReportDocument, "save", lambda self, path=None: saves.append(self.path))
+
+    with open_report(path) as report:
+        report.set_graphic("uni", tmp_path / "uni.png")
+        assert report.name == "Тест_2025"
+    assert saves == [path]
+
+
+def test_open_report_does_not_save_document(tmp_path):
+    report = ReportDocument(tmp_path / "new.json", {"meta": {}})
+
+    with open_report(report) as same:
+        same["result_acids"] = {"Олеиновая": 30.0}
+
+    assert same is report
+    assert not report.path.exists()
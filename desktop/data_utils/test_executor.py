@@ -0,0 +1,27 @@
+import pytest
+
+from desktop.data_utils.executor import submit
+
+
+def _divide(a, b):
+    return a / b
+
+
+def test_submit_without_executor_runs_inline():
+    future = submit(None, _divide, 6, 3)
+    assert future.done()
+    assert future.result() == 2
+
+
+def test_submit_without_executor_keeps_exception():
+    future = submit(None, _divide, 1, 0)
+    with pytest.raises(ZeroDivisionError):
+        future.result()
+
+
+def test_submit_to_thread_pool():
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        futures = [submit(pool, _divide, i, 2) for i in range(4)]
+        assert [f.result() for f in futures] == [0, 0.5, 1, 1.5]
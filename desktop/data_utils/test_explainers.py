@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+from catboost import CatBoostRegressor
+from sklearn.ensemble import RandomForestRegressor, VotingRegressor
+from sklearn.linear_model import Ridge
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.svm import SVR
+
+from desktop.data_utils.explainers import DEFAULT_FIDELITY, EnsembleExplainer, _LinearPart, fidelity_params, summarize_background
+
+
+@pytest.fixture(scope="module")
+def ensemble_and_data():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(60, 6)) * [1, 2, 5, 0.5, 1, 3] + [0, 10, 40, 1, 0, 5]
+    y = X[:, 0] * 2 - X[:, 2] * 0.1 + np.sin(X[:, 1]) + rng.normal(scale=0.1, size=60)
+
+    models = {
+        "catboost": CatBoostRegressor(iterations=20, max_depth=3, random_seed=42, verbose=0, allow_writing_files=False),
+        "random_forest": RandomForestRegressor(n_estimators=10, max_depth=3, random_state=42),
+        "ridge": Ridge(alpha=0.5),
+        "svr": SVR(C=1, epsilon=0.05),
+    }
+    pipelines = [(name, Pipeline([("scaler", StandardScaler()), (name, m)])) for name, m in models.items()]
+    ensemble = VotingRegressor(pipelines, weights=[0.273, 0.259, 0.21, 0.258]).fit(X, y)
+    return ensemble, X
+
+
+def test_shap_values_sum_to_prediction(ensemble_and_data):
+    ensemble, X = ensemble_and_data
+    explainer = EnsembleExplainer(ensemble, X, feature_names=list("abcdef"))
+
+    explanation = explainer(X[:5])
+    reconstructed = explanation.values.sum(axis=1) + explanation.base_values
+
+    assert explanation.values.shape == (5, 6)
+    assert np.allclose(reconstructed, ensemble.predict(X[:5]), atol=1e-3)
+
+
+def test_linear_part_is_exact(ensemble_and_data):
+    ensemble, X = ensemble_and_data
+    ridge = ensemble.named_estimators_["ridge"]
+    part = _LinearPart(ridge, X)
+
+    values = part.shap_values(X[:3])
+    assert np.allclose(values.sum(axis=1) + part.base_value, ridge.predict(X[:3]))
+
+
+def test_summarized_background_keeps_additivity(ensemble_and_data):
+    ensemble, X = ensemble_and_data
+    rows, weights = summarize_background(X, 8)
+
+    assert rows.shape == (8, 6)
+    # фон — реальные строки обучения, веса — доли кластеров
+    assert all((X == row).all(axis=1).any() for row in rows)
+    assert np.isclose(weights.sum(), 1)
+
+    explainer = EnsembleExplainer(ensemble, X).summarized(8, svr_nsamples=100)
+    explanation = explainer(X[:5])
+    reconstructed = explanation.values.sum(axis=1) + explanation.base_values
+    assert np.allclose(reconstructed, ensemble.predict(X[:5]), atol=1e-3)
+
+
+def test_unknown_fidelity():
+    with pytest.raises(ValueError):
+        fidelity_params("ultra")
+
+
+def test_default_fidelity_is_exact():
+    # сжатый фон меняет важности в отчётах: по умолчанию — полный фон из pkl
+    assert DEFAULT_FIDELITY == "exact"
+    assert fidelity_params(DEFAULT_FIDELITY)["background"] is None
+
+
+def test_pickle_drops_inner_explainers(ensemble_and_data):
+    import pickle
+
+    ensemble, X = ensemble_and_data
+    explainer = EnsembleExplainer(ensemble, X)
+    before = explainer.shap_values(X[:1])
+
+    restored = pickle.loads(pickle.dumps(explainer))
+    assert restored._parts is None
+    # деревья и Ridge детерминированы, SVR даёт небольшую выборочную погрешность
+    assert np.allclose(restored.shap_values(X[:1]), before, atol=0.1)
+
+
+def test_bind_keeps_cached_explainer(ensemble_and_data):
+    import shap
+
+    from desktop.data_utils.predictor import ModelPredict, bind_explainer
+
+    ensemble, X = ensemble_and_data
+    members = list(ensemble.named_estimators_.values())
+    legacy = shap.Explainer(ModelPredict(members[0]), masker=X[:10])
+
+    for member in members:
+        explanation = bind_explainer(legacy, member)(X[:1])
+        reconstructed = explanation.values.sum() + explanation.base_values[0]
+        assert np.isclose(reconstructed, member.predict(X[:1])[0])
+    assert legacy.model.inner_model.model is members[0]
+
+
+def test_shared_explainer_runs_concurrently(ensemble_and_data):
+    from concurrent.futures import ThreadPoolExecutor
+
+    ensemble, X = ensemble_and_data
+    explainer = EnsembleExplainer(ensemble, X).summarized(8, svr_nsamples=100)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda i: explainer(X[i:i + 1]), range(8)))
+
+    reconstructed = [e.values.sum() + e.base_values[0] for e in results]
+    assert np.allclose(reconstructed, ensemble.predict(X[:8]), atol=1e-3)
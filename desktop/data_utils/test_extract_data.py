@@ -0,0 +1,42 @@
+from desktop.data_utils import extract_data
+from desktop.data_utils.extract_data import PdfTablesScanner, parse_pdf_for_tables, parse_ration_block, parse_step_block
+
+
+PAGES = [
+    "NDS Professional Pag. 1\nРецепт: Д1\nЛактирующие\nИнгредиенты ₽/т\n"
+    "Кукуруза силос 35,0 20,5 7,2 40,1 30,2 120\n",
+    "Соя шрот 89,0 3,1 2,8 6,0 11,8 45\nОбщие значения 100\n"
+    "Сводный анализ: Лактирующая корова\nНутриент Единица СВ\nСП % 16,2\n",
+    "Крахмал % 24,5\nСводка\n",
+    "Экономический отчёт\n" + "строка\n" * 1000,
+]
+
+
+def test_scanner_stops_after_both_tables():
+    scanner = PdfTablesScanner()
+    read = 0
+    for page in PAGES:
+        read += 1
+        if scanner.feed(page):
+            break
+
+    assert read == 3
+    assert parse_ration_block(scanner.ration_block) == [["Кукуруза силос", 30.2], ["Соя шрот", 11.8]]
+    assert parse_step_block(scanner.step_block) == {"СП": 16.2, "Крахмал": 24.5}
+
+
+def test_pdf_pages_after_tables_are_not_read(monkeypatch):
+    path = "desktop/data_utils/test_data/Д0 Высокое 25.02.25_ЭНАЛБ.pdf"
+    ration, step_table = parse_pdf_for_tables(path)
+
+    pages = list(extract_data.iter_pdf_pages(path))
+
+    def long_export(pdf_path):
+        yield from pages
+        # ошибка чтения дальше таблиц превратила бы результат в None
+        raise RuntimeError("страницы после обеих таблиц не должны читаться")
+
+    monkeypatch.setattr(extract_data, "iter_pdf_pages", long_export)
+    assert parse_pdf_for_tables(path) == (ration, step_table)
+    assert len(ration) == 10
+    assert "СП" in step_table
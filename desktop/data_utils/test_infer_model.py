@@ -0,0 +1,69 @@
+import copy
+import glob
+import json
+from pathlib import Path
+
+import pytest
+
+from desktop.data_utils import infer_model
+from desktop.data_utils.document import ReportDocument
+from desktop.data_utils.graphics_store import chart_id, is_chart_id
+
+
+def _bundled_report(index=0):
+    source = sorted(glob.glob("desktop/reports/*.json"))[index]
+    with open(source, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_reanalysis_replaces_legacy_graphics_paths(tmp_path):
+    data = _bundled_report()
+    assert any(not is_chart_id(value) for value in data["graphics"].values())
+
+    report = ReportDocument(tmp_path / "report.json", copy.deepcopy(data))
+    infer_model.predict_from_file(report, charts=None, jobs=None, memo=None)
+
+    assert set(report["graphics"]) == {"uni", "uni_nutri"}
+    assert all(is_chart_id(value) for value in report["graphics"].values())
+    assert set(report["shap_values"]) == {m for members in report["composites"].values() for m in members}
+
+
+def _assert_same_top(top, other, tol=0.05):
+    """
+    Топ признаков совпадает с точностью до выборочной погрешности SHAP у SVR:
+    общие признаки — с допуском tol, остальные могут смениться только на
+    границе топа (вклад не сильнее самого слабого того же знака в other).
+    """
+    for feature, value in top.items():
+        if feature in other:
+            assert value == pytest.approx(other[feature], abs=tol)
+        else:
+            weakest = min(abs(v) for v in other.values() if (v >= 0) == (value >= 0))
+            assert abs(value) <= weakest + tol
+
+
+def test_batch_matches_single_reports(tmp_path):
+    paths = []
+    for i, source in enumerate(sorted(glob.glob("desktop/reports/*.json"))):
+        path = tmp_path / f"{i}.json"
+        path.write_text(Path(source).read_text(encoding="utf-8"), encoding="utf-8")
+        paths.append(path)
+
+    batch = infer_model.predict_from_files(paths, charts=None)
+
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            batched = json.load(f)
+        # графики пересобраны по новым SHAP-векторам, а не остались от прошлого анализа
+        shap_values = batched["shap_values"]
+        assert set(batched["graphics"]) == set(batched["composites"])
+        for key, members in batched["composites"].items():
+            assert batched["graphics"][key] == chart_id("composite", [shap_values[m] for m in members])
+        single = ReportDocument(tmp_path / "single.json", copy.deepcopy(batched))
+        result = infer_model.predict_from_file(single, charts=None, jobs=None, memo=None)
+
+        assert batch[str(path)] == pytest.approx({k: float(v[0]) for k, v in result.items()})
+        for field in ("importance_acid", "importance_nutrient"):
+            for target, top in single[field].items():
+                _assert_same_top(batched[field][target], top)
+                _assert_same_top(top, batched[field][target])
@@ -0,0 +1,123 @@
+import threading
+
+import pytest
+
+from . import inference_server
+from .inference_server import InferenceClient, InferenceError, InferenceServer, InferenceUnavailable
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    calls = []
+
+    def analyze_report(path, data, md_path=None, cache=False, workers=None, progress=None):
+        calls.append(path)
+        progress("analysis")
+        if data.get("slow"):
+            threading.Event().wait(0.3)
+        if data.get("broken"):
+            raise ValueError("плохой рацион")
+        progress("report")
+        return {"Олеиновая": 1.5}, {"prepare": 1.0}
+
+    monkeypatch.setattr(inference_server, "analyze_report", analyze_report)
+    monkeypatch.setattr(inference_server, "render_report", lambda path: [f"{path}.png"])
+    monkeypatch.setattr(inference_server, "optimize_rations", lambda path, md_path=None, workers=None: md_path)
+
+    server = InferenceServer(str(tmp_path / "s.sock"), b"test-key", warm=False)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    client = InferenceClient(server.address, b"test-key", start=False)
+    for _ in range(100):
+        try:
+            client.ping()
+            break
+        except InferenceUnavailable:
+            threading.Event().wait(0.05)
+
+    server.calls = calls
+    server.client = client
+    server.thread = thread
+    yield server
+
+    client.shutdown()
+    thread.join(5)
+    assert not thread.is_alive()
+
+
+def test_analyze_streams_progress(server, tmp_path):
+    stages = []
+    result, timings = server.client.analyze(tmp_path / "r.json", {"meta": {}}, progress=stages.append)
+
+    assert result == {"Олеиновая": 1.5}
+    assert timings == {"prepare": 1.0}
+    assert stages == ["analysis", "report"]
+    assert server.calls == [str((tmp_path / "r.json").resolve())]
+
+
+def test_error_is_raised_in_client(server, tmp_path):
+    with pytest.raises(InferenceError, match="плохой рацион"):
+        server.client.analyze(tmp_path / "r.json", {"broken": True})
+    # сервер продолжает работать после ошибки
+    assert server.client.ping()["ready"]
+
+
+def test_render_runs_in_server(server, tmp_path):
+    assert server.client.render(tmp_path / "r.json") == [f"{(tmp_path / 'r.json').resolve()}.png"]
+
+
+def test_optimize_runs_in_server(server, tmp_path):
+    assert server.client.optimize(tmp_path / "r.json", tmp_path / "r.md") == str((tmp_path / "r.md").resolve())
+
+
+@pytest.mark.parametrize("data", [
+    {"result_acids": {"Олеиновая": 25.0}},
+    {"result_acids": {"Олеиновая": 99.0}, "optimized_rations": []},
+])
+def test_optimize_rations_skips_finished_reports(tmp_path, data):
+    import json
+
+    path = tmp_path / "r.json"
+    path.write_text(json.dumps(data), encoding="utf-8")
+    # кислоты в коридорах или варианты уже посчитаны: отчёт не меняется
+    assert inference_server.optimize_rations(path) is False
+    assert json.loads(path.read_text(encoding="utf-8")) == data
+
+
+def test_client_disconnect_mid_analysis(server, tmp_path, monkeypatch):
+    from multiprocessing.connection import Client
+
+    errors = []
+    monkeypatch.setattr(threading, "excepthook", errors.append)
+    conn = Client(server.address, authkey=b"test-key")
+    conn.send({"op": "analyze", "path": str(tmp_path / "r.json"), "data": {"slow": True}})
+    assert conn.recv() == {"event": "progress", "stage": "analysis"}
+    conn.close()
+
+    threading.Event().wait(0.5)
+    # анализ доведён до конца, второй ответ в закрытое соединение не отправлялся
+    assert server.calls == [str(tmp_path / "r.json")]
+    assert errors == []
+    assert server.client.ping()["ready"]
+
+
+def test_outdated_server_gives_way(server, tmp_path):
+    assert server.client.ping()["version"] == server.version
+
+    updated = InferenceClient(server.address, b"test-key", start=False, version="обновлённый")
+    # старый процесс освобождает адрес, а запустить новый клиенту без start нечем
+    with pytest.raises(InferenceUnavailable):
+        updated.ping()
+    server.thread.join(5)
+    assert not server.thread.is_alive()
+
+
+def test_wrong_key_is_rejected(server):
+    with pytest.raises(InferenceUnavailable):
+        InferenceClient(server.address, b"other-key", start=False).ping()
+    assert server.client.ping()["event"] == "pong"
+
+
+def test_missing_server_without_start(tmp_path):
+    with pytest.raises(InferenceUnavailable):
+        InferenceClient(str(tmp_path / "none.sock"), b"k", start=False).ping()
@@ -0,0 +1,50 @@
+import pandas as pd
+
+from desktop.data_utils.jobs import Job, JobCache, JobGraph
+
+
+calls = []
+
+
+def total(values, name):
+    calls.append(name)
+    return float(values.sum())
+
+
+def graph():
+    jobs = [Job("acid", ("ration", "nutrients"), total, "acid"),
+            Job("nutri", ("ration",), total, "nutri")]
+    return JobGraph({"ration": ["кукуруза", "рапс"], "nutrients": ["СП (%)"]}, jobs, version="v1")
+
+
+def row(**changes):
+    values = {"кукуруза": 40.0, "СП (%)": 16.0, "рапс": 5.0}
+    values.update(changes)
+    return pd.DataFrame([values])
+
+
+def test_only_dependent_jobs_are_recomputed():
+    cache = JobCache()
+    calls.clear()
+
+    assert graph().run(row(), cache=cache) == {"acid": 61.0, "nutri": 45.0}
+
+    g = graph()
+    assert g.run(row(**{"СП (%)": 17.0}), cache=cache) == {"acid": 62.0, "nutri": 45.0}
+    assert (g.recomputed, g.reused) == (["acid"], ["nutri"])
+
+    g = graph()
+    g.run(row(рапс=6.0), cache=cache)
+    assert g.recomputed == ["acid", "nutri"]
+    assert calls == ["acid", "nutri", "acid", "acid", "nutri"]
+
+
+def test_model_version_invalidates_and_lru_is_bounded():
+    cache = JobCache(max_entries=2)
+    graph().run(row(), cache=cache)
+
+    g = graph()
+    g.version = "v2"
+    g.run(row(), cache=cache)
+    assert g.reused == []
+    assert len(cache) == 2
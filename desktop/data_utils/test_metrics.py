@@ -0,0 +1,78 @@
+import time
+
+from . import metrics
+from .jobs import Job, JobGraph
+from .metrics import collect, report_timings, span, timed
+
+import pandas as pd
+
+
+class _Histogram:
+    def __init__(self):
+        self.observed = []
+
+    def labels(self, stage):
+        histogram = self
+
+        class _Child:
+            def observe(self, seconds):
+                histogram.observed.append(stage)
+
+        return _Child()
+
+
+def _slow(values, pause):
+    with span("predict"):
+        time.sleep(pause)
+    return float(values.sum())
+
+
+def test_span_writes_report_timings():
+    report = {"meta": {"name": "Тест"}}
+    with span("prepare", report_timings(report)):
+        time.sleep(0.01)
+
+    assert report["meta"]["name"] == "Тест"
+    assert report["meta"]["timings"]["prepare"] >= 5
+
+
+def test_collect_sums_nested_spans():
+    parse = timed("parse")(lambda: time.sleep(0.005))
+    with collect() as timings:
+        parse()
+        parse()
+    assert set(timings) == {"parse"}
+    assert timings["parse"] >= 10
+
+
+def test_job_graph_reports_job_spans(monkeypatch):
+    histogram = _Histogram()
+    monkeypatch.setattr(metrics, "_histogram", histogram)
+
+    data = pd.DataFrame([[1.0, 2.0]], columns=["a", "b"])
+    graph = JobGraph({"all": ["a", "b"]}, [Job("x", ("all",), _slow, 0.01), Job("y", ("all",), _slow, 0.01)])
+    results = graph.run(data)
+
+    assert results == {"x": 3.0, "y": 3.0}
+    assert graph.timings["predict"] >= 20
+    # наблюдения пишет граф, по одному на задачу, без повторов из самих задач
+    assert histogram.observed == ["predict", "predict"]
+
+
+def test_metrics_port_from_env(monkeypatch):
+    ports = []
+    monkeypatch.setattr(metrics, "start_metrics_server", lambda port: ports.append(port) or True)
+
+    monkeypatch.delenv(metrics.PORT_ENV, raising=False)
+    assert not metrics.start_metrics_from_env()
+    monkeypatch.setenv(metrics.PORT_ENV, "9500")
+    assert metrics.start_metrics_from_env()
+    assert ports == [9500]
+
+
+def test_record_timings_from_other_process(monkeypatch):
+    histogram = _Histogram()
+    monkeypatch.setattr(metrics, "_histogram", histogram)
+
+    metrics.record_timings({"parse": 120.0, "predict": 5.0}, ("parse",))
+    assert histogram.observed == ["parse"]
@@ -0,0 +1,84 @@
+from desktop.data_utils.normalization_cache import ADMIN, AUTO, NormalizationCache
+
+
+def test_persists_between_instances(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    cache = NormalizationCache(path)
+    cache.put_many({"Сено луговое": "сено", "Силос": "кукуруза"})
+    cache.put("Жмых", "соя", source=ADMIN)
+    cache.close()
+
+    reopened = NormalizationCache(path)
+    assert reopened.get_many(["Сено луговое", "Жмых", "нет такого"]) == {
+        "Сено луговое": ("сено", AUTO),
+        "Жмых": ("соя", ADMIN),
+    }
+    reopened.close()
+
+
+def test_auto_does_not_override_admin(tmp_path):
+    cache = NormalizationCache(tmp_path / "cache.sqlite3")
+    cache.put("Жмых", "соя", source=ADMIN)
+    cache.put("Жмых", "кукуруза")
+
+    assert cache.get("Жмых") == ("соя", ADMIN)
+    cache.close()
+
+
+def test_sees_writes_of_other_processes(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    worker = NormalizationCache(path)
+    admin = NormalizationCache(path)
+    worker.put("Жмых", "кукуруза")
+    assert worker.get_many(["Жмых", "Силос"]) == {"Жмых": ("кукуруза", AUTO)}
+
+    admin.put("Жмых", "соя", source=ADMIN)
+    admin.put("Силос", "кукуруза")
+    assert worker.get_many(["Жмых", "Силос"]) == {"Жмых": ("соя", ADMIN), "Силос": ("кукуруза", AUTO)}
+
+    # устаревший результат нормализатора не затирает исправление
+    worker.put("Жмых", "кукуруза")
+    assert admin.get("Жмых") == ("соя", ADMIN)
+    worker.close()
+    admin.close()
+
+
+def test_lru_eviction_keeps_recent_and_admin(tmp_path):
+    cache = NormalizationCache(tmp_path / "cache.sqlite3", max_entries=2)
+    cache.put("старое", "a", source=ADMIN)
+    cache.put("первое", "b")
+    cache.put("второе", "c")
+    cache.get("первое")
+    cache.put("третье", "d")
+
+    assert set(cache.get_many(["старое", "первое", "второе", "третье"])) == {"старое", "первое", "третье"}
+    assert len(cache) == 3
+    cache.close()
+
+
+def test_auto_entries_keep_normalizer_version(tmp_path):
+    cache = NormalizationCache(tmp_path / "cache.sqlite3")
+    cache.put("Силос", "кукуруза", version="v1")
+    cache.put("Жмых", "соя", source=ADMIN)
+
+    assert cache.get_many(["Силос", "Жмых"], "v1") == {"Силос": ("кукуруза", AUTO), "Жмых": ("соя", ADMIN)}
+    # исправление администратора действует при любой версии
+    assert cache.get_many(["Силос", "Жмых"], "v2") == {"Жмых": ("соя", ADMIN)}
+    cache.close()
+
+
+def test_adds_version_to_old_database(tmp_path):
+    import sqlite3
+
+    path = tmp_path / "cache.sqlite3"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE names (raw TEXT PRIMARY KEY, normalized TEXT NOT NULL,"
+                 " source TEXT NOT NULL, used_at REAL NOT NULL)")
+    conn.execute("INSERT INTO names VALUES ('Силос', 'кукуруза', 'auto', 0)")
+    conn.commit()
+    conn.close()
+
+    cache = NormalizationCache(path)
+    assert cache.get("Силос", "v1") is None
+    assert cache.get("Силос") == ("кукуруза", AUTO)
+    cache.close()
@@ -0,0 +1,76 @@
+import glob
+
+import pytest
+
+from desktop.data_utils.normalization_cache import NormalizationCache
+from desktop.data_utils.normalizer import IngredientNormalizer
+from desktop.data_utils.normalizer_benchmark import legacy_normalize_report
+
+
+# без постоянного кэша: результат не зависит от исправлений на этой машине
+normalizer = IngredientNormalizer()
+
+
+def test_keyword_leftmost_then_list_order():
+    normalizer = IngredientNormalizer(names=["сено", "сенаж", "соя"], mapping={}, culture_codes={})
+
+    assert normalizer.fix_name("Соя и сенаж") == "соя"
+    assert normalizer.fix_name("сенаж, сено") == "сенаж"
+    # только целые слова, как \b в регулярке
+    assert normalizer.fix_name("сеноуборка") is None
+
+
+def test_culture_code_and_default():
+    normalizer = IngredientNormalizer(names=["кукуруза", "люцерна"], mapping={},
+                                      culture_codes={"01": "люцерна"})
+
+    assert normalizer.normalize("С-Ж 1603.01.01.06.1.24 / 30.04.25") == "люцерна"
+    assert normalizer.normalize("что-то неизвестное") == "кукуруза"
+
+
+def test_normalize_many_keeps_order_and_duplicates():
+    names = ["кукуруза", "Силос кукурузный", "кукуруза"]
+    assert normalizer.normalize_many(names) == [normalizer.normalize(n) for n in names]
+
+
+@pytest.mark.parametrize("path", sorted(glob.glob("training/parsed_data/*.csv"))[:20])
+def test_matches_previous_implementation(path):
+    with open(path, encoding="utf-8") as f:
+        names = [line.split("|", 1)[0] for line in f.read().splitlines()[1:] if line]
+
+    expected = [name.lower() for name in legacy_normalize_report(names)]
+    assert normalizer.normalize_many(names) == expected
+
+
+def test_cache_learns_results_and_admin_corrections(tmp_path):
+    cache = NormalizationCache(tmp_path / "cache.sqlite3")
+    cached = IngredientNormalizer(names=["кукуруза", "люцерна", "соя"], mapping={"жмых": "соя"},
+                                  culture_codes={}, cache=cache)
+
+    assert cached.normalize_many(["Силос кукуруза", "жмых"]) == ["кукуруза", "соя"]
+    # точные совпадения не кэшируются, результаты fix_name — да
+    assert cache.get_many(["Силос кукуруза", "жмых"]) == {"Силос кукуруза": ("кукуруза", "auto")}
+
+    cached.learn("Силос кукуруза", "люцерна")
+    cached.learn("жмых", "кукуруза")
+    assert cached.normalize_many(["Силос кукуруза", "жмых"]) == ["люцерна", "кукуруза"]
+
+    with pytest.raises(ValueError):
+        cached.learn("жмых", "не колонка")
+    cache.close()
+
+
+def test_cache_follows_mapping_changes(tmp_path):
+    cache = NormalizationCache(tmp_path / "cache.sqlite3")
+    old = IngredientNormalizer(names=["кукуруза", "люцерна", "соя"], mapping={}, culture_codes={}, cache=cache)
+    assert old.normalize_many(["Силос кукуруза", "Сено люцерна"]) == ["кукуруза", "люцерна"]
+    cache.put("Жмых", "соя", source="admin")
+
+    # колонки «соя» больше нет, «кукуруза» переименована: прежние записи кэша не годятся
+    new = IngredientNormalizer(names=["люцерна", "кукуруза зерно"], mapping={"Силос кукуруза": "кукуруза зерно"},
+                               culture_codes={}, cache=cache)
+    assert new.version != old.version
+    assert new.normalize_many(["Силос кукуруза", "Сено люцерна", "Жмых"]) == ["кукуруза зерно", "люцерна", "люцерна"]
+    assert cache.get("Сено люцерна", new.version) == ("люцерна", "auto")
+    assert cache.get("Сено люцерна", "другая версия") is None
+    cache.close()
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from catboost import CatBoostRegressor
+from sklearn.ensemble import RandomForestRegressor, VotingRegressor
+from sklearn.linear_model import Ridge
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.svm import SVR
+
+from desktop.data_utils.numpy_models import (check_compiled, compile_model, file_digest, load_compiled,
+                                             resolve_model_path, save_compiled)
+from desktop.data_utils.registry import model_registry
+
+
+@pytest.fixture(scope="module")
+def ensemble():
+    rng = np.random.default_rng(0)
+    X = rng.normal(loc=3.0, scale=2.0, size=(200, 6))
+    y = X[:, 0] * 2 - X[:, 1] ** 2 + np.sin(X[:, 2]) + rng.normal(scale=0.1, size=200)
+
+    def pipe(name, model):
+        return Pipeline([("scaler", StandardScaler()), (name, model)])
+
+    return VotingRegressor([
+        ("catboost", pipe("catboost", CatBoostRegressor(iterations=30, depth=3, verbose=0,
+                                                        allow_writing_files=False))),
+        ("random_forest", pipe("random_forest", RandomForestRegressor(n_estimators=5, max_depth=4,
+                                                                      random_state=0))),
+        ("ridge", pipe("ridge", Ridge(alpha=0.5))),
+        ("svr", pipe("svr", SVR(C=1, epsilon=0.05))),
+    ], weights=[0.3, 0.3, 0.2, 0.2]).fit(X, y)
+
+
+def test_compiled_ensemble_matches_predict(ensemble):
+    assert check_compiled(ensemble, compile_model(ensemble)) < 1e-9
+
+
+def test_roundtrip_without_pickle(ensemble, tmp_path):
+    compiled = compile_model(ensemble)
+    save_compiled(compiled, tmp_path / "model.npz", source="abc")
+    loaded = load_compiled(tmp_path / "model.npz")
+
+    X = np.random.default_rng(1).normal(loc=3.0, scale=2.0, size=(50, 6))
+    np.testing.assert_array_equal(loaded.predict(X), compiled.predict(X))
+    assert loaded.source == "abc"
+
+
+def test_stale_export_falls_back_to_pkl(ensemble, tmp_path):
+    pkl = tmp_path / "classic_pipe" / "acids" / "X_ensemble.pkl"
+    model_registry.dump(ensemble, pkl)
+    compiled_root = tmp_path / "numpy"
+    npz = compiled_root / "acids" / "X_ensemble.npz"
+
+    save_compiled(compile_model(ensemble), npz, source=file_digest(pkl))
+    assert resolve_model_path(pkl, compiled_root) == str(npz)
+
+    save_compiled(compile_model(ensemble), npz, source="другой pkl")
+    assert resolve_model_path(pkl, compiled_root) == str(pkl)
@@ -0,0 +1,54 @@
+import copy
+import glob
+import json
+
+import pandas as pd
+
+from desktop.data_utils import infer_model
+from desktop.data_utils.document import ReportDocument
+from desktop.data_utils.nutri_memo import NutriMemo, ration_key
+
+
+def test_key_is_quantized_ration():
+    ration = pd.DataFrame([[40.0, 5.0]], columns=["кукуруза", "рапс"])
+
+    assert ration_key(ration, "v1") == ration_key(ration + 0.001, "v1")
+    assert ration_key(ration, "v1") != ration_key(ration.assign(рапс=5.1), "v1")
+    assert ration_key(ration, "v1") != ration_key(ration, "v2")
+
+
+def test_lru_and_disk_tier(tmp_path):
+    memo = NutriMemo(max_entries=2, disk=True, root=tmp_path)
+    for key in ("a" * 64, "b" * 64, "c" * 64):
+        memo.put(key, {"targets": {}, "key": key})
+
+    assert len(memo) == 2
+    # вытесненная из памяти запись поднимается с диска
+    assert memo.get("a" * 64)["key"] == "a" * 64
+    assert NutriMemo(disk=True, root=tmp_path).get("c" * 64)["key"] == "c" * 64
+    assert NutriMemo().get("c" * 64) is None
+
+
+def test_same_ration_skips_nutrient_models(tmp_path, monkeypatch):
+    source = sorted(glob.glob("desktop/reports/*.json"))[0]
+    with open(source, encoding="utf-8") as f:
+        data = json.load(f)
+    data = {key: data[key] for key in ("meta", "ration_rows", "nutrients_rows")}
+
+    first = ReportDocument(tmp_path / "first.json", copy.deepcopy(data))
+    infer_model.predict_from_file(first, charts=None, jobs=None, memo=NutriMemo(disk=True, root=tmp_path / "memo"))
+
+    def fail(*args, **kwargs):
+        raise AssertionError("модели нутриентов не должны вызываться для известного рациона")
+
+    monkeypatch.setattr(infer_model, "explain_nutri", fail)
+
+    # другие лабораторные значения при том же рационе; мемо — только с диска
+    row = next(row for row in data["nutrients_rows"] if row["СВ"])
+    row["СВ"] = str(float(row["СВ"].replace(",", ".")) * 1.1).replace(".", ",")
+    second = ReportDocument(tmp_path / "second.json", data)
+    memo = NutriMemo(disk=True, root=tmp_path / "memo")
+    infer_model.predict_from_file(second, charts=None, jobs=None, memo=memo)
+
+    assert memo.hits == 1
+    assert second["importance_nutrient"] == first["importance_nutrient"]
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from training import uniq_changed_ration
+
+from desktop.data_utils.config import acids
+from desktop.data_utils.document import ReportDocument
+from desktop.data_utils.optimizer import RationProblem, optimize, optimize_report, outside_borders, search
+
+
+def base_ration():
+    # стеариновая кислота здесь ниже коридора, пальмитиновая — выше
+    return {"кукуруза": 45.0, "соя": 12.0, "люцерна": 10.0, "комбикорм": 13.0, "рапс": 10.0, "свекла": 10.0}
+
+
+def test_constraints_hold():
+    problem = RationProblem(base_ration(), bounds={"рапс": (5.0, 12.0)}, max_change=8.0)
+    candidate = search(problem, seed=3, iterations=50)
+    x = np.array([candidate.ration.get(name, 0.0) for name in uniq_changed_ration])
+
+    assert x.sum() == pytest.approx(100.0)
+    assert 5.0 - 1e-9 <= candidate.ration["рапс"] <= 12.0 + 1e-9
+    assert candidate.moved <= 8.0 + 1e-6
+    # без allow_new новые ингредиенты не появляются
+    assert set(candidate.ration) <= set(base_ration())
+
+
+def test_search_does_not_get_worse():
+    problem = RationProblem(base_ration())
+    start = problem.candidate(problem.x0)
+    found = search(problem, seed=0, iterations=100)
+
+    assert found.violation <= start.violation
+    assert set(found.predictions) == set(acids)
+
+
+def test_optimize_returns_ranked_unique_candidates():
+    candidates = optimize(base_ration(), restarts=3, limit=3)
+    keys = [c.rank_key() for c in candidates]
+
+    assert keys == sorted(keys)
+    assert len({tuple(sorted(c.ration.items())) for c in candidates}) == len(candidates)
+    assert candidates[0].to_dict()["changes"] == {k: round(v, 2) for k, v in
+                                                  sorted(candidates[0].changes.items(), key=lambda kv: -abs(kv[1]))}
+
+
+def test_infeasible_candidates_are_not_mixed_in():
+    candidates = optimize(base_ration(), restarts=4, limit=5)
+    if candidates[0].feasible:
+        assert all(c.feasible for c in candidates)
+    # недостижимый коридор: все варианты помечены и знают, что осталось вне коридора
+    targets = {acid: (0.0, 0.1) for acid in acids}
+    unreachable = optimize(base_ration(), restarts=2, targets=targets)
+    assert unreachable and not any(c.feasible for c in unreachable)
+    assert all(c.to_dict()["outside"] for c in unreachable)
+
+
+def test_optimize_report_only_when_outside_borders(tmp_path):
+    report = ReportDocument(tmp_path / "r.json", {
+        "ration_rows": [{"Ингредиенты": name, "СВ %": value} for name, value in base_ration().items()],
+        "nutrients_rows": [],
+        "result_acids": {"Олеиновая": 25.0},
+        "optimized_rations": [{"feasible": True}],
+    })
+    assert outside_borders(report["result_acids"]) == []
+    assert optimize_report(report) == []
+    assert report["optimized_rations"] == []
+
+
+def test_optimizes_the_ration_as_entered():
+    # разобранные отчёты в сумме дают не 100 % СВ: рацион не масштабируется
+    ration = {name: value * 1.09 for name, value in base_ration().items()}
+    problem = RationProblem(ration)
+    start = problem.candidate(problem.x0)
+
+    assert start.ration == pytest.approx(ration)
+    assert start.changes == {}
+    expected = problem.engine.predict(problem.engine.base_vector(ration)[None])[0]
+    assert list(start.predictions.values()) == pytest.approx(list(expected))
+
+    found = search(problem, seed=1, iterations=50)
+    assert sum(found.ration.values()) == pytest.approx(sum(ration.values()))
+    assert sum(found.changes.values()) == pytest.approx(0.0, abs=0.05)
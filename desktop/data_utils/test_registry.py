@@ -0,0 +1,48 @@
+import os
+
+import joblib
+import pytest
+
+from desktop.data_utils.registry import ModelRegistry
+
+
+@pytest.fixture
+def artifact(tmp_path):
+    path = tmp_path / "acids" / "model.pkl"
+    path.parent.mkdir()
+    joblib.dump({"version": 1}, path)
+    return path
+
+
+def test_second_load_is_cache_hit(artifact):
+    registry = ModelRegistry(artifact.parent.parent)
+    first = registry.load(artifact)
+    second = registry.load(str(artifact))
+
+    assert first is second
+    assert registry.misses == 1
+    assert registry.hits == 1
+
+
+def test_reload_when_file_changes(artifact):
+    registry = ModelRegistry(artifact.parent.parent)
+    assert registry.load(artifact)["version"] == 1
+
+    joblib.dump({"version": 2}, artifact)
+    # mtime может не успеть смениться на грубых ФС — сдвигаем явно
+    st = os.stat(artifact)
+    os.utime(artifact, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+    assert registry.load(artifact)["version"] == 2
+    assert registry.misses == 2
+
+
+def test_dump_and_preload(tmp_path):
+    registry = ModelRegistry(tmp_path)
+    registry.dump([1, 2, 3], tmp_path / "nutri" / "0_catboost.pkl")
+    assert registry.load(tmp_path / "nutri" / "0_catboost.pkl") == [1, 2, 3]
+    assert registry.hits == 1
+
+    fresh = ModelRegistry(tmp_path)
+    assert fresh.preload() == 1
+    assert len(fresh) == 1
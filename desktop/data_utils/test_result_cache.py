@@ -0,0 +1,60 @@
+import copy
+import glob
+import json
+
+import pandas as pd
+import pytest
+
+from desktop.data_utils import infer_model
+from desktop.data_utils.document import ReportDocument
+from desktop.data_utils.result_cache import ResultCache, row_key
+
+
+def test_key_depends_on_values_and_models():
+    row = pd.DataFrame([[1.0, 2.5]], columns=["кукуруза", "СП (%)"])
+
+    assert row_key(row, "v1") == row_key(row.copy(), "v1")
+    assert row_key(row, "v1") != row_key(row, "v2")
+    assert row_key(row, "v1") != row_key(row.assign(**{"СП (%)": 2.6}), "v1")
+
+
+def test_size_bounded_eviction(tmp_path):
+    cache = ResultCache(tmp_path, max_bytes=2500)
+    payload = {"result_acids": {"x": 1.0}, "pad": "x" * 1000}
+
+    cache.put("aa" + "0" * 62, payload)
+    cache.put("bb" + "0" * 62, payload)
+    cache.get("aa" + "0" * 62)
+    cache.put("cc" + "0" * 62, payload)
+
+    assert cache.get("aa" + "0" * 62) == payload
+    assert cache.get("bb" + "0" * 62) is None
+    assert cache.size() <= 2500
+
+
+def test_reanalysis_with_new_meta_uses_cache(tmp_path, monkeypatch):
+    source = sorted(glob.glob("desktop/reports/*.json"))[0]
+    with open(source, encoding="utf-8") as f:
+        data = json.load(f)
+    data = {key: data[key] for key in ("meta", "ration_rows", "nutrients_rows")}
+    cache = ResultCache(tmp_path / "cache")
+
+    first = ReportDocument(tmp_path / "first.json", copy.deepcopy(data))
+    expected = infer_model.predict_from_file(first, charts=None, cache=cache)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("модели не должны вызываться при попадании в кэш")
+
+    monkeypatch.setattr(infer_model, "explain_acid", fail)
+    monkeypatch.setattr(infer_model, "explain_nutri", fail)
+
+    data["meta"]["name"] = "Другое имя"
+    second = ReportDocument(tmp_path / "second.json", data)
+    result = infer_model.predict_from_file(second, charts=None, cache=cache)
+
+    assert {k: float(v[0]) for k, v in result.items()} == pytest.approx({k: float(v[0]) for k, v in expected.items()})
+    for field in ("result_acids", "importance_acid", "importance_nutrient", "shap_values"):
+        assert second[field] == json.loads(json.dumps(first[field]))
+    # графики общие: ID по содержимому совпадают с первым отчётом
+    assert second["graphics"] == first["graphics"]
+    assert cache.hits == 1
@@ -0,0 +1,50 @@
+import glob
+
+import numpy as np
+import pytest
+
+from desktop.data_utils.config import acids
+from desktop.data_utils.infer_model import clear_data, load_data_from_json
+from desktop.data_utils.registry import model_registry
+from desktop.data_utils.scenarios import ScenarioEngine, grid, pairwise, single
+
+
+@pytest.fixture(scope="module")
+def base():
+    return load_data_from_json(sorted(glob.glob("desktop/reports/*.json"))[0])
+
+
+def test_generators():
+    assert single(["рапс"], [-1, 1]) == [{"рапс": -1}, {"рапс": 1}]
+    assert pairwise(["рапс", "соя"], 2) == [{"рапс": 2, "соя": -2}, {"соя": 2, "рапс": -2}]
+    assert len(grid({"рапс": [0, 1, 2], "соя": [0, 1]})) == 6
+
+
+def test_deltas_match_full_pipeline(base):
+    perturbations = [{"рапс": 2.0, "кукуруза": -2.0}, {"соя": -100.0}, {"СП (%)": 0.5}]
+    result = ScenarioEngine().evaluate(base, perturbations)
+
+    for i, perturbation in enumerate(perturbations):
+        row = base.copy()
+        for column, delta in perturbation.items():
+            row[column] = row[column] + delta
+        row[["соя"]] = row[["соя"]].clip(lower=0)
+        X = clear_data(row).to_numpy()
+
+        for j, acid in enumerate(acids):
+            model = model_registry.load(f"models/classic_pipe/acids/{acid}_ensemble.pkl")
+            expected = model.predict(X)[0] - model.predict(clear_data(base).to_numpy())[0]
+            assert result.deltas[i, j] == pytest.approx(expected, abs=1e-9)
+
+
+def test_dropped_columns_are_rejected(base):
+    with pytest.raises(KeyError):
+        ScenarioEngine().evaluate(base, [{"НСУ (%)": 1.0}])
+
+
+def test_top_sorts_by_target(base):
+    result = ScenarioEngine().evaluate(base, single(["рапс", "соя"], np.linspace(-2, 2, 5)))
+    top = result.top("Олеиновая", 3)
+
+    assert len(result) == 10
+    assert list(top["Олеиновая"]) == sorted(result.deltas[:, acids.index("Олеиновая")], reverse=True)[:3]
@@ -14,11 +14,11 @@ from PyQt6.QtWidgets import (
 from PyQt6.QtGui import QIcon, QMovie, QFont
 from PyQt6.QtCore import (
     Qt, QFileSystemWatcher, QPropertyAnimation, 
-    QEasingCurve, QTimer, QSize
+    QEasingCurve, QTimer, QSize, QThread
 )
 
 from .report_loader import ReportLoader
-from .new_report_window import RefactorReport
+from .new_report_window import AnalysisWorker, RefactorReport
 
 
 class MainWindow(QWidget):
@@ -29,6 +29,9 @@ class MainWindow(QWidget):
         self.setWindowIcon(QIcon("desktop/icons/window_icon.png"))
         self.setGeometry(100, 100, 1400, 800)
         self.report_loader = ReportLoader()
+        self.current_report = None
+        # (QThread, AnalysisWorker) фоновых задач отчёта (графики, варианты рациона), пока они идут
+        self._background_jobs = set()
         self.all_reports = []  # для фильтрации
 
         # Папка с отчетами (меняем в соответствии с твоим текущим расположением)
@@ -319,6 +322,7 @@ class MainWindow(QWidget):
         dialog = NewReport(self)
 
         dialog.analysis_started.connect(self.show_analysis_tab)
+        dialog.analysis_progress.connect(self.show_analysis_progress)
         dialog.analysis_finished.connect(self.finish_analysis)
 
         dialog.exec()
@@ -329,6 +333,7 @@ class MainWindow(QWidget):
         self.tab_ration_widget = RefactorReport()
 
         self.tab_ration_widget.analysis_started.connect(self.show_analysis_tab)
+        self.tab_ration_widget.analysis_progress.connect(self.show_analysis_progress)
         self.tab_ration_widget.analysis_finished.connect(self.finish_analysis)
 
         self.tab_ration_debug = QTextEdit()
@@ -353,6 +358,7 @@ class MainWindow(QWidget):
             self.create_tab_ration()
 
         report_file = item.data(Qt.ItemDataRole.UserRole)
+        self.current_report = report_file
 
         # Попытка загрузить сначала по полному пути, затем по basename(зачем это надо)
         report_data = self.report_loader.load_report(report_file)
@@ -402,11 +408,57 @@ class MainWindow(QWidget):
                     update_json_with_report=True,
                 )
 
-
             create_md_webview(self.tab_report, md_path)
+            self.render_charts(report_file, md_path)
+            self.optimize_rations(report_file, md_path)
         except Exception as e:
             print(e) # todo: всплывающую ошибку
 
+    def render_charts(self, report_file, md_path):
+        """
+        Графики рисует процесс анализа (тот же, что их уже рисует после
+        анализа): окно не ждёт их и не грузит shap/matplotlib, а обновляет
+        вкладку, когда недостающие файлы готовы.
+        """
+        from desktop.data_utils.inference_server import run_render
+
+        self._run_in_background(lambda: (report_file, md_path, run_render(report_file)))
+
+    def optimize_rations(self, report_file, md_path):
+        """
+        Варианты рациона для отчёта с кислотами вне коридоров: процесс анализа
+        считает их после анализа, не задерживая его, и вкладка отчёта
+        обновляется, когда раздел «Варианты рациона» готов.
+        """
+        from desktop.data_utils.inference_server import run_optimize
+
+        self._run_in_background(lambda: (report_file, md_path, run_optimize(report_file, md_path)))
+
+    def _run_in_background(self, task):
+        # task() -> (report_file, md_path, изменилось ли что-то), см. on_report_updated
+        thread = QThread(self)
+        worker = AnalysisWorker(task)
+        worker.moveToThread(thread)
+        job = (thread, worker)
+        self._background_jobs.add(job)
+
+        thread.started.connect(worker.run)
+        worker.finished.connect(self.on_report_updated)
+        worker.error.connect(print)
+        worker.finished.connect(thread.quit)
+        worker.error.connect(thread.quit)
+        thread.finished.connect(lambda: self._background_jobs.discard(job))
+        thread.finished.connect(worker.deleteLater)
+        thread.finished.connect(thread.deleteLater)
+        thread.start()
+
+    def on_report_updated(self, result):
+        report_file, md_path, changed = result
+        # пока считалось, могли открыть другой отчёт
+        if changed and report_file == self.current_report:
+            from .report import create_md_webview
+            create_md_webview(self.tab_report, md_path)
+
     def on_reports_dir_changed(self, path):
         """
         Вызывается QFileSystemWatcher при изменении папки reports.
@@ -551,6 +603,13 @@ class MainWindow(QWidget):
         self.tabs.setCurrentWidget(self.analysis_tab)
 
 
+    def show_analysis_progress(self, text):
+        """Стадия анализа от процесса анализа вместо случайных фраз"""
+        if getattr(self, "loading_text", None) is None:
+            return
+        self.phrase_timer.stop()
+        self.loading_text.setText(text)
+
     def _change_phrase(self):
         """Меняет текст под гифкой"""
         if not hasattr(self, "loading_phrases") or not self.loading_phrases:
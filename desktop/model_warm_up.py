@@ -0,0 +1,92 @@
+import os
+import traceback
+
+from PyQt6.QtCore import QThread, pyqtSignal
+
+
+IDLE = "idle"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+# "0" — не прогревать модели после показа окна (замер старта в test_startup)
+WARM_UP_ENV = "AGROTECH_WARM_UP"
+
+TOOLTIPS = {
+    IDLE: "",
+    LOADING: "Модели загружаются — первый анализ займёт больше времени",
+    READY: "Модели загружены",
+    FAILED: "Не удалось заранее загрузить модели — они загрузятся при анализе",
+}
+
+
+def warm_up_enabled():
+    return os.environ.get(WARM_UP_ENV, "1") != "0"
+
+
+class ModelWarmUp(QThread):
+    """
+    Фоновый прогрев моделей после показа главного окна: запуск процесса
+    анализа (inference_server) и ожидание его прогрева, а без него —
+    infer_model.warm_up здесь же. Состояние уходит в state_changed,
+    кнопки «Анализировать» подписываются через bind_button.
+    """
+
+    state_changed = pyqtSignal(str)
+
+    def __init__(self):
+        super().__init__()
+        self.state = IDLE
+        self.state_changed.connect(self._remember)
+
+    def _remember(self, state):
+        self.state = state
+
+    def begin(self):
+        """Запускает прогрев один раз за время жизни приложения."""
+        if self.state == IDLE and not self.isRunning():
+            self.state = LOADING
+            self.start(QThread.Priority.LowestPriority)
+
+    def run(self):
+        self.state_changed.emit(LOADING)
+        try:
+            from desktop.data_utils import inference_server
+
+            if inference_server.use_inference_server():
+                try:
+                    # модели греются в процессе анализа, общем для всех окон
+                    inference_server.inference_client.warm_up()
+                    self.state_changed.emit(READY)
+                    return
+                except inference_server.InferenceUnavailable:
+                    traceback.print_exc()
+
+            from desktop.data_utils import shared_executor
+            from desktop.data_utils.infer_model import warm_up
+
+            warm_up(shared_executor())
+        except Exception:
+            traceback.print_exc()
+            self.state_changed.emit(FAILED)
+        else:
+            self.state_changed.emit(READY)
+
+    def bind_button(self, button):
+        """Показывает состояние прогрева на кнопке (свойство modelsReady и подсказка)."""
+        def update(state):
+            try:
+                button.setProperty("modelsReady", state == READY)
+                button.setToolTip(TOOLTIPS[state])
+                button.style().unpolish(button)
+                button.style().polish(button)
+            except RuntimeError:
+                # кнопка уже удалена вместе с окном
+                pass
+
+        update(self.state)
+        self.state_changed.connect(update)
+
+
+# Глобальный экземпляр
+model_warm_up = ModelWarmUp()
@@ -17,17 +17,29 @@ from PyQt6.QtWidgets import QGraphicsDropShadowEffect
 
 from PyQt6.QtCore import (Qt, QTimer, QSize, pyqtSignal, QObject, QThread, pyqtSlot)
 
-from desktop.data_utils import parse_excel_ration, parse_pdf_for_tables, predict_from_file
-from .report import write_report_files
+# парсеры, модели и нормализатор загружаются при первом обращении (см. data_utils)
+from desktop import data_utils
+from desktop.data_utils.inference_server import run_analysis
+from desktop.data_utils.metrics import collect
+from .model_warm_up import model_warm_up
 
 ROWSLEFT = ['K (%)', 'aNDFom фуража (%)', 'СЖ (%)', 'CHO B3 медленная фракция (%)', 'Растворимая клетчатка (%)', 'Крахмал (%)', 'peNDF (%)', 'aNDFom (%)', 'ЧЭЛ 3x NRC (МДжоуль/кг)', 'CHO B3 pdNDF (%)', 'Сахар (ВРУ) (%)', 'НСУ (%)', 'ОЖК (%)', 'НВУ (%)', 'CHO C uNDF (%)', 'СП (%)', 'RD Крахмал 3xУровень 1 (%)']
 COLUMNSLEFT = ["Ингредиенты","%СВ"]
 COLUMNSRIGHT=["Нутриент","СВ"]
 
+# события процесса анализа -> подписи на вкладке «Анализ»
+PROGRESS_TEXT = {
+    "queued": "Ждём, пока закончится другой анализ ⏳",
+    "loading": "Загружаем модели 📦",
+    "analysis": "Нейросети думают 🧠",
+    "report": "Собираем отчёт 📝",
+}
+
 
 class NewReport(QDialog):
     analysis_started = pyqtSignal()
     analysis_finished = pyqtSignal()
+    analysis_progress = pyqtSignal(str)
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -82,6 +94,8 @@ class NewReport(QDialog):
 
         # Пути выбранных файлов
         self.excel_path = None
+        # время разбора выбранного файла, уходит в meta.timings отчёта
+        self.parse_timings = {}
 
         # Поля для управления загрузочным диалогом/анимацией
         self._loading_dialog = None
@@ -409,6 +423,7 @@ class NewReport(QDialog):
             font-family: "Inter", "Segoe UI", system-ui, sans-serif;
             font-weight: 600;
         }
+        #analyzeBtn[modelsReady="true"] { border-color: #34D399; }  /* emerald-400: модели прогреты */
         #analyzeBtn:enabled:hover  { background: #D1D5DB; }  /* gray-300 */
         #analyzeBtn:enabled:pressed{ background: #9CA3AF; }  /* gray-400 */
         #analyzeBtn:disabled {
@@ -469,6 +484,7 @@ class NewReport(QDialog):
         self.analyze_btn.setGraphicsEffect(shadow)
 
         self.analyze_btn.clicked.connect(self.analyze_clicked)
+        model_warm_up.bind_button(self.analyze_btn)
 
         # 1) Нижняя строка с утилитами слева (атрибут)
         self.bottom_tools_layout = QHBoxLayout()
@@ -722,7 +738,8 @@ class NewReport(QDialog):
             self.excel_path = path
             self.status_label.setText(f"Выбран Excel: {Path(path).name}")
 
-            rows_rationtable, rows_nutrient = parse_excel_ration(path)
+            with collect() as self.parse_timings:
+                rows_rationtable, rows_nutrient = data_utils.parse_excel_ration(path)
             print(rows_nutrient)
             self.filling_left_table_from_file(rows_rationtable)
             self.filling_right_table_from_file(rows_nutrient)
@@ -734,7 +751,8 @@ class NewReport(QDialog):
             self.excel_path = path
             self.status_label.setText(f"Выбран Excel: {Path(path).name}")
 
-            rows_rationtable, rows_nutrient = parse_pdf_for_tables(path)
+            with collect() as self.parse_timings:
+                rows_rationtable, rows_nutrient = data_utils.parse_pdf_for_tables(path)
             self.filling_left_table_from_file(rows_rationtable)
             self.filling_right_table_from_file(rows_nutrient)
 
@@ -795,6 +813,10 @@ class NewReport(QDialog):
         # Запускаем
         self.thread.start()
 
+    def _emit_progress(self, stage):
+        # вызывается из потока анализа; сигнал доставляется в GUI-поток
+        self.analysis_progress.emit(PROGRESS_TEXT.get(stage, stage))
+
     def _analysis_error(self, msg):
         QMessageBox.critical(self, "Ошибка", f"Проблема с анализом:\n{msg}")
 
@@ -812,7 +834,8 @@ class NewReport(QDialog):
                 "complex": self.complex_edit.text(),
                 "period": self.period_edit.text(),
                 "excel": self.excel_path or None,
-                "created_at": datetime.now().isoformat()
+                "created_at": datetime.now().isoformat(),
+                "timings": dict(self.parse_timings)
             },
             "ration_rows": self._collect_table_data(self.left_table),
             "nutrients_rows": self._collect_table_data(self.right_table)
@@ -825,20 +848,13 @@ class NewReport(QDialog):
         filename = f"{safe_name}_{date.today().isoformat()}_{int(time.time())}.json"
         file_path = self.reports_dir / filename
 
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-
-        # работа мл моделей
-        # try:
-        result_acids = predict_from_file(file_path)
         jsonname = os.path.splitext(os.path.basename(file_path))[0]
         md_path = "desktop/final_reports/" + jsonname + ".md"
 
-        write_report_files(
-            input_json_path=file_path,
-            out_report_md=md_path,
-            update_json_with_report=True,
-        )
+        # работа мл моделей — в процессе анализа (inference_server); отчёт
+        # сохраняется там один раз, после predict_from_file и write_report_files
+        # try:
+        result_acids, _ = run_analysis(file_path, data, md_path, progress=self._emit_progress)
 
         # except Exception as e:
         #    print("ошибка в _finish", e)
@@ -973,26 +989,21 @@ class RefactorReport(NewReport):
                 "complex": self.complex_edit.text(),
                 "period": self.period_edit.text(),
                 "excel": self.excel_path or None,
-                "created_at": datetime.now().isoformat()
+                "created_at": datetime.now().isoformat(),
+                "timings": dict(self.parse_timings)
             },
             "ration_rows": self._collect_table_data(self.left_table),
             "nutrients_rows": self._collect_table_data(self.right_table)
         }
 
-        with open(self.json_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-
-        # работа мл моделей
-        #try:
-        result_acids = predict_from_file(self.json_path)
         jsonname = os.path.splitext(os.path.basename(self.json_path))[0]
         md_path = "desktop/final_reports/" + jsonname + ".md"
 
-        write_report_files(
-            input_json_path=self.json_path,
-            out_report_md=md_path,
-            update_json_with_report=True,
-        )
+        # работа мл моделей; старый файл заменяется целиком только после
+        # успешного анализа. Если рацион не менялся (правили только имя,
+        # комплекс или период), результаты берутся из кэша
+        #try:
+        result_acids, _ = run_analysis(self.json_path, data, md_path, cache=True, progress=self._emit_progress)
 
             #except Exception as e:
             #    print("ошибка в _finish", e)
@@ -1140,6 +1151,41 @@ class AdminNewReport(NewReport):
             pass
 
         QTimer.singleShot(0,self._remove_name_complex_date_fields)
+    def load_from_json(self, data, type_of_table):
+        super().load_from_json(data, type_of_table)
+        if type_of_table == "left":
+            self._add_normalized_column(data)
+
+    def _add_normalized_column(self, rows):
+        """
+        Колонка с колонкой модели для каждого ингредиента. Администратор может
+        выбрать другое значение — исправление запоминается в кэше нормализации
+        и применяется ко всем следующим отчётам с тем же названием.
+        """
+        table = self.left_table
+        table.setColumnCount(len(COLUMNSLEFT) + 1)
+        table.setHorizontalHeaderLabels(COLUMNSLEFT + ["Колонка модели"])
+
+        names = data_utils.ingredient_normalizer.names
+        for row, row_data in enumerate(rows):
+            raw = str(row_data.get("Ингредиенты", ""))
+            current = row_data.get("Normalized") or data_utils.ingredient_normalizer.normalize_many([raw])[0]
+
+            combo = QComboBox()
+            combo.addItems(names)
+            if current in names:
+                combo.setCurrentIndex(names.index(current))
+            combo.currentTextChanged.connect(
+                lambda value, raw=raw: self._save_normalization(raw, value))
+            table.setCellWidget(row, len(COLUMNSLEFT), combo)
+
+    def _save_normalization(self, raw, value):
+        try:
+            data_utils.ingredient_normalizer.learn(raw, value)
+            self.status_label.setText(f"«{raw}» теперь нормализуется в «{value}»")
+        except Exception as e:
+            QMessageBox.warning(self, "Ошибка", f"Не удалось сохранить исправление:\n{e}")
+
     def _disable_table_editing(self):
         """Запрещает редактирование всех ячеек в таблицах"""
         # Устанавливаем политику редактирования для таблиц
@@ -14,6 +14,10 @@ from urllib.parse import quote
 from PyQt6.QtCore import QUrl
 from PyQt6.QtWidgets import QWidget, QTextEdit, QTextBrowser, QVBoxLayout
 
+from desktop.data_utils.document import ReportDocument, atomic_write_json
+from desktop.data_utils.graphics_store import graphics_store
+from desktop.data_utils.metrics import report_timings, span
+
 try:
     import markdown
     _HAS_MD = True
@@ -103,11 +107,12 @@ def _resolve_graph_path(key: str,
                         out_report_md: Path,
                         default_filename: str | None = None) -> str | None:
     """
-    Берём путь из JSON[graphics][key], иначе ищем в desktop/graphics/<report_id>/<default_filename|key+'.png'>
+    Берём JSON[graphics][key] (ID в graphics_store или путь у старых отчётов),
+    иначе ищем в desktop/graphics/<report_id>/<default_filename|key+'.png'>
     """
     p = graphics.get(key)
     if p:
-        return str(Path(p))
+        return str(graphics_store.resolve(p).resolve())
     gdir = _graphics_dir_for(out_report_md)
     if gdir:
         name = default_filename or f"{key}.png"
@@ -369,12 +374,42 @@ def render_importance_for_nutrients(importance_nutrient: Dict[str, Dict[str, flo
     return "\n".join(lines)
 
 
+def render_optimized_rations(candidates: List[Dict], top_k: int = 3) -> str:
+    """Варианты рациона от desktop.data_utils.optimizer: что изменить и какой будет прогноз."""
+    if not candidates:
+        return ""
+    lines = ["\n## Варианты рациона под целевые коридоры\n"]
+    if not any(cand.get("feasible") for cand in candidates):
+        lines.append("> ⚠ Рацион, при котором все кислоты в коридоре, не найден в пределах "
+                     "допустимых изменений. Ниже — варианты, ближайшие к коридорам: "
+                     "это не решение, а направление изменений.")
+        lines.append("")
+    for n, cand in enumerate(candidates[:top_k], 1):
+        if cand.get("feasible"):
+            status = "все кислоты в коридоре"
+        else:
+            outside = ", ".join(cand.get("outside") or []) or "часть кислот"
+            status = f"⚠ вне коридора: {outside}"
+        lines.append(f"### Вариант {n}: {status}, перенос {cand.get('moved', 0):.1f}% СВ")
+        lines.append("")
+        lines.append("| Ингредиент | Изменение, % СВ |")
+        lines.append("|:--|--:|")
+        for name, delta in (cand.get("changes") or {}).items():
+            lines.append(f"| {name} | {delta:+.2f} |")
+        lines.append("")
+        preds = cand.get("predictions") or {}
+        lines.append("Прогноз: " + ", ".join(f"{k} {v:.2f}%" for k, v in preds.items()))
+        lines.append("")
+    return "\n".join(lines)
+
+
 def build_report(doc: dict, out_report_md: Path) -> str:
     meta = doc.get("meta", {}) or {}
     acids = doc.get("result_acids", {}) or {}
     graphics = doc.get("graphics", {}) or {}
     importance_acid = doc.get("importance_acid", {}) or {}
     importance_nutrient = doc.get("importance_nutrient", {}) or {}
+    optimized_rations = doc.get("optimized_rations", []) or []
     ration_rows = doc.get("ration_rows", []) or []
     ration = normalize_ration_rows(ration_rows)
 
@@ -392,6 +427,8 @@ def build_report(doc: dict, out_report_md: Path) -> str:
         render_importance_for_acids(importance_acid),
         # 4) состав рациона
         render_ration_table(ration),
+        # 4a) подобранные варианты рациона (если запускался optimizer)
+        render_optimized_rations(optimized_rations),
         # 5) нутриентные рекомендации
         render_importance_for_nutrients(importance_nutrient),
         # 6) прочие графики
@@ -409,28 +446,33 @@ def load_json(path: str | Path) -> Dict:
         return json.load(f)
 
 def save_json(path: str | Path, data: Dict) -> None:
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    atomic_write_json(path, data)
 
-def write_report_files(input_json_path: str | Path,
+def write_report_files(input_json_path: str | Path | ReportDocument,
                        out_report_md: str | Path | None = None,
                        update_json_with_report: bool = True) -> tuple[str, str]:
-    input_json_path = Path(input_json_path)
-    doc = load_json(input_json_path)
+    # ReportDocument приходит из конвейера анализа ещё не сохранённым:
+    # это последняя стадия, поэтому документ пишется на диск здесь, один раз
+    from_pipeline = isinstance(input_json_path, ReportDocument)
+    document = input_json_path if from_pipeline else ReportDocument.load(input_json_path)
+    input_json_path = document.path
+    doc = document.data
 
     if out_report_md is None:
         stem = input_json_path.with_suffix("").name
         out_report_md = input_json_path.with_name(stem + ".md")  # или "_report.md" — как тебе удобнее
     out_report_md = Path(out_report_md)
 
-    report_md = build_report(doc, out_report_md=out_report_md)
+    with span("report", report_timings(document)):
+        report_md = build_report(doc, out_report_md=out_report_md)
 
-    out_report_md.parent.mkdir(parents=True, exist_ok=True)
-    out_report_md.write_text(report_md, encoding="utf-8")
+        out_report_md.parent.mkdir(parents=True, exist_ok=True)
+        out_report_md.write_text(report_md, encoding="utf-8")
 
     if update_json_with_report:
         doc["report"] = report_md
-        save_json(input_json_path, doc)
+    if update_json_with_report or from_pipeline:
+        document.save()
 
     return str(input_json_path), str(out_report_md)
 
@@ -2,8 +2,23 @@ from desktop.window_manager import window_manager
 
 
 if __name__ == "__main__":
+    # локальный эндпоинт Prometheus: AGROTECH_METRICS_PORT=9464 python -m desktop.run.
+    # Обычно анализ идёт в процессе анализа, и эндпоинт поднимает он
+    # (переменная наследуется); здесь — только при AGROTECH_INFERENCE=local
+    from desktop.data_utils.inference_server import use_inference_server
+    if not use_inference_server():
+        from desktop.data_utils.metrics import start_metrics_from_env
+        start_metrics_from_env()
+
     window_manager.show_main_window()
     window_manager.exec()
 
     from desktop.main import send_new_reports
     send_new_reports()
+
+    from desktop.data_utils import shutdown_shared_executor, normalization_cache
+    from desktop.model_warm_up import model_warm_up
+    # остановка пула отменяет задачи прогрева, дальше ждём сам поток
+    shutdown_shared_executor()
+    model_warm_up.wait()
+    normalization_cache.close()
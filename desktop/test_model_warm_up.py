@@ -0,0 +1,63 @@
+import os
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt6.QtWidgets import QApplication, QPushButton
+
+from desktop.data_utils import infer_model, inference_server
+from desktop.model_warm_up import FAILED, IDLE, READY, ModelWarmUp
+
+
+app = QApplication.instance() or QApplication([])
+
+
+def _run(monkeypatch, warm_up, mode="local"):
+    monkeypatch.setenv(inference_server.MODE_ENV, mode)
+    monkeypatch.setattr(infer_model, "warm_up", warm_up)
+
+    warm = ModelWarmUp()
+    button = QPushButton("Анализировать")
+    warm.bind_button(button)
+    assert warm.state == IDLE
+
+    warm.begin()
+    assert warm.wait(10_000)
+    app.processEvents()
+    return warm, button
+
+
+def test_warm_up_marks_button_ready(monkeypatch):
+    calls = []
+    warm, button = _run(monkeypatch, lambda executor=None: calls.append(executor))
+
+    assert len(calls) == 1
+    assert warm.state == READY
+    assert button.property("modelsReady") is True
+
+    # повторный запуск не прогревает заново
+    warm.begin()
+    assert not warm.isRunning()
+    assert len(calls) == 1
+
+
+def test_failed_warm_up_keeps_button_usable(monkeypatch):
+    def broken(executor=None):
+        raise OSError("нет моделей")
+
+    warm, button = _run(monkeypatch, broken)
+
+    assert warm.state == FAILED
+    assert button.property("modelsReady") is False
+    assert button.isEnabled()
+
+
+def test_falls_back_to_local_warm_up_without_server(monkeypatch):
+    def unavailable():
+        raise inference_server.InferenceUnavailable("нет процесса")
+
+    monkeypatch.setattr(inference_server.inference_client, "warm_up", unavailable)
+    calls = []
+    warm, button = _run(monkeypatch, lambda executor=None: calls.append(executor), mode="server")
+
+    assert len(calls) == 1
+    assert warm.state == READY
@@ -0,0 +1,81 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# модули, которые нужны только для анализа и не должны грузиться до показа окна
+HEAVY = ("shap", "sklearn", "catboost", "numba", "matplotlib", "pandas", "PyPDF2", "scipy")
+
+# бюджеты с запасом: на рабочей машине импорт окна занимает ~0.3 с, а раньше — ~4 с
+IMPORT_BUDGET = 1.5
+STARTUP_BUDGET = 3.0
+
+SHOW_MAIN_WINDOW = """
+import time
+start = time.perf_counter()
+from desktop.window_manager import window_manager
+window_manager.show_main_window()
+window_manager.app.processEvents()
+print(time.perf_counter() - start)
+"""
+
+# прогрев подменён: проверяется только, что он запланирован после показа окна
+SCHEDULE_WARM_UP = """
+from desktop.model_warm_up import model_warm_up
+calls = []
+model_warm_up.begin = lambda: calls.append("begin")
+from desktop.window_manager import window_manager
+window_manager.show_main_window()
+print(calls)
+window_manager.app.processEvents()
+print(calls)
+"""
+
+
+def importtime(code, **env):
+    """Запускает code с -X importtime; возвращает (stdout, {модуль: суммарные секунды})."""
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen", **env)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, env=env,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr[-2000:]
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        modules[name.strip()] = int(cumulative) / 1e6
+    return result.stdout, modules
+
+
+def assert_no_heavy(modules):
+    loaded = sorted(name for name in modules if name.split(".")[0] in HEAVY)
+    assert not loaded, f"тяжёлые модули загружены при старте: {loaded[:10]}"
+
+
+def test_new_report_window_import_is_light():
+    _, modules = importtime("import desktop.new_report_window")
+
+    assert_no_heavy(modules)
+    assert modules["desktop.new_report_window"] < IMPORT_BUDGET
+
+
+def test_main_window_shows_within_budget():
+    pytest.importorskip("requests")
+    # фоновый прогрев грузит модели сразу после первого кадра — в замер старта он не входит
+    stdout, modules = importtime(SHOW_MAIN_WINDOW, AGROTECH_WARM_UP="0")
+
+    assert_no_heavy(modules)
+    assert float(stdout.strip().splitlines()[-1]) < STARTUP_BUDGET
+
+
+def test_warm_up_starts_after_main_window():
+    pytest.importorskip("requests")
+    stdout, _ = importtime(SCHEDULE_WARM_UP)
+
+    assert stdout.strip().splitlines()[-2:] == ["[]", "['begin']"]
@@ -2,6 +2,8 @@ from PyQt6.QtWidgets import QApplication
 from PyQt6 import QtCore
 import sys
 
+from .model_warm_up import model_warm_up, warm_up_enabled
+
 
 class WindowManager:
     def __init__(self):
@@ -18,7 +20,7 @@ class WindowManager:
             self.current_window.close()
         self.current_window = MainWindow()
         self.current_window.show()
-
+        self.warm_up_later()
         return self.current_window
     
     def show_admin_window(self):
@@ -27,7 +29,13 @@ class WindowManager:
             self.current_window.close()
         self.current_window = AdminMainWindow()
         self.current_window.show()
+        self.warm_up_later()
         return self.current_window
+
+    def warm_up_later(self):
+        # модели грузятся в фоне, когда окно уже нарисовано
+        if warm_up_enabled():
+            QtCore.QTimer.singleShot(0, model_warm_up.begin)
     
     def exec(self):
         return self.app.exec()
@@ -1,4 +1,5 @@
 from catboost import CatBoostRegressor
+import copy
 import pandas as pd
 import numpy as np
 from sklearn.pipeline import Pipeline
@@ -11,6 +12,7 @@ from sklearn.metrics import mean_squared_error, r2_score, make_scorer
 from sklearn.model_selection import train_test_split, cross_val_score, LeaveOneOut, KFold
 
 from training.train_pipelines.ohe_lin import get_ohe_train_test_data, get_ohe_step_data
+from desktop.data_utils.explainers import EnsembleExplainer
 import joblib
 
 import numba
@@ -123,8 +125,6 @@ def main():
 
     # === Смотрим что влияет ===
 
-    from desktop.data_utils.predictor import set_ensemble, ensemble_predict
-    set_ensemble(ensemble)
     feature_names = dataset.drop("target", axis=1).columns.tolist()
     sample_idx = 0
     X_single = X_test[sample_idx:sample_idx + 1]
@@ -138,11 +138,8 @@ def main():
     # shap.summary_plot(shap_values_single, x_single, feature_names=feature_names)
     #joblib.dump(feature_names, "../../models/classic_pipe/feature_names.pkl")
 
-    explainer = shap.Explainer(
-        ensemble_predict,
-        masker=X,
-        feature_names=feature_names
-    )
+    # TreeSHAP для CatBoost/RF, линейный SHAP для Ridge, выборочная оценка только для SVR
+    explainer = EnsembleExplainer(ensemble, X, feature_names=feature_names)
 
     joblib.dump(explainer, "../../models/classic_pipe/acid_explainers/Стеариновая_explainer.pkl")
 
@@ -367,14 +364,14 @@ def predict_nutr():
 
         #joblib.dump(pipe_cat, f'../../models/classic_pipe/nutri/{ind}_catboost.pkl')
 
-        from desktop.data_utils.predictor import set_ensemble, ensemble_predict
-        set_ensemble(model)
+        from desktop.data_utils.predictor import ModelPredict
         feature_names = dataset.drop(uniq_step + ["target"], axis=1).columns.tolist()
         sample_idx = 0
         X_single = X_test[sample_idx:sample_idx + 1]
 
+        # копия пайплайна: pipe_cat переобучается на следующем нутриенте
         explainer = shap.Explainer(
-            ensemble_predict,
+            ModelPredict(copy.deepcopy(pipe_cat)),
             masker=X,
             feature_names=feature_names
         )